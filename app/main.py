@@ -13,7 +13,7 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.model_loader import load_models
+from app.model_loader import load_global_model, load_models
 from app.routers import anomaly, forecast, health
 
 logging.basicConfig(
@@ -28,9 +28,15 @@ async def lifespan(app: FastAPI):
     """Load models on startup."""
     models = load_models()
     app.state.models = models
+    app.state.global_model = load_global_model()
     n_forecast = sum(1 for k in models if k[0] == "forecast")
     n_anomaly = sum(1 for k in models if k[0] == "anomaly")
-    logger.info("Loaded %d forecast + %d anomaly models", n_forecast, n_anomaly)
+    logger.info(
+        "Loaded %d forecast + %d anomaly models%s",
+        n_forecast,
+        n_anomaly,
+        " + global model" if app.state.global_model is not None else "",
+    )
     yield
 
 
@@ -6,19 +6,33 @@ import os
 
 import joblib
 
+from src.data.stations import STATION_REGISTRY_FILE, StationRegistry, install_station_registry
+from src.forecasting.tree_inference import compile_pipeline
+
 logger = logging.getLogger(__name__)
 
+# Global model (all stations × pollutants), saved by scripts/export_models.py --global
+GLOBAL_MODEL_FILE = "global_model.pkl"
+
 
 def load_models(models_dir: str = "outputs/models") -> dict[tuple[str, int, int], dict]:
     """Load all pickled pipelines from the models directory.
 
-    Returns dict keyed by (model_type, station_code, item_code).
+    Returns dict keyed by (model_type, station_code, item_code). A station
+    registry saved alongside the models is installed for the process.
     """
     pipelines: dict[tuple[str, int, int], dict] = {}
 
     if not os.path.isdir(models_dir):
         return pipelines
 
+    registry_path = os.path.join(models_dir, STATION_REGISTRY_FILE)
+    if os.path.exists(registry_path):
+        try:
+            install_station_registry(StationRegistry.load(registry_path))
+        except Exception as e:
+            logger.warning("Failed to load station registry %s: %s", registry_path, e)
+
     for path in glob.glob(os.path.join(models_dir, "*.pkl")):
         filename = os.path.basename(path)
         # Format: forecast_206_0.pkl or anomaly_205_0.pkl
@@ -35,5 +49,24 @@ def load_models(models_dir: str = "outputs/models") -> dict[tuple[str, int, int]
             pipelines[(model_type, station_code, item_code)] = pipeline
         except Exception as e:
             logger.warning("Failed to load %s: %s", path, e)
+            continue
+
+        if model_type == "forecast":
+            try:
+                pipeline["compiled_trees"] = compile_pipeline(pipeline)
+            except Exception as e:
+                logger.warning("Tree compilation failed for %s, using Booster.predict: %s", path, e)
 
     return pipelines
+
+
+def load_global_model(models_dir: str = "outputs/models") -> dict | None:
+    """Load the global model pipeline, or None when it was not exported."""
+    path = os.path.join(models_dir, GLOBAL_MODEL_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        return joblib.load(path)
+    except Exception as e:
+        logger.warning("Failed to load %s: %s", path, e)
+        return None
@@ -3,7 +3,15 @@
 import pandas as pd
 from fastapi import APIRouter, HTTPException, Request
 
-from app.schemas import ForecastPoint, ForecastRequest, ForecastResponse
+from app.schemas import (
+    ForecastPoint,
+    ForecastRequest,
+    ForecastResponse,
+    GlobalForecastPoint,
+    GlobalForecastRequest,
+    GlobalForecastResponse,
+)
+from src.forecasting.train_global import predict_global_batch
 from src.forecasting.train_lgbm_ensemble import predict_with_pipeline
 
 router = APIRouter()
@@ -48,3 +56,35 @@ def predict_forecast(request: Request, body: ForecastRequest):
         item_code=body.item_code,
         predictions=predictions,
     )
+
+
+@router.post("/predict/global", response_model=GlobalForecastResponse)
+def predict_global_forecast(request: Request, body: GlobalForecastRequest):
+    pipeline = getattr(request.app.state, "global_model", None)
+    if pipeline is None:
+        raise HTTPException(status_code=404, detail="No global model loaded")
+
+    pred_index = pd.date_range(body.start_date, body.end_date, freq="h")
+
+    if len(pred_index) == 0:
+        raise HTTPException(status_code=422, detail="Invalid date range (0 hours)")
+
+    if len(pred_index) > 744 * 2:
+        raise HTTPException(status_code=422, detail="Date range too large (max ~2 months)")
+
+    pairs = None if body.pairs is None else [(p.station_code, p.item_code) for p in body.pairs]
+    try:
+        result = predict_global_batch(pipeline, pred_index, pairs)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0])) from None
+
+    predictions = [
+        GlobalForecastPoint(
+            station_code=int(sc),
+            item_code=int(ic),
+            measurement_datetime=str(dt),
+            predicted_value=round(float(v), 6),
+        )
+        for dt, sc, ic, v in result.itertuples(index=False, name=None)
+    ]
+    return GlobalForecastResponse(predictions=predictions)
@@ -41,6 +41,40 @@ class ForecastResponse(BaseModel):
     predictions: list[ForecastPoint]
 
 
+class StationItem(BaseModel):
+    station_code: int
+    item_code: int
+
+
+class GlobalForecastRequest(BaseModel):
+    start_date: str  # YYYY-MM-DD
+    end_date: str  # YYYY-MM-DD HH:MM:SS or YYYY-MM-DD
+    pairs: list[StationItem] | None = None  # default: every trained station/pollutant
+
+    model_config = {
+        "json_schema_extra": {
+            "examples": [
+                {
+                    "start_date": "2023-12-01",
+                    "end_date": "2023-12-31 23:00:00",
+                    "pairs": [{"station_code": 228, "item_code": 8}, {"station_code": 206, "item_code": 0}],
+                }
+            ]
+        }
+    }
+
+
+class GlobalForecastPoint(BaseModel):
+    station_code: int
+    item_code: int
+    measurement_datetime: str
+    predicted_value: float
+
+
+class GlobalForecastResponse(BaseModel):
+    predictions: list[GlobalForecastPoint]
+
+
 class MeasurementInput(BaseModel):
     datetime: str
     value: float
@@ -3,6 +3,7 @@ import streamlit as st
 
 from components.filters import render_sidebar_filters, render_stations_selector
 from components.styling import apply_custom_css, apply_page_config
+from queries import summarize
 
 apply_page_config()
 apply_custom_css()
@@ -18,34 +19,27 @@ state = render_sidebar_filters()
 if state is None:
     st.stop()
 
-all_stations = sorted(state.full_df["station_code"].unique())
 selector_col, _ = st.columns([1, 2])
 with selector_col:
-    selected_stations = render_stations_selector(all_stations)
+    selected_stations = render_stations_selector(state.stations)
 
-page_df = state.filtered_df[state.filtered_df["station_code"].isin(selected_stations)]
-if page_df.empty:
+summary = summarize(state.filters, tuple(selected_stations))
+if summary["n_rows"] == 0:
     st.warning("No data for the selected stations. Pick at least one.")
     st.stop()
 
 st.subheader("📌 At a glance")
 
-total_stations = page_df["station_code"].nunique()
-total_records = len(page_df)
-date_min = page_df["date"].min()
-date_max = page_df["date"].max()
-
 kpi1, kpi2, kpi3, kpi4 = st.columns(4)
-kpi1.metric("Stations in view", f"{total_stations}")
-kpi2.metric("Records in view", f"{total_records:,}")
-kpi3.metric("From", f"{pd.Timestamp(date_min):%Y-%m-%d}")
-kpi4.metric("To", f"{pd.Timestamp(date_max):%Y-%m-%d}")
+kpi1.metric("Stations in view", f"{summary['n_stations']}")
+kpi2.metric("Records in view", f"{summary['n_rows']:,}")
+kpi3.metric("From", f"{pd.Timestamp(summary['first_date']):%Y-%m-%d}")
+kpi4.metric("To", f"{pd.Timestamp(summary['last_date']):%Y-%m-%d}")
 
 st.markdown("**Average concentrations** (filtered stations / dates / hours)")
 avg_cols = st.columns(len(state.pollutant_info))
 for col, (pollutant_col, meta) in zip(avg_cols, state.pollutant_info.items()):
-    series = page_df[pollutant_col].dropna()
-    avg = series.mean() if not series.empty else None
+    avg = summary[f"{pollutant_col}_mean"] if summary[f"{pollutant_col}_count"] else None
     decimals = 1 if meta["unit"] == "mg/m³" else 4
     col.metric(
         f"Avg {meta['name']} ({meta['unit']})",
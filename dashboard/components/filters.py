@@ -1,25 +1,60 @@
+import datetime
 from dataclasses import dataclass
 
 import pandas as pd
 import streamlit as st
 
-from data import create_status_color_map, get_pollutant_info, load_data
+from data import ROLLUP_GRAINS, create_status_color_map, get_pollutant_info, load_rollup
+from queries import Filters, count_rows, data_bounds, fetch_rows
 
 CENTRAL_STATIONS = [212, 214, 216]
 
 
 @dataclass(frozen=True)
 class FilterState:
-    """Filter selections applied to the full dataset, shared across pages.
+    """Sidebar selections shared across pages.
 
-    `filtered_df` is filtered by date/hour/status only — stations are picked
-    inline per page via `render_stations_selector`.
+    `filters` holds the date/hour/status selection; stations are picked
+    inline per page via `render_stations_selector`. Pages fetch just the
+    rows or aggregates they draw through `queries` (see `rows()`), and
+    try `rollup()` first where pre-aggregated data answers the selection.
     """
 
-    full_df: pd.DataFrame
-    filtered_df: pd.DataFrame
+    filters: Filters
+    stations: list[int]
     pollutant_info: dict
     status_colors: dict
+    min_date: datetime.date
+    max_date: datetime.date
+
+    def rows(self, stations: list[int], columns: list[str], not_null: list[str] = ()) -> pd.DataFrame:
+        """Selected rows of `stations` with only `columns` (filtered in DuckDB)."""
+        return fetch_rows(self.filters, tuple(stations), tuple(columns), tuple(not_null))
+
+    def rollup(self, *grains: str) -> pd.DataFrame | None:
+        """Rows of the coarsest of `grains` that answers the current filters, or None.
+
+        Rollups cover all hours and statuses, so any hour or status filter
+        rules them out. The station rollup needs the full date range and the
+        monthly one whole months; the daily one answers any date range.
+        """
+        f = self.filters
+        if f.hours != (0, 23) or f.statuses:
+            return None
+        start, end = pd.Timestamp(f.start_date), pd.Timestamp(f.end_date)
+        for grain in sorted(grains, key=list(ROLLUP_GRAINS).index):
+            time_key = ROLLUP_GRAINS[grain]
+            if time_key is None and (f.start_date, f.end_date) != (self.min_date, self.max_date):
+                continue
+            if time_key == "month" and not (start.is_month_start and (end + pd.Timedelta(days=1)).is_month_start):
+                continue
+            rollup = load_rollup(grain)
+            if rollup is None:
+                continue
+            if time_key is None:
+                return rollup
+            return rollup[(rollup[time_key] >= start) & (rollup[time_key] <= end)]
+        return None
 
 
 def render_pollutant_selector(pollutant_info: dict, key: str = "flt_pollutant", label: str = "💨 Pollutant") -> str:
@@ -52,17 +87,15 @@ def render_stations_selector(
 def render_sidebar_filters() -> FilterState | None:
     """Render sidebar filter widgets and return the filtered state.
 
-    Returns None if the current selection yields an empty dataframe —
+    Returns None if the current selection matches no rows —
     callers should short-circuit and surface a warning in that case.
     """
-    df = load_data()
+    min_date, max_date, stations = data_bounds()
     pollutant_info = get_pollutant_info()
     status_colors = create_status_color_map()
 
     st.sidebar.header("🔧 Filter Controls")
 
-    min_date = df["date"].min()
-    max_date = df["date"].max()
     default_start = max(min_date, max_date - pd.Timedelta(days=30))
 
     col1, col2 = st.sidebar.columns(2)
@@ -85,20 +118,18 @@ def render_sidebar_filters() -> FilterState | None:
         key="flt_status",
     )
 
-    filtered_df = df[
-        (df["date"] >= start_date) & (df["date"] <= end_date) & (df["hour"] >= hours[0]) & (df["hour"] <= hours[1])
-    ].copy()
-
-    if "All" not in selected_status and selected_status:
-        filtered_df = filtered_df[filtered_df["status_label"].isin(selected_status)]
+    statuses = tuple(selected_status) if "All" not in selected_status and selected_status else ()
+    filters = Filters(start_date, end_date, tuple(hours), statuses)
 
-    if filtered_df.empty:
+    if count_rows(filters) == 0:
         st.warning("No data available for the selected filters. Please adjust your selection.")
         return None
 
     return FilterState(
-        full_df=df,
-        filtered_df=filtered_df,
+        filters=filters,
+        stations=stations,
         pollutant_info=pollutant_info,
         status_colors=status_colors,
+        min_date=min_date,
+        max_date=max_date,
     )
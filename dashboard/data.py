@@ -7,6 +7,10 @@ import streamlit as st
 REPO_ROOT = Path(__file__).resolve().parent.parent
 OUTPUTS_DIR = REPO_ROOT / "outputs"
 PARQUET_PATH = REPO_ROOT / "data" / "dashboard_wide.parquet"
+ROLLUP_DIR = REPO_ROOT / "data" / "rollups"
+# Hive-partitioned (year/month) copy of the snapshot, preferred when present
+DATASET_DIR = REPO_ROOT / "data" / "dashboard_wide"
+DATASET_MANIFEST = DATASET_DIR / "_manifest.json"
 DATA_BACKEND = os.environ.get("DATA_BACKEND", "parquet").lower()
 
 STATUS_LABELS = {
@@ -18,14 +22,35 @@ STATUS_LABELS = {
     9: "Bad Data",
 }
 
+POLLUTANT_COLUMNS = ("so2_value", "no2_value", "o3_value", "co_value", "pm10_value", "pm2_5_value")
+
+# Compact in-memory encodings: labels as categoricals over fixed categories
+STATUS_LABEL_DTYPE = pd.CategoricalDtype([*STATUS_LABELS.values(), "Missing Status"])
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Downcast dashboard columns present in `df`: int16 station codes, float32 pollutant values
+    and status codes, categorical status labels. Returns `df`."""
+    if "station_code" in df:
+        df["station_code"] = df["station_code"].astype("int16")
+    if "instrument_status" in df:
+        df["instrument_status"] = df["instrument_status"].astype("float32")
+    if "status_label" in df:
+        df["status_label"] = df["status_label"].astype(STATUS_LABEL_DTYPE)
+    for col in POLLUTANT_COLUMNS:
+        if col in df:
+            df[col] = df[col].astype("float32")
+    return df
+
 
 @st.cache_data
-def load_data() -> pd.DataFrame:
-    """Load measurements from the configured backend and derive temporal features.
+def load_measurements() -> pd.DataFrame:
+    """Load the raw `dashboard_wide` columns from the configured backend.
 
     Selects between BigQuery and a local Parquet snapshot via the DATA_BACKEND
     env var (default: `parquet`). The Parquet snapshot is produced by
-    `scripts/export_to_parquet.py`.
+    `scripts/export_to_parquet.py`. Pages query through `queries` instead,
+    which only materializes this frame in BigQuery mode.
     """
     if DATA_BACKEND == "bigquery":
         # Lazy-imported so free-tier deploys (Streamlit Cloud in parquet mode)
@@ -52,19 +77,65 @@ def load_data() -> pd.DataFrame:
     else:
         df = pd.read_parquet(PARQUET_PATH)
         df["measurement_datetime"] = pd.to_datetime(df["measurement_datetime"])
+    return compact_frame(df)
 
-    df["year"] = df["measurement_datetime"].dt.year
-    df["month"] = df["measurement_datetime"].dt.month
-    df["day"] = df["measurement_datetime"].dt.day
-    df["hour"] = df["measurement_datetime"].dt.hour
-    df["date"] = df["measurement_datetime"].dt.date
-    df["day_of_week"] = df["measurement_datetime"].dt.day_name()
 
-    df["status_label"] = df["instrument_status"].map(STATUS_LABELS).fillna("Missing Status")
+# Pre-aggregated rollups of the Parquet snapshot, coarsest first, with their time key
+ROLLUP_GRAINS = {"station": None, "monthly": "month", "daily": "date"}
+
+
+def load_rollup(grain: str) -> pd.DataFrame | None:
+    """Rollup of the Parquet snapshot written by `scripts/export_to_parquet.py`.
+
+    Each row holds `n_rows`, `status_<code>_rows` and per-pollutant `<col>_sum` /
+    `<col>_count` for one station (and day or month), so rows can be summed over
+    any stations and dates. None when absent or when reading from BigQuery,
+    which the snapshot's rollups would not describe. The cached frame is keyed
+    on the file's mtime, so a rollup rewritten by the export is re-read.
+    """
+    path = ROLLUP_DIR / f"{grain}.parquet"
+    if DATA_BACKEND != "parquet" or not path.exists():
+        return None
+    return _read_rollup(str(path), ROLLUP_GRAINS[grain], path.stat().st_mtime)
+
 
+@st.cache_data
+def _read_rollup(path: str, time_key: str | None, mtime: float) -> pd.DataFrame:
+    df = pd.read_parquet(path)
+    if time_key is not None:
+        df[time_key] = pd.to_datetime(df[time_key])
     return df
 
 
+def sum_rollup(rollup: pd.DataFrame, by: list[str]) -> pd.DataFrame:
+    """Re-aggregate rollup rows by `by` (counts and sums add; coordinates are per station)."""
+    additive = [c for c in rollup.columns if c.endswith(("_rows", "_sum", "_count"))]
+    out = rollup.groupby(by)[additive].sum()
+    if "station_code" in by:
+        coords = rollup.groupby("station_code")[["latitude", "longitude"]].first()
+        out = out.join(coords, on="station_code")
+    return out.reset_index()
+
+
+def rollup_mean(rollup: pd.DataFrame, pollutant: str) -> pd.Series:
+    """Mean of a pollutant per rollup row (NaN where it was never observed)."""
+    count = rollup[f"{pollutant}_count"]
+    return (rollup[f"{pollutant}_sum"] / count.where(count > 0)).rename(pollutant)
+
+
+def status_row_counts(rollup: pd.DataFrame) -> pd.DataFrame:
+    """Rows per status label for each rollup row (unknown codes count as "Missing Status")."""
+    counts = pd.DataFrame({label: rollup[f"status_{code}_rows"] for code, label in STATUS_LABELS.items()})
+    counts["Missing Status"] = rollup["n_rows"] - counts.sum(axis=1)
+    return counts
+
+
+def dominant_status(rollup: pd.DataFrame) -> pd.Series:
+    """Most frequent status label per rollup row."""
+    counts = status_row_counts(rollup)
+    return counts[sorted(counts.columns)].idxmax(axis=1).rename("status_label")
+
+
 @st.cache_data
 def get_pollutant_info() -> dict:
     """Pollutant display metadata: name, unit, health threshold, series color."""
@@ -0,0 +1,94 @@
+"""Server-side downsampling of long time-series traces for Plotly.
+
+A browser cannot usefully draw more than a couple of points per horizontal
+pixel, so traces are thinned before they are sent: Largest-Triangle-Three-
+Buckets (LTTB) keeps the points that carry the visual shape, per-bucket
+min/max keeps every bucket's extremes. Both keep the end points and spikes;
+rows flagged by `keep` (e.g. non-Normal status markers) and the first missing
+value of every gap (so lines still break there) are always kept on top of
+the budget.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Layout width the Time Series chart is designed for, and points drawn per pixel
+CHART_WIDTH_PX = 1200
+POINTS_PER_PIXEL = 2
+
+
+def max_points(width_px: int = CHART_WIDTH_PX) -> int:
+    """Point budget per trace for a chart `width_px` wide (traces overlap, so each gets the full width)."""
+    return max(width_px * POINTS_PER_PIXEL, 3)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Positions of the `n_out` points LTTB keeps from (x, y), first and last included."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # n - 2 interior points into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    out = np.empty(n_out, dtype=int)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (the last point for the final bucket)
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Positions of the first and last point and each bucket's minimum and maximum (at most `n_out`), in order."""
+    n = len(y)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+    starts = np.linspace(0, n, (n_out - 2) // 2 + 1).astype(int)[:-1]
+    y = np.asarray(y, dtype=float)
+    bucket = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, n)))
+    order = np.lexsort((y, bucket))  # by bucket, then value
+    first = np.searchsorted(bucket[order], np.arange(len(starts)), side="left")
+    last = np.searchsorted(bucket[order], np.arange(len(starts)), side="right") - 1
+    return np.unique(np.concatenate([[0, n - 1], order[first], order[last]]))
+
+
+def downsample(
+    df: pd.DataFrame,
+    x: str,
+    y: str,
+    n_out: int,
+    keep: pd.Series | None = None,
+    method: str = "lttb",
+) -> pd.DataFrame:
+    """Rows of `df` (sorted by `x`) thinned to about `n_out` points of `y`.
+
+    Rows where `keep` is True and the first row of each run of missing `y`
+    are kept in addition to the sampled points.
+    """
+    if len(df) <= n_out:
+        return df
+    values = df[y].to_numpy(dtype=float)
+    valid = np.flatnonzero(~np.isnan(values))
+    if method == "lttb":
+        xs = df[x].to_numpy().astype("datetime64[ns]").astype(np.int64) if df[x].dtype.kind == "M" else df[x]
+        picked = valid[lttb_indices(np.asarray(xs)[valid], values[valid], n_out)]
+    elif method == "minmax":
+        picked = valid[minmax_indices(values[valid], n_out)]
+    else:
+        raise ValueError(f"Unknown downsampling method: {method}")
+
+    mask = np.zeros(len(df), dtype=bool)
+    mask[picked] = True
+    missing = np.isnan(values)
+    mask |= missing & ~np.concatenate([[False], missing[:-1]])
+    if keep is not None:
+        mask |= keep.to_numpy(dtype=bool)
+    return df[mask]
@@ -6,6 +6,9 @@ import streamlit as st
 
 from components.filters import render_pollutant_selector, render_sidebar_filters, render_stations_selector
 from components.styling import apply_custom_css, apply_page_config
+from data import dominant_status, rollup_mean, status_row_counts
+from downsample import downsample, max_points
+from queries import daily_means, status_counts, summarize
 
 apply_page_config()
 apply_custom_css()
@@ -16,7 +19,7 @@ if state is None:
 
 pollutant_info = state.pollutant_info
 status_colors = state.status_colors
-all_stations = sorted(state.full_df["station_code"].unique())
+all_stations = state.stations
 
 st.header("📊 Time Series Analysis")
 
@@ -38,48 +41,56 @@ with top3:
 with top4:
     show_missing = st.checkbox("Show -1 Values", value=True, help="Display missing values (-1) in the chart")
 
-filtered_df = state.filtered_df[state.filtered_df["station_code"].isin(selected_stations)]
-if filtered_df.empty:
+stations = tuple(selected_stations)
+summary = summarize(state.filters, stations)
+if summary["n_rows"] == 0:
     st.warning("No data for the selected stations. Pick at least one.")
     st.stop()
 
 st.subheader(f"{pollutant_info[selected_pollutant]['name']} Levels Over Time")
 
-plot_df = filtered_df.copy()
-
-if not show_missing:
-    plot_df = plot_df[plot_df[selected_pollutant].notna()]
-
 
 def _mode(s: pd.Series) -> str:
     m = s.mode()
     return m.iloc[0] if not m.empty else "Normal"
 
 
-if agg_level == "Daily Avg":
-    plot_df = (
-        plot_df.groupby(["date", "station_code"])
-        .agg(
-            **{
-                selected_pollutant: (selected_pollutant, "mean"),
-                "measurement_datetime": ("measurement_datetime", "first"),
-                "status_label": ("status_label", _mode),
-            }
-        )
-        .reset_index()
+daily_rollup = state.rollup("daily") if agg_level == "Daily Avg" else None
+
+if daily_rollup is not None:
+    rows = daily_rollup[daily_rollup["station_code"].isin(selected_stations)]
+    plot_df = pd.DataFrame(
+        {
+            "date": rows["date"],
+            "station_code": rows["station_code"],
+            selected_pollutant: rollup_mean(rows, selected_pollutant),
+            "measurement_datetime": rows["date"],
+            "status_label": dominant_status(rows),
+        }
     )
-elif agg_level == "Hourly Avg":
-    plot_df = (
-        plot_df.groupby(["measurement_datetime", "station_code"])
-        .agg(
-            **{
-                selected_pollutant: (selected_pollutant, "mean"),
-                "status_label": ("status_label", _mode),
-            }
-        )
-        .reset_index()
+    if not show_missing:
+        plot_df = plot_df[plot_df[selected_pollutant].notna()]
+elif agg_level == "Daily Avg":
+    plot_df = daily_means(state.filters, stations, selected_pollutant, drop_missing=not show_missing)
+else:
+    plot_df = state.rows(
+        selected_stations,
+        ["measurement_datetime", "station_code", selected_pollutant, "status_label"],
+        not_null=[] if show_missing else [selected_pollutant],
     )
 
+    if agg_level == "Hourly Avg":
+        plot_df = (
+            plot_df.groupby(["measurement_datetime", "station_code"])
+            .agg(
+                **{
+                    selected_pollutant: (selected_pollutant, "mean"),
+                    "status_label": ("status_label", _mode),
+                }
+            )
+            .reset_index()
+        )
+
 valid_values = plot_df[plot_df[selected_pollutant] > 0][selected_pollutant].dropna()
 y_max = None
 if len(valid_values) > 20:
@@ -92,6 +103,8 @@ station_palette = pc.qualitative.Set2 + pc.qualitative.Set3
 station_colors = {s: station_palette[i % len(station_palette)] for i, s in enumerate(stations_in_plot)}
 
 x_col = "measurement_datetime" if agg_level != "Daily Avg" else "date"
+point_budget = max_points()
+thinned = False
 unit = pollutant_info[selected_pollutant]["unit"]
 name = pollutant_info[selected_pollutant]["name"]
 
@@ -99,9 +112,14 @@ for station in stations_in_plot:
     station_data = plot_df[plot_df["station_code"] == station].sort_values(x_col)
     if station_data.empty:
         continue
+    if len(station_data) > point_budget:
+        # Non-Normal status markers are kept on top of the budget
+        anomalies = station_data["status_label"].astype(object) != "Normal"
+        station_data = downsample(station_data, x_col, selected_pollutant, point_budget, keep=anomalies)
+        thinned = True
 
     x_values = pd.to_datetime(station_data[x_col])
-    marker_colors = station_data["status_label"].map(status_colors).fillna("#888").tolist()
+    marker_colors = station_data["status_label"].astype(object).map(status_colors).fillna("#888").tolist()
 
     fig.add_trace(
         go.Scatter(
@@ -154,10 +172,19 @@ fig.update_layout(
 )
 
 st.plotly_chart(fig, use_container_width=True)
+if thinned:
+    st.caption(
+        f"Long traces are downsampled to about {point_budget:,} points per station (largest-triangle-three-buckets); "
+        "peaks and every non-Normal status point are kept. Narrow the date range for full resolution."
+    )
 
 st.subheader("📊 Status Distribution Over Selected Period")
 
-status_dist = filtered_df.groupby(["status_label"]).size().reset_index(name="count")
+if daily_rollup is not None:
+    status_totals = status_row_counts(rows).sum()
+    status_dist = status_totals[status_totals > 0].rename_axis("status_label").reset_index(name="count")
+else:
+    status_dist = status_counts(state.filters, stations)
 status_dist["percentage"] = (status_dist["count"] / status_dist["count"].sum() * 100).round(2)
 
 fig_status = px.pie(
@@ -172,20 +199,22 @@ fig_status = px.pie(
 fig_status.update_traces(textposition="inside", textinfo="percent+label")
 st.plotly_chart(fig_status, use_container_width=True)
 
+status_rows = status_dist.set_index("status_label")["count"]
+
 col1, col2, col3, col4 = st.columns(4)
 
 with col1:
-    total_records = len(filtered_df)
+    total_records = int(summary["n_rows"])
     st.metric("Total Records", f"{total_records:,}")
 
 with col2:
-    missing_values = filtered_df[selected_pollutant].isna().sum()
+    missing_values = total_records - int(summary[f"{selected_pollutant}_count"])
     st.metric("Missing Values", f"{missing_values:,}", delta=f"{missing_values / total_records * 100:.1f}%")
 
 with col3:
-    normal_status = (filtered_df["status_label"] == "Normal").sum()
+    normal_status = int(status_rows.get("Normal", 0))
     st.metric("Normal Status", f"{normal_status:,}", delta=f"{normal_status / total_records * 100:.1f}%")
 
 with col4:
-    missing_status = (filtered_df["status_label"] == "Missing Status").sum()
+    missing_status = int(status_rows.get("Missing Status", 0))
     st.metric("Missing Status", f"{missing_status:,}", delta=f"{missing_status / total_records * 100:.1f}%")
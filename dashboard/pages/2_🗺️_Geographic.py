@@ -1,9 +1,12 @@
 import folium
+import pandas as pd
 import streamlit as st
 from streamlit_folium import st_folium
 
 from components.filters import render_pollutant_selector, render_sidebar_filters, render_stations_selector
 from components.styling import apply_custom_css, apply_page_config
+from data import dominant_status, rollup_mean, sum_rollup
+from queries import station_aggregates
 
 apply_page_config()
 apply_custom_css()
@@ -13,7 +16,7 @@ if state is None:
     st.stop()
 
 pollutant_info = state.pollutant_info
-all_stations = sorted(state.full_df["station_code"].unique())
+all_stations = state.stations
 
 st.header("🗺️ Geographic Analysis")
 
@@ -23,23 +26,25 @@ with top1:
 with top2:
     selected_pollutant = render_pollutant_selector(pollutant_info)
 
-filtered_df = state.filtered_df[state.filtered_df["station_code"].isin(selected_stations)]
-if filtered_df.empty:
-    st.warning("No data for the selected stations. Pick at least one.")
-    st.stop()
-
-station_agg = (
-    filtered_df.groupby(["station_code", "latitude", "longitude"])
-    .agg(
+rollup = state.rollup("station", "monthly", "daily")
+if rollup is not None:
+    totals = sum_rollup(rollup[rollup["station_code"].isin(selected_stations)], ["station_code"])
+    station_agg = pd.DataFrame(
         {
-            selected_pollutant: ["mean", "count"],
-            "status_label": lambda x: x.mode().iloc[0] if not x.empty else "Unknown",
+            "station_code": totals["station_code"],
+            "latitude": totals["latitude"],
+            "longitude": totals["longitude"],
+            "avg_value": rollup_mean(totals, selected_pollutant),
+            "record_count": totals[f"{selected_pollutant}_count"],
+            "dominant_status": dominant_status(totals),
         }
     )
-    .reset_index()
-)
+else:
+    station_agg = station_aggregates(state.filters, tuple(selected_stations), selected_pollutant)
 
-station_agg.columns = ["station_code", "latitude", "longitude", "avg_value", "record_count", "dominant_status"]
+if station_agg.empty:
+    st.warning("No data for the selected stations. Pick at least one.")
+    st.stop()
 
 station_agg = station_agg[station_agg["avg_value"].notna()]
 
@@ -4,14 +4,21 @@ import plotly.graph_objects as go
 import streamlit as st
 
 from components.styling import apply_custom_css, apply_page_config
-from data import get_pollutant_info, load_data
+from data import get_pollutant_info, load_rollup, sum_rollup
+from queries import quality_by
 
 apply_page_config()
 apply_custom_css()
 
-full_df = load_data()
 pollutant_info = get_pollutant_info()
 
+# Whole-dataset counts per station and per month: from the rollups when present, else one query each
+by_station = load_rollup("station")
+if by_station is None:
+    by_station = quality_by("station_code")
+monthly_rollup = load_rollup("monthly")
+by_month = quality_by("month") if monthly_rollup is None else sum_rollup(monthly_rollup, ["month"])
+
 st.header("📈 Data Quality Overview")
 
 col1, col2 = st.columns(2)
@@ -22,9 +29,10 @@ with col1:
     pollutant_cols = list(pollutant_info.keys())
     missing_data = []
 
+    n_rows = by_station["n_rows"].sum()
     for col in pollutant_cols:
-        missing_count = full_df[col].isna().sum()
-        missing_pct = (missing_count / len(full_df)) * 100
+        missing_count = n_rows - by_station[f"{col}_count"].sum()
+        missing_pct = (missing_count / n_rows) * 100
         missing_data.append(
             {"Pollutant": pollutant_info[col]["name"], "Missing Count": missing_count, "Missing %": missing_pct}
         )
@@ -45,12 +53,12 @@ with col1:
 with col2:
     st.subheader("Status Availability by Station")
 
-    station_quality = (
-        full_df.groupby("station_code")
-        .agg({"instrument_status": lambda x: x.notna().sum() / len(x) * 100})
-        .reset_index()
+    station_quality = pd.DataFrame(
+        {
+            "station_code": by_station["station_code"],
+            "status_availability": by_station["status_rows"] / by_station["n_rows"] * 100,
+        }
     )
-    station_quality.columns = ["station_code", "status_availability"]
     station_quality = station_quality.sort_values("status_availability")
 
     fig_quality = px.bar(
@@ -69,18 +77,12 @@ with col2:
 
 st.subheader("📅 Data Quality Over Time")
 
-monthly_quality = full_df.copy()
-monthly_quality["year_month"] = monthly_quality["measurement_datetime"].dt.to_period("M")
-
-monthly_stats = (
-    monthly_quality.groupby("year_month")
-    .agg(
-        {
-            "instrument_status": lambda x: x.notna().sum() / len(x) * 100,
-            "so2_value": lambda x: x.notna().sum() / len(x) * 100,
-        }
-    )
-    .reset_index()
+monthly_stats = pd.DataFrame(
+    {
+        "year_month": pd.to_datetime(by_month["month"]).dt.to_period("M"),
+        "instrument_status": by_month["status_rows"] / by_month["n_rows"] * 100,
+        "so2_value": by_month["so2_value_count"] / by_month["n_rows"] * 100,
+    }
 )
 
 monthly_stats["year_month_str"] = monthly_stats["year_month"].astype(str)
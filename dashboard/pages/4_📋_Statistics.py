@@ -12,7 +12,7 @@ if state is None:
     st.stop()
 
 pollutant_info = state.pollutant_info
-all_stations = sorted(state.full_df["station_code"].unique())
+all_stations = state.stations
 
 st.header("📋 Statistical Summary")
 
@@ -22,12 +22,11 @@ with top1:
 with top2:
     selected_pollutant = render_pollutant_selector(pollutant_info)
 
-filtered_df = state.filtered_df[state.filtered_df["station_code"].isin(selected_stations)]
-if filtered_df.empty:
-    st.warning("No data for the selected stations. Pick at least one.")
-    st.stop()
-
-clean_data = filtered_df[filtered_df[selected_pollutant].notna() & filtered_df["instrument_status"].notna()]
+clean_data = state.rows(
+    selected_stations,
+    ["measurement_datetime", "station_code", selected_pollutant, "status_label"],
+    not_null=[selected_pollutant, "instrument_status"],
+)
 
 if clean_data.empty:
     st.warning("No clean data available for statistical analysis.")
@@ -121,7 +120,9 @@ if stations_in_data > 1:
 st.subheader("🔍 Analysis by Instrument Status")
 
 status_stats = (
-    clean_data.groupby("status_label")[selected_pollutant].agg(["count", "mean", "std", "min", "max"]).round(4)
+    clean_data.groupby("status_label", observed=True)[selected_pollutant]
+    .agg(["count", "mean", "std", "min", "max"])
+    .round(4)
 )
 
 status_stats.columns = ["Count", "Mean", "Std Dev", "Min", "Max"]
@@ -0,0 +1,274 @@
+"""DuckDB data access for the dashboard pages.
+
+Measurements stay in DuckDB — a view over the Parquet snapshot, or the
+BigQuery frame registered once when `DATA_BACKEND=bigquery` — and every
+chart asks for just the rows or aggregates it draws. Date, hour, status,
+station and non-null pollutant predicates are pushed into the SQL (date and
+station filters reach the Parquet row-group statistics), so a widget change
+re-runs a small query instead of copying and re-filtering the full frame.
+When the partitioned export (`data/dashboard_wide/`) exists, queries over
+a range of a month or so (the default view) read only the monthly files its
+manifest lists for that range, where the station-sorted row groups are
+skipped by their statistics; longer ranges keep scanning the single
+snapshot, which is cheaper than opening many small files. The manifest is
+re-read whenever an incremental export replaces it, and a range whose
+listed files are gone falls back to the snapshot. Incremental exports do
+not rewrite the snapshot, so long ranges lag behind the partitions until a
+scheduled `--snapshot` run rebuilds it.
+"""
+
+import datetime
+import json
+import os
+from dataclasses import dataclass
+
+import duckdb
+import pandas as pd
+import streamlit as st
+
+from data import (
+    DATA_BACKEND,
+    DATASET_MANIFEST,
+    PARQUET_PATH,
+    POLLUTANT_COLUMNS,
+    STATUS_LABELS,
+    compact_frame,
+    load_measurements,
+)
+
+ROW_COLUMNS = ("measurement_datetime", "station_code", "latitude", "longitude", *POLLUTANT_COLUMNS)
+DERIVED_COLUMNS = ("date", "hour", "status_label", "instrument_status")
+
+# Most monthly files a date range may span and still be read file by file: past
+# that, opening the small files costs more than scanning the single snapshot
+MAX_PARTITION_FILES = 2
+
+_STATUS_CASE = " ".join(f"WHEN {code} THEN '{label}'" for code, label in STATUS_LABELS.items())
+
+
+@dataclass(frozen=True)
+class Filters:
+    """Sidebar selection (hashable, so query results cache per selection)."""
+
+    start_date: datetime.date
+    end_date: datetime.date
+    hours: tuple[int, int] = (0, 23)
+    statuses: tuple[str, ...] = ()  # empty = all
+
+
+def _select_measurements(source: str, exclude: tuple[str, ...] = ()) -> str:
+    """The dashboard columns over `source`, plus the derived date/hour/status label."""
+    return f"""
+        SELECT
+            * EXCLUDE (measurement_datetime{"".join(f", {c}" for c in exclude)}),
+            CAST(measurement_datetime AS TIMESTAMP) AS measurement_datetime,
+            CAST(measurement_datetime AS DATE) AS date,
+            hour(measurement_datetime) AS hour,
+            COALESCE(CASE CAST(instrument_status AS INTEGER) {_STATUS_CASE} END, 'Missing Status') AS status_label
+        FROM {source}
+    """
+
+
+@st.cache_resource
+def get_connection() -> duckdb.DuckDBPyConnection:
+    """In-memory DuckDB with a `measurements` view carrying the derived dashboard columns.
+
+    In Parquet mode there is also a `measurements_in(files)` table macro:
+    the same columns over just the given partition files of the dataset.
+    """
+    con = duckdb.connect()
+    if DATA_BACKEND == "bigquery":
+        con.register("source", load_measurements())
+        con.execute(f"CREATE VIEW measurements AS {_select_measurements('source')}")
+    else:
+        con.execute("CREATE VIEW measurements AS " + _select_measurements(f"read_parquet('{PARQUET_PATH}')"))
+        # Partition keys come back as columns (station_code too if partitioned by station)
+        files = "read_parquet(files, hive_partitioning = true, union_by_name = true)"
+        con.execute(f"CREATE MACRO measurements_in(files) AS TABLE {_select_measurements(files, ('year', 'month'))}")
+    return con
+
+
+def dataset_partitions() -> list[dict] | None:
+    """Partitions listed in the dataset manifest, or None without a partitioned dataset.
+
+    Cached per manifest mtime: an incremental export swaps in a new manifest
+    before deleting the files it superseded, so the new list is picked up.
+    """
+    if DATA_BACKEND == "bigquery":
+        return None
+    try:
+        return _read_partitions(str(DATASET_MANIFEST), DATASET_MANIFEST.stat().st_mtime_ns)
+    except FileNotFoundError:  # no dataset, or a full rewrite is swapping the directory
+        return None
+
+
+@st.cache_data
+def _read_partitions(path: str, mtime_ns: int) -> list[dict]:
+    with open(path) as f:
+        manifest = json.load(f)
+    dataset_dir = os.path.dirname(path)
+    for part in manifest["partitions"]:
+        part["paths"] = [os.path.join(dataset_dir, f) for f in part["files"]]
+        part["first"] = pd.Timestamp(part["min_datetime"])
+        part["last"] = pd.Timestamp(part["max_datetime"])
+    return manifest["partitions"]
+
+
+def _query(sql: str, params: list | None = None) -> pd.DataFrame:
+    # One cursor per call: Streamlit serves sessions from several threads
+    return compact_frame(get_connection().cursor().execute(sql, params or []).df())
+
+
+def _check_columns(columns) -> None:
+    unknown = set(columns) - set(ROW_COLUMNS) - set(DERIVED_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown dashboard columns: {sorted(unknown)}")
+
+
+def _from_where(
+    filters: Filters | None,
+    stations: tuple[int, ...] | None = None,
+    not_null: tuple[str, ...] = (),
+) -> tuple[str, list]:
+    """FROM / WHERE clause and positional parameters for a selection."""
+    _check_columns(not_null)
+    source, clauses, params = "measurements", [], []
+    if filters is not None:
+        start = pd.Timestamp(filters.start_date)
+        end = pd.Timestamp(filters.end_date) + pd.Timedelta(days=1)
+        partitions = dataset_partitions()
+        if partitions is not None:
+            files = [f for p in partitions if p["first"] < end and p["last"] >= start for f in p["paths"]]
+            # Files missing here were superseded since the manifest was read: use the snapshot
+            if 0 < len(files) <= MAX_PARTITION_FILES and all(os.path.exists(f) for f in files):
+                source = "measurements_in(?)"
+                params.append(files)
+        clauses.append("measurement_datetime >= ? AND measurement_datetime < ?")
+        params += [start.to_pydatetime(), end.to_pydatetime()]
+        if filters.hours != (0, 23):
+            clauses.append("hour BETWEEN ? AND ?")
+            params += list(filters.hours)
+        if filters.statuses:
+            clauses.append("status_label IN (SELECT UNNEST(?))")
+            params.append(list(filters.statuses))
+    if stations is not None:
+        clauses.append("station_code IN (SELECT UNNEST(?))")
+        params.append([int(s) for s in stations])
+    clauses += [f"{col} IS NOT NULL" for col in not_null]
+    return f"FROM {source} " + (("WHERE " + " AND ".join(clauses)) if clauses else ""), params
+
+
+def data_bounds() -> tuple[datetime.date, datetime.date, list[int]]:
+    """First and last measurement date and the station codes.
+
+    The last date comes from the dataset manifest when it is later than the
+    snapshot, so hours an incremental export added are selectable before
+    the snapshot is rebuilt.
+    """
+    lo, hi, stations = _snapshot_bounds()
+    partitions = dataset_partitions()
+    if partitions:
+        hi = max(hi, max(p["last"] for p in partitions).date())
+    return lo, hi, stations
+
+
+@st.cache_data
+def _snapshot_bounds() -> tuple[datetime.date, datetime.date, list[int]]:
+    row = _query("SELECT MIN(date) AS lo, MAX(date) AS hi FROM measurements").iloc[0]
+    stations = _query("SELECT DISTINCT station_code FROM measurements ORDER BY station_code")
+    return pd.Timestamp(row["lo"]).date(), pd.Timestamp(row["hi"]).date(), stations["station_code"].tolist()
+
+
+@st.cache_data
+def count_rows(filters: Filters, stations: tuple[int, ...] | None = None) -> int:
+    from_where, params = _from_where(filters, stations)
+    return int(_query(f"SELECT COUNT(*) AS n {from_where}", params)["n"].iloc[0])
+
+
+@st.cache_data
+def fetch_rows(
+    filters: Filters,
+    stations: tuple[int, ...],
+    columns: tuple[str, ...],
+    not_null: tuple[str, ...] = (),
+) -> pd.DataFrame:
+    """The selected rows with only `columns`, ordered by station and time."""
+    _check_columns(columns)
+    from_where, params = _from_where(filters, stations, not_null)
+    return _query(
+        f"SELECT {', '.join(columns)} {from_where} ORDER BY station_code, measurement_datetime",
+        params,
+    )
+
+
+@st.cache_data
+def summarize(filters: Filters, stations: tuple[int, ...]) -> pd.Series:
+    """Row / station counts, date span, and per-pollutant mean and non-null count."""
+    from_where, params = _from_where(filters, stations)
+    per_pollutant = ", ".join(f"AVG({c}) AS {c}_mean, COUNT({c}) AS {c}_count" for c in POLLUTANT_COLUMNS)
+    return _query(
+        f"""
+        SELECT COUNT(*) AS n_rows, COUNT(DISTINCT station_code) AS n_stations,
+               MIN(date) AS first_date, MAX(date) AS last_date, {per_pollutant}
+        {from_where}
+        """,
+        params,
+    ).iloc[0]
+
+
+@st.cache_data
+def status_counts(filters: Filters | None, stations: tuple[int, ...] | None = None) -> pd.DataFrame:
+    """Rows per status label (`status_label`, `count`)."""
+    from_where, params = _from_where(filters, stations)
+    return _query(
+        f"SELECT status_label, COUNT(*) AS count {from_where} GROUP BY 1 ORDER BY 1",
+        params,
+    )
+
+
+@st.cache_data
+def daily_means(filters: Filters, stations: tuple[int, ...], pollutant: str, drop_missing: bool) -> pd.DataFrame:
+    """Per station and day: the pollutant mean, first timestamp and most frequent status."""
+    from_where, params = _from_where(filters, stations, (pollutant,) if drop_missing else ())
+    _check_columns([pollutant])
+    return _query(
+        f"""
+        SELECT date, station_code, AVG({pollutant}) AS {pollutant},
+               MIN(measurement_datetime) AS measurement_datetime, mode(status_label) AS status_label
+        {from_where}
+        GROUP BY 1, 2
+        ORDER BY 2, 1
+        """,
+        params,
+    )
+
+
+@st.cache_data
+def station_aggregates(filters: Filters, stations: tuple[int, ...], pollutant: str) -> pd.DataFrame:
+    """Per station: coordinates, pollutant mean and count, and most frequent status."""
+    from_where, params = _from_where(filters, stations)
+    _check_columns([pollutant])
+    return _query(
+        f"""
+        SELECT station_code, latitude, longitude,
+               AVG({pollutant}) AS avg_value, COUNT({pollutant}) AS record_count,
+               mode(status_label) AS dominant_status
+        {from_where}
+        GROUP BY 1, 2, 3
+        ORDER BY 1
+        """,
+        params,
+    )
+
+
+@st.cache_data
+def quality_by(key: str) -> pd.DataFrame:
+    """Whole-dataset row, status and per-pollutant non-null counts by `station_code` or `month`."""
+    keys = {"station_code": "station_code", "month": "date_trunc('month', measurement_datetime) AS month"}
+    counts = ", ".join(f"COUNT({c}) AS {c}_count" for c in POLLUTANT_COLUMNS)
+    return _query(f"""
+        SELECT {keys[key]}, COUNT(*) AS n_rows, COUNT(instrument_status) AS status_rows, {counts}
+        FROM measurements
+        GROUP BY 1
+        ORDER BY 1
+    """)
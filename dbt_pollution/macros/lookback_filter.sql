@@ -0,0 +1,17 @@
+{% macro lookback_filter(column='measurement_datetime') -%}
+    {#
+        WHERE clause for incremental logic models: on incremental runs, keep
+        rows from `lookback_hours` before the latest hour already in the model,
+        so late-arriving instrument statuses (and corrected values) in that
+        window are merged again. Full builds and `--full-refresh` read every row.
+    #}
+    {%- if is_incremental() -%}
+    WHERE {{ column }} >= (
+        SELECT COALESCE(
+            {{ dbt.dateadd('hour', -1 * var('lookback_hours'), 'MAX(measurement_datetime)') }},
+            CAST('1900-01-01' AS DATETIME)
+        )
+        FROM {{ this }}
+    )
+    {%- endif -%}
+{%- endmacro %}
@@ -1,10 +1,19 @@
 {{-
   config(
-    materialized='table'
+    materialized='incremental',
+    unique_key=['measurement_datetime', 'station_code', 'item_code'],
+    incremental_strategy=('merge' if target.type == 'bigquery' else 'delete+insert'),
+    partition_by=(
+      {'field': 'measurement_datetime', 'data_type': 'datetime', 'granularity': 'month'}
+      if target.type == 'bigquery' else none
+    ),
+    cluster_by=(['station_code', 'item_code'] if target.type == 'bigquery' else none),
+    on_schema_change='fail'
   )
 -}}
 
 -- Cleaned measurements with nulls handled, temporal features, and air quality classification.
+-- Incremental: only rows inside the lookback window are re-derived and merged.
 
 SELECT
     m.measurement_datetime
@@ -43,3 +52,4 @@ SELECT
 FROM {{ ref('measurements_with_status') }} m
     LEFT JOIN {{ ref('lnd_pollutants') }} p
         ON m.item_code = p.item_code
+{{ lookback_filter('m.measurement_datetime') }}
@@ -1,6 +1,14 @@
 {{-
   config(
-    materialized='table'
+    materialized='incremental',
+    unique_key=['measurement_datetime', 'station_code', 'item_code'],
+    incremental_strategy=('merge' if target.type == 'bigquery' else 'delete+insert'),
+    partition_by=(
+      {'field': 'measurement_datetime', 'data_type': 'datetime', 'granularity': 'month'}
+      if target.type == 'bigquery' else none
+    ),
+    cluster_by=(['station_code', 'item_code'] if target.type == 'bigquery' else none),
+    on_schema_change='fail'
   )
 -}}
 
@@ -8,31 +16,38 @@
 -- This enables a clean 1:1 join with instrument_data on (datetime, station, item_code).
 -- Item code mapping from pollutant_data.csv:
 --   0 = SO2, 2 = NO2, 4 = CO, 5 = O3, 7 = PM10, 8 = PM2.5
+-- Incremental: only hours inside the lookback window are unpivoted and merged (see lookback_filter).
+
+WITH measurements AS (
+    SELECT *
+    FROM {{ ref('lnd_measurements') }}
+    {{ lookback_filter() }}
+)
 
 SELECT measurement_datetime, station_code, latitude, longitude, 0 AS item_code, so2_value AS value
-FROM {{ ref('lnd_measurements') }}
+FROM measurements
 
 UNION ALL
 
 SELECT measurement_datetime, station_code, latitude, longitude, 2 AS item_code, no2_value AS value
-FROM {{ ref('lnd_measurements') }}
+FROM measurements
 
 UNION ALL
 
 SELECT measurement_datetime, station_code, latitude, longitude, 4 AS item_code, co_value AS value
-FROM {{ ref('lnd_measurements') }}
+FROM measurements
 
 UNION ALL
 
 SELECT measurement_datetime, station_code, latitude, longitude, 5 AS item_code, o3_value AS value
-FROM {{ ref('lnd_measurements') }}
+FROM measurements
 
 UNION ALL
 
 SELECT measurement_datetime, station_code, latitude, longitude, 7 AS item_code, pm10_value AS value
-FROM {{ ref('lnd_measurements') }}
+FROM measurements
 
 UNION ALL
 
 SELECT measurement_datetime, station_code, latitude, longitude, 8 AS item_code, pm2_5_value AS value
-FROM {{ ref('lnd_measurements') }}
+FROM measurements
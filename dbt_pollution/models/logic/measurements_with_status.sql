@@ -1,11 +1,20 @@
 {{-
   config(
-    materialized='table'
+    materialized='incremental',
+    unique_key=['measurement_datetime', 'station_code', 'item_code'],
+    incremental_strategy=('merge' if target.type == 'bigquery' else 'delete+insert'),
+    partition_by=(
+      {'field': 'measurement_datetime', 'data_type': 'datetime', 'granularity': 'month'}
+      if target.type == 'bigquery' else none
+    ),
+    cluster_by=(['station_code', 'item_code'] if target.type == 'bigquery' else none),
+    on_schema_change='fail'
   )
 -}}
 
 -- Primary analysis table: long-format measurements joined 1:1 with instrument status.
 -- Each row represents one pollutant reading at one station at one hour.
+-- Incremental: the lookback window re-joins recent hours, picking up instrument statuses that arrived late.
 
 SELECT
     m.measurement_datetime
@@ -23,3 +32,4 @@ FROM {{ ref('measurements_long') }} m
         AND m.item_code = i.item_code
     LEFT JOIN {{ ref('lnd_pollutants') }} p
         ON m.item_code = p.item_code
+{{ lookback_filter('m.measurement_datetime') }}
@@ -1,11 +1,37 @@
 """Export trained model pipelines as pickle files for API serving.
 
-Usage: python scripts/export_models.py
+Usage: python scripts/export_models.py [--workers N] [--threads-per-worker T] [--force] [--global]
+
+Forecast and anomaly targets are trained concurrently in a bounded process
+pool, one fresh process per target so each model's memory goes back to the
+OS when it finishes. Workers default to one per core (capped by the number
+of targets) and each gets an even share of the cores as its LightGBM / BLAS
+thread budget, so the pool does not oversubscribe.
+
+Finished artifacts are checkpointed in `outputs/models/export_state.json`
+with a fingerprint of their inputs: the target's training rows, a summary of
+the network history that forecast station features read, the training code
+under `src/` and the library versions. A re-run skips targets whose artifact
+exists with an unchanged fingerprint, so an interrupted export resumes where
+it stopped; `--force` re-exports everything. Per-target timings are printed
+at the end.
+
+`--global` also trains and exports the global model (all stations × pollutants),
+streaming from the partitioned `data/measurements_clean/` export when present.
 """
 
-import gc
+import argparse
+import hashlib
+import json
+import multiprocessing as mp
 import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from functools import cache
+from importlib.metadata import version
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -13,62 +39,274 @@ import joblib
 import pandas as pd
 
 from src.anomaly.detector import train_anomaly_pipeline
-from src.data.loader import load_full_series, load_series
-from src.forecasting.train_lgbm_ensemble import train_forecast_pipeline
-from src.utils.constants import ANOMALY_TARGETS, FORECAST_TARGETS
+from src.data.loader import load_full_series, load_series, run_query
+from src.data.stations import STATION_REGISTRY_FILE, station_registry
+from src.forecasting.train_global import train_global_model
+from src.forecasting.train_lgbm_ensemble import refit_forecast_pipeline, train_forecast_pipeline
+from src.utils.constants import ANOMALY_TARGETS, BQ_TABLE_CLEAN, FORECAST_TARGETS, PARQUET_CLEAN_DATASET_PATH
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODELS_DIR = os.path.join(ROOT, "outputs", "models")
+EXPORT_STATE_FILE = "export_state.json"
+
+# Code whose changes invalidate an artifact, per kind (plus this script)
+CODE_PATHS = {
+    "forecast": ["src/forecasting", "src/data", "src/utils"],
+    "anomaly": ["src/anomaly", "src/data", "src/utils"],
+}
+LIBRARIES = ("numpy", "pandas", "scikit-learn", "lightgbm")
+
+
+# ---------------------------------------------------------------------------
+# Per-target training (runs in a worker process)
+# ---------------------------------------------------------------------------
+
+
+def train_forecast_model(target: dict, raw: pd.DataFrame, n_jobs: int = -1) -> dict:
+    """Calibrate on the last month of `raw` (the target's normal-status history), then refit on all of it."""
+    sc, ic = target["station_code"], target["item_code"]
+    ts = raw["clean_value"].copy()
+    full_idx = pd.date_range(ts.index.min(), ts.index.max(), freq="h")
+    ts = ts.reindex(full_idx).ffill().bfill()
+
+    # Use last month as val for weight/CQR calibration
+    val_start = ts.index.max() - pd.DateOffset(months=1) + pd.Timedelta(hours=1)
+    train_ts = ts.loc[: val_start - pd.Timedelta(hours=1)]
+    val_ts = ts.loc[val_start:]
+
+    # Refit on the full series, reusing the validation run's features and queries
+    val_pipe = train_forecast_pipeline(
+        train_ts, val_ts, station_code=sc, item_code=ic, keep_feature_cache=True, n_jobs=n_jobs
+    )
+    return refit_forecast_pipeline(val_pipe, val_ts, n_jobs=n_jobs)
+
+
+def train_anomaly_model(target: dict, full: pd.DataFrame, n_jobs: int = -1) -> dict:
+    """Train on every labelled row of `full` (the target's history, all statuses)."""
+    labeled = full[full["instrument_status"].notna()].copy()
+    labeled["clean_value"] = labeled["clean_value"].ffill().bfill()
+    return train_anomaly_pipeline(labeled, n_jobs=n_jobs)
+
+
+TRAINERS = {"forecast": train_forecast_model, "anomaly": train_anomaly_model}
+
+
+@dataclass
+class ExportJob:
+    kind: str
+    target: dict
+    data: pd.DataFrame
+    fingerprint: str
+    path: str
+    threads: int = -1
+
+    @property
+    def label(self) -> str:
+        return f"{self.kind} {self.target['station_code']}/{self.target['item_name']}"
+
 
-MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "outputs", "models")
+def _run_export(job: ExportJob) -> dict:
+    """Train one target under its thread budget and write the artifact atomically."""
+    from threadpoolctl import threadpool_limits
 
+    start = time.perf_counter()
+    with threadpool_limits(limits=job.threads):
+        pipe = TRAINERS[job.kind](job.target, job.data, n_jobs=job.threads)
+    tmp = job.path + ".tmp"
+    joblib.dump(pipe, tmp)
+    os.replace(tmp, job.path)
+    return {"seconds": time.perf_counter() - start}
 
-def export_forecast_models():
-    print("Exporting forecast models...")
-    for target in FORECAST_TARGETS:
-        sc, ic, name = target["station_code"], target["item_code"], target["item_name"]
-        pred_start = target["start"]
 
-        raw = load_series(sc, ic, normal_only=True, end_before=pred_start)
-        ts = raw["clean_value"].copy()
-        full_idx = pd.date_range(ts.index.min(), ts.index.max(), freq="h")
-        ts = ts.reindex(full_idx).ffill().bfill()
+# ---------------------------------------------------------------------------
+# Fingerprints and checkpoints
+# ---------------------------------------------------------------------------
 
-        # Use last month as val for weight/CQR calibration
-        val_start = ts.index.max() - pd.DateOffset(months=1) + pd.Timedelta(hours=1)
-        train_ts = ts.loc[: val_start - pd.Timedelta(hours=1)]
-        val_ts = ts.loc[val_start:]
 
-        val_pipe = train_forecast_pipeline(train_ts, val_ts, station_code=sc, item_code=ic)
-        full_pipe = train_forecast_pipeline(ts, station_code=sc, item_code=ic)
-        full_pipe["weights"] = val_pipe["weights"]
-        full_pipe["cqr_correction"] = val_pipe["cqr_correction"]
+@cache
+def code_hash(kind: str) -> str:
+    """sha256 over the Python sources a `kind` of artifact is trained by."""
+    h = hashlib.sha256()
+    files = [os.path.abspath(__file__)]
+    for rel in CODE_PATHS[kind]:
+        for dirpath, _, names in os.walk(os.path.join(ROOT, rel)):
+            files += [os.path.join(dirpath, n) for n in names if n.endswith(".py")]
+    for path in sorted(files):
+        h.update(os.path.relpath(path, ROOT).encode())
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
 
-        path = os.path.join(MODELS_DIR, f"forecast_{sc}_{ic}.pkl")
-        joblib.dump(full_pipe, path)
-        print(f"  {sc}/{name} → {path}")
-        del val_pipe, full_pipe
-        gc.collect()
 
+def history_summary(end_before: str) -> dict:
+    """Row / value counts, latest hour and rounded total of all measurements before `end_before`.
 
-def export_anomaly_models():
-    print("Exporting anomaly models...")
-    for target in ANOMALY_TARGETS:
-        sc, ic, name = target["station_code"], target["item_code"], target["item_name"]
+    Forecast station features read other stations' history, so a change
+    anywhere in the network before the target's start invalidates it.
+    """
+    row = run_query(
+        f"""
+        SELECT COUNT(*) AS n_rows, COUNT(clean_value) AS n_values,
+               MAX(measurement_datetime) AS latest, ROUND(SUM(clean_value), 2) AS total
+        FROM {BQ_TABLE_CLEAN}
+        WHERE measurement_datetime < @end_before
+        """,
+        {"end_before": pd.Timestamp(end_before)},
+    ).iloc[0]
+    return {k: str(v) for k, v in row.items()}
 
-        full = load_full_series(sc, ic)
-        labeled = full[full["instrument_status"].notna()].copy()
-        labeled["clean_value"] = labeled["clean_value"].ffill().bfill()
 
-        pipe = train_anomaly_pipeline(labeled)
-        path = os.path.join(MODELS_DIR, f"anomaly_{sc}_{ic}.pkl")
-        joblib.dump(pipe, path)
-        print(f"  {sc}/{name} → {path}")
-        del pipe
-        gc.collect()
+def fingerprint(kind: str, target: dict, data: pd.DataFrame, extra: dict | None = None) -> str:
+    h = hashlib.sha256()
+    meta = {
+        "kind": kind,
+        "target": target,
+        "extra": extra,
+        "code": code_hash(kind),
+        "libraries": {lib: version(lib) for lib in LIBRARIES},
+    }
+    h.update(json.dumps(meta, sort_keys=True, default=str).encode())
+    h.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def load_state(models_dir: str) -> dict:
+    path = os.path.join(models_dir, EXPORT_STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(models_dir: str, state: dict) -> None:
+    """Replace the checkpoint file atomically (it is rewritten after every artifact)."""
+    path = os.path.join(models_dir, EXPORT_STATE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def plan_exports(models_dir: str, force: bool = False) -> tuple[list[ExportJob], list[ExportJob]]:
+    """Load every target's inputs and split the jobs into (to export, unchanged)."""
+    state = load_state(models_dir)
+    pending, unchanged = [], []
+    for kind, targets in (("forecast", FORECAST_TARGETS), ("anomaly", ANOMALY_TARGETS)):
+        for target in targets:
+            sc, ic = target["station_code"], target["item_code"]
+            if kind == "forecast":
+                data = load_series(sc, ic, normal_only=True, end_before=target["start"])[["clean_value"]]
+                extra = history_summary(target["start"])
+            else:
+                data = load_full_series(sc, ic)[["clean_value", "instrument_status"]]
+                extra = None
+            name = f"{kind}_{sc}_{ic}.pkl"
+            job = ExportJob(kind, target, data, fingerprint(kind, target, data, extra), os.path.join(models_dir, name))
+            done = state.get(name, {}).get("fingerprint") == job.fingerprint and os.path.exists(job.path)
+            (unchanged if done and not force else pending).append(job)
+    return pending, unchanged
+
+
+# ---------------------------------------------------------------------------
+# Orchestrator
+# ---------------------------------------------------------------------------
+
+
+def export_targets(
+    models_dir: str = MODELS_DIR,
+    max_workers: int | None = None,
+    threads_per_worker: int | None = None,
+    force: bool = False,
+) -> list[dict]:
+    """Export every forecast and anomaly target whose inputs changed, in a process pool.
+
+    Each finished artifact is checkpointed as soon as it is written. A
+    failing target does not stop the others; the failures are raised
+    together once the pool is done. Returns per-target timing records.
+    """
+    pending, unchanged = plan_exports(models_dir, force)
+    for job in unchanged:
+        print(f"  {job.label}: unchanged, skipped")
+    if not pending:
+        return []
+
+    n_cores = os.cpu_count() or 1
+    workers = max(1, min(max_workers or n_cores, len(pending)))
+    threads = threads_per_worker or max(1, n_cores // workers)
+    for job in pending:
+        job.threads = threads
+    print(f"Exporting {len(pending)} models on {workers} workers × {threads} threads...")
+
+    state = load_state(models_dir)
+    timings, failures = [], []
+    wall_start = time.perf_counter()
+    # spawn: forked children would inherit the parent's OpenMP state;
+    # max_tasks_per_child=1 gives every target a fresh process.
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=mp.get_context("spawn"),
+        max_tasks_per_child=1,
+    ) as pool:
+        futures = {pool.submit(_run_export, job): job for job in pending}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                result = future.result()
+            except Exception as exc:
+                failures.append(f"{job.label}: {exc!r}")
+                print(f"  {job.label}: FAILED ({exc!r})")
+                continue
+            state[os.path.basename(job.path)] = {
+                "fingerprint": job.fingerprint,
+                "seconds": round(result["seconds"], 1),
+                "exported_at": datetime.now(UTC).isoformat(timespec="seconds"),
+            }
+            save_state(models_dir, state)
+            timings.append({"label": job.label, "path": job.path, **result})
+            print(f"  {job.label} → {job.path} ({result['seconds']:.0f}s)")
+
+    wall = time.perf_counter() - wall_start
+    total = sum(t["seconds"] for t in timings)
+    print(
+        f"\nExported {len(timings)} models in {wall:.0f}s wall ({total:.0f}s of training, {total / wall:.1f}× speedup)"
+    )
+    for t in sorted(timings, key=lambda t: -t["seconds"]):
+        print(f"  {t['seconds']:7.1f}s  {t['label']}")
+    if failures:
+        raise RuntimeError(f"{len(failures)} export(s) failed:\n" + "\n".join(failures))
+    return timings
+
+
+def export_station_registry():
+    path = os.path.join(MODELS_DIR, STATION_REGISTRY_FILE)
+    registry = station_registry()
+    registry.save(path)
+    print(f"Station registry ({len(registry)} stations) → {path}")
+
+
+def export_global_model():
+    print("Exporting global model...")
+    source = PARQUET_CLEAN_DATASET_PATH if os.path.isdir(PARQUET_CLEAN_DATASET_PATH) else None
+    pipe = train_global_model(parquet_source=source)
+    path = os.path.join(MODELS_DIR, "global_model.pkl")
+    joblib.dump(pipe, path)
+    print(f"  global ({len(pipe['stats'])} station/pollutant pairs) → {path}")
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Export model pipelines for API serving")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per core, capped by targets)")
+    parser.add_argument(
+        "--threads-per-worker", type=int, help="LightGBM/BLAS threads per worker (default: cores / workers)"
+    )
+    parser.add_argument("--force", action="store_true", help="Re-export targets even if their inputs are unchanged")
+    parser.add_argument("--global", dest="global_model", action="store_true", help="Also export the global model")
+    args = parser.parse_args()
+
     os.makedirs(MODELS_DIR, exist_ok=True)
-    export_forecast_models()
-    export_anomaly_models()
+    export_station_registry()
+    export_targets(MODELS_DIR, args.workers, args.threads_per_worker, args.force)
+    if args.global_model:
+        export_global_model()
     print(f"\nAll models exported to {MODELS_DIR}")
 
 
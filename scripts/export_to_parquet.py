@@ -1,16 +1,50 @@
 """Export the DBT presentation layer to a local Parquet snapshot.
 
-Usage: python scripts/export_to_parquet.py
+Usage: python scripts/export_to_parquet.py [--rollups-only | --partitions-only] [--by-station] [--incremental [--snapshot]]
 
 Reads `presentation.dashboard_wide` from the local DuckDB target
 (`dbt_pollution/dev.duckdb`, built via `dbt build --target local`) and writes
 `data/dashboard_wide.parquet`. Both dashboards can then read this snapshot
 offline when the GCP/BigQuery backend is unavailable.
 
+The same rows are also written as a Hive-partitioned dataset,
+`data/dashboard_wide/year=YYYY/month=M/*.parquet`, and
+`logic.measurements_clean` as `data/measurements_clean/` (the long columns
+the global model trains on). Within each partition rows are sorted by
+station (and pollutant) and time and cut into small row groups, so the
+min/max statistics let readers skip files and row groups for date and
+station predicates. `--by-station` adds a `station_code=` level. Each
+dataset has a `_manifest.json` listing its partitions with row counts and
+time spans and a content hash. `--partitions-only` rebuilds the dashboard
+dataset from an existing snapshot.
+
+`--incremental` compares each partition's row count, latest timestamp and
+content hash against the manifest and rewrites only the partitions that are
+new or changed, then swaps the manifest atomically. After an hourly dbt
+refresh that is usually just the current month. The daily and monthly
+rollup rows of the changed months are recomputed from those partitions and
+merged into the rollups, and the per-station rollup is re-summed from the
+monthly one. The single-file snapshot is not rewritten: add `--snapshot` on
+a slower schedule (e.g. nightly) to rebuild it from the partitions. Until
+then, dashboard ranges longer than two months, and the Next.js dashboard,
+lag behind the current month.
+
+Rollups of the snapshot for the dashboard pages are written to
+`data/rollups/` (per station × day, per station × month, per station), each
+with row counts, per-status row counts and per-pollutant sums and non-null
+counts, so means, missingness and dominant status can be re-aggregated over
+any set of stations and days. `--rollups-only` rebuilds them from an existing
+snapshot.
+
 Re-run after any refresh of the DBT models.
 """
 
+import argparse
+import json
+import os
+import shutil
 import sys
+from datetime import UTC, datetime
 from pathlib import Path
 
 import duckdb
@@ -18,9 +52,473 @@ import duckdb
 ROOT = Path(__file__).resolve().parent.parent
 SOURCE_DB = ROOT / "dbt_pollution" / "dev.duckdb"
 OUT_PATH = ROOT / "data" / "dashboard_wide.parquet"
+ROLLUP_DIR = ROOT / "data" / "rollups"
+DATASET_DIR = ROOT / "data" / "dashboard_wide"
+CLEAN_DATASET_DIR = ROOT / "data" / "measurements_clean"
+MANIFEST_FILE = "_manifest.json"
+
+# Rows per row group: about five stations of one month in the wide dataset,
+# small enough for station predicates to skip most groups of a partition
+ROW_GROUP_SIZE = 4096
+PARTITION_KEYS = ["year", "month"]
+WIDE_SORT = ["station_code", "measurement_datetime"]
+CLEAN_SORT = ["station_code", "item_code", "measurement_datetime"]
+
+POLLUTANT_COLUMNS = ["so2_value", "no2_value", "o3_value", "co_value", "pm10_value", "pm2_5_value"]
+STATUS_CODES = [0, 1, 2, 4, 8, 9]
+SNAPSHOT_COLUMNS = [
+    "measurement_datetime",
+    "station_code",
+    "latitude",
+    "longitude",
+    *POLLUTANT_COLUMNS,
+    "instrument_status",
+]
+
+# Rollup name -> time key (None: one row per station over the whole snapshot)
+ROLLUP_KEYS = {
+    "daily": "date_trunc('day', measurement_datetime) AS date",
+    "monthly": "date_trunc('month', measurement_datetime) AS month",
+    "station": None,
+}
+
+
+# Cast the NUMERIC pollutant columns to DOUBLE so pandas reads floats, not
+# Decimal objects (which would break `.describe()` and ML consumers).
+WIDE_SELECT = """
+    SELECT
+        measurement_datetime,
+        station_code,
+        latitude,
+        longitude,
+        CAST(so2_value  AS DOUBLE) AS so2_value,
+        CAST(no2_value  AS DOUBLE) AS no2_value,
+        CAST(o3_value   AS DOUBLE) AS o3_value,
+        CAST(co_value   AS DOUBLE) AS co_value,
+        CAST(pm10_value AS DOUBLE) AS pm10_value,
+        CAST(pm2_5_value AS DOUBLE) AS pm2_5_value,
+        instrument_status
+    FROM main.dashboard_wide
+"""
+
+# The columns `src.forecasting.train_global.ParquetPartitions` reads and filters on
+CLEAN_SELECT = """
+    SELECT
+        measurement_datetime,
+        station_code,
+        item_code,
+        CAST(clean_value AS DOUBLE) AS clean_value,
+        latitude,
+        longitude,
+        instrument_status
+    FROM logic.measurements_clean
+"""
+
+
+# Partition column -> expression over the exported rows
+PARTITION_EXPRESSIONS = {
+    "year": "year(measurement_datetime)",
+    "month": "month(measurement_datetime)",
+    "station_code": "station_code",
+}
+
+
+def _partition_dir(key: tuple, partition_by: list[str]) -> str:
+    return "/".join(f"{col}={value}" for col, value in zip(partition_by, key, strict=True))
+
+
+def partition_stats(con: duckdb.DuckDBPyConnection, select_sql: str, partition_by: list[str]) -> dict[tuple, dict]:
+    """Per partition of `select_sql`: row count, time span and an order-independent content hash."""
+    keys = ", ".join(f"{PARTITION_EXPRESSIONS[col]} AS {col}" for col in partition_by)
+    rows = con.sql(
+        f"""
+        SELECT {keys}, COUNT(*), MIN(measurement_datetime), MAX(measurement_datetime),
+               format('{{:016x}}', bit_xor(hash(t)))
+        FROM ({select_sql}) t
+        GROUP BY ALL
+        ORDER BY ALL
+        """
+    ).fetchall()
+    n = len(partition_by)
+    return {
+        tuple(row[:n]): {
+            "rows": row[n],
+            "min_datetime": row[n + 1].isoformat(),
+            "max_datetime": row[n + 2].isoformat(),
+            "hash": row[n + 3],
+        }
+        for row in rows
+    }
+
+
+def _copy_partitions(
+    con: duckdb.DuckDBPyConnection,
+    select_sql: str,
+    out_dir: Path,
+    partition_by: list[str],
+    sort_by: list[str],
+    only: list[tuple] | None = None,
+) -> None:
+    """Write `select_sql` (just the partitions in `only`, if given) to Hive directories under `out_dir`.
+
+    A `PARTITION_BY` COPY does not keep the `ORDER BY` within its files, so
+    the rows are staged once in a temporary table and each partition is
+    written by its own ordered COPY.
+    """
+    keys = ", ".join(f"{PARTITION_EXPRESSIONS[col]} AS {col}" for col in partition_by)
+    columns = ", ".join(partition_by)
+    semi_join = ""
+    if only is not None:
+        values = ", ".join("(" + ", ".join(str(v) for v in key) + ")" for key in only)
+        semi_join = f"SEMI JOIN (VALUES {values}) AS k({columns}) USING ({columns})"
+    con.sql(
+        f"""
+        CREATE OR REPLACE TEMP TABLE export_rows AS
+        SELECT * FROM (SELECT *, {keys} FROM ({select_sql})) {semi_join}
+        ORDER BY {columns}
+        """
+    )
+    try:
+        order_by = ", ".join(c for c in sort_by if c not in partition_by)
+        for key in con.sql(f"SELECT DISTINCT {columns} FROM export_rows ORDER BY ALL").fetchall():
+            part_dir = out_dir / _partition_dir(key, partition_by)
+            part_dir.mkdir(parents=True, exist_ok=True)
+            where = " AND ".join(f"{col} = {value}" for col, value in zip(partition_by, key, strict=True))
+            con.sql(
+                f"""
+                COPY (
+                    SELECT * EXCLUDE ({columns}) FROM export_rows WHERE {where}
+                    ORDER BY {order_by}
+                ) TO '{part_dir / "data_0.parquet"}' (
+                    FORMAT parquet, COMPRESSION zstd, ROW_GROUP_SIZE {ROW_GROUP_SIZE}
+                )
+                """
+            )
+    finally:
+        con.sql("DROP TABLE IF EXISTS export_rows")
+
+
+def _partition_entry(dataset_dir: Path, key: tuple, partition_by: list[str], files: list[Path], stats: dict) -> dict:
+    return {
+        "values": dict(zip(partition_by, key, strict=True)),
+        "files": [f.relative_to(dataset_dir).as_posix() for f in files],
+        "bytes": sum(f.stat().st_size for f in files),
+        **stats,
+    }
+
+
+def read_manifest(dataset_dir: Path) -> dict | None:
+    path = dataset_dir / MANIFEST_FILE
+    return json.loads(path.read_text()) if path.exists() else None
+
+
+def _write_manifest(dataset_dir: Path, manifest: dict) -> None:
+    """Replace the manifest atomically: readers see either the old or the new partition list."""
+    tmp = dataset_dir / (MANIFEST_FILE + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2) + "\n")
+    os.replace(tmp, dataset_dir / MANIFEST_FILE)
+
+
+def write_dataset(
+    con: duckdb.DuckDBPyConnection,
+    select_sql: str,
+    out_dir: Path,
+    sort_by: list[str],
+    by_station: bool = False,
+) -> dict:
+    """Write `select_sql` as a Hive-partitioned, sorted dataset with a manifest; returns the manifest.
+
+    The dataset is built next to `out_dir` and swapped in once complete, so
+    readers never see a half-written directory.
+    """
+    partition_by = PARTITION_KEYS + (["station_code"] if by_station else [])
+    tmp_dir = out_dir.with_name(out_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    _copy_partitions(con, select_sql, tmp_dir, partition_by, sort_by)
+
+    stats = partition_stats(con, select_sql, partition_by)
+    partitions = [
+        _partition_entry(
+            tmp_dir, key, partition_by, sorted((tmp_dir / _partition_dir(key, partition_by)).glob("*.parquet")), s
+        )
+        for key, s in stats.items()
+    ]
+    columns = con.sql(
+        f"DESCRIBE SELECT * FROM read_parquet('{tmp_dir}/**/*.parquet', hive_partitioning = true)"
+    ).fetchall()
+    manifest = {
+        "dataset": out_dir.name,
+        "created_at": datetime.now(UTC).isoformat(timespec="seconds"),
+        "partition_by": partition_by,
+        "sort_by": sort_by,
+        "row_group_size": ROW_GROUP_SIZE,
+        "compression": "zstd",
+        # Content hashes are DuckDB `hash()` values, only comparable within a version
+        "duckdb_version": duckdb.__version__,
+        "columns": {name: dtype for name, dtype, *_ in columns},
+        "rows": sum(p["rows"] for p in partitions),
+        "partitions": partitions,
+    }
+    _write_manifest(tmp_dir, manifest)
+
+    old_dir = out_dir.with_name(out_dir.name + ".old")
+    if out_dir.exists():
+        out_dir.rename(old_dir)
+    tmp_dir.rename(out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+    size_mb = sum(p["bytes"] for p in partitions) / 1_000_000
+    print(f"wrote {out_dir} ({manifest['rows']:,} rows in {len(partitions)} partitions, {size_mb:.1f} MB)")
+    return manifest
+
+
+def refresh_dataset(
+    con: duckdb.DuckDBPyConnection,
+    select_sql: str,
+    out_dir: Path,
+    sort_by: list[str],
+    by_station: bool = False,
+) -> list[tuple]:
+    """Rewrite only the partitions of `out_dir` whose rows changed in `select_sql`.
+
+    Returns the keys of the partitions rewritten or dropped (empty when
+    `out_dir` was up to date).
+
+    A partition is rewritten when it is new or its row count, latest
+    `measurement_datetime` or content hash differs from the manifest, and
+    dropped when it no longer has rows. New files get fresh names next to
+    the old ones, the manifest is swapped atomically, and only then are the
+    superseded files deleted, so a reader that lists files from the current
+    manifest never sees a mix. Readers holding an older partition list must
+    re-read the manifest (the dashboard does on mtime change). Falls back to
+    `write_dataset` without a compatible manifest (first run, another
+    layout, or another DuckDB version).
+    """
+    partition_by = PARTITION_KEYS + (["station_code"] if by_station else [])
+    manifest = read_manifest(out_dir)
+    layout = {"partition_by": partition_by, "sort_by": sort_by, "row_group_size": ROW_GROUP_SIZE}
+    if (
+        manifest is None
+        or any(manifest.get(k) != v for k, v in layout.items())
+        or (manifest.get("duckdb_version") != duckdb.__version__)
+    ):
+        old_keys = {tuple(p["values"].values()) for p in manifest["partitions"]} if manifest else set()
+        written = write_dataset(con, select_sql, out_dir, sort_by, by_station)
+        return sorted(old_keys | {tuple(p["values"].values()) for p in written["partitions"]})
+
+    stats = partition_stats(con, select_sql, partition_by)
+    current = {tuple(p["values"][col] for col in partition_by): p for p in manifest["partitions"]}
+    changed = [
+        key
+        for key, s in stats.items()
+        if key not in current or any(current[key][f] != s[f] for f in ("rows", "max_datetime", "hash"))
+    ]
+    removed = [key for key in current if key not in stats]
+    if not changed and not removed:
+        print(f"{out_dir} is up to date ({len(current)} partitions)")
+        return []
+
+    staging = out_dir.with_name(out_dir.name + ".staging")
+    shutil.rmtree(staging, ignore_errors=True)
+    if changed:
+        _copy_partitions(con, select_sql, staging, partition_by, sort_by, only=changed)
+
+    entries = {key: p for key, p in current.items() if key not in removed}
+    for key in changed:
+        part_dir = _partition_dir(key, partition_by)
+        (out_dir / part_dir).mkdir(parents=True, exist_ok=True)
+        files = []
+        for i, staged in enumerate(sorted((staging / part_dir).glob("*.parquet"))):
+            path = out_dir / part_dir / f"data_{stats[key]['hash']}_{i}.parquet"
+            os.replace(staged, path)
+            files.append(path)
+        entries[key] = _partition_entry(out_dir, key, partition_by, files, stats[key])
+
+    partitions = [entries[key] for key in sorted(entries)]
+    _write_manifest(
+        out_dir,
+        {
+            **manifest,
+            "created_at": datetime.now(UTC).isoformat(timespec="seconds"),
+            "rows": sum(p["rows"] for p in partitions),
+            "partitions": partitions,
+        },
+    )
+
+    live = {f for p in partitions for f in p["files"]}
+    for p in manifest["partitions"]:
+        for f in p["files"]:
+            if f not in live:
+                (out_dir / f).unlink(missing_ok=True)
+    for key in removed:
+        part_dir = out_dir / _partition_dir(key, partition_by)
+        for d in [part_dir, *part_dir.parents]:
+            if d == out_dir or any(d.iterdir()):
+                break
+            d.rmdir()
+    shutil.rmtree(staging, ignore_errors=True)
+
+    print(f"refreshed {out_dir}: rewrote {len(changed)} of {len(stats)} partitions, dropped {len(removed)}")
+    return sorted(changed + removed)
+
+
+def write_snapshot(con: duckdb.DuckDBPyConnection, select_sql: str, out_path: Path = OUT_PATH) -> None:
+    """Write the single-file snapshot (time-ordered), replacing the old one only once complete."""
+    tmp = out_path.with_name(out_path.name + ".tmp")
+    con.sql(f"SELECT * FROM ({select_sql}) ORDER BY measurement_datetime, station_code").write_parquet(
+        str(tmp), compression="zstd"
+    )
+    os.replace(tmp, out_path)
+    rows = con.sql(f"SELECT COUNT(*) AS n FROM read_parquet('{out_path}')").fetchone()[0]
+    size_mb = out_path.stat().st_size / 1_000_000
+    print(f"wrote {out_path} ({rows:,} rows, {size_mb:.1f} MB)")
+
+
+def dataset_select(dataset_dir: Path, months: set[tuple[int, int]] | None = None) -> str:
+    """The snapshot columns, in snapshot order, over the files listed in a dataset's manifest.
+
+    With `months`, just the files of those (year, month) partitions.
+    """
+    files = [
+        str(dataset_dir / f)
+        for p in read_manifest(dataset_dir)["partitions"]
+        if months is None or (p["values"]["year"], p["values"]["month"]) in months
+        for f in p["files"]
+    ]
+    return f"""
+        SELECT {", ".join(c if c != "station_code" else "CAST(station_code AS INTEGER) AS station_code" for c in SNAPSHOT_COLUMNS)}
+        FROM read_parquet({files}, hive_partitioning = true, union_by_name = true)
+    """
+
+
+# Rollup measure -> aggregate; all are counts or sums, so they re-aggregate by summing
+ROLLUP_MEASURES = {
+    "n_rows": "COUNT(*)",
+    "status_rows": "COUNT(instrument_status)",
+    **{f"status_{code}_rows": f"COUNT(*) FILTER (WHERE instrument_status = {code})" for code in STATUS_CODES},
+    **{
+        name: agg
+        for col in POLLUTANT_COLUMNS
+        for name, agg in ((f"{col}_sum", f"SUM({col})"), (f"{col}_count", f"COUNT({col})"))
+    },
+}
+
+
+def _rollup_select(source: str, time_key: str | None) -> str:
+    keys = ["station_code"] + ([time_key] if time_key else [])
+    group_by = ", ".join(str(i + 1) for i in range(len(keys)))
+    return f"""
+        SELECT
+            {", ".join(keys)},
+            ANY_VALUE(latitude) AS latitude,
+            ANY_VALUE(longitude) AS longitude,
+            {", ".join(f"{agg} AS {name}" for name, agg in ROLLUP_MEASURES.items())}
+        FROM {source}
+        GROUP BY {group_by}
+        ORDER BY {group_by}
+    """
+
+
+def _write_rollup(con: duckdb.DuckDBPyConnection, sql: str, path: Path) -> None:
+    """Replace one rollup file atomically (the dashboard re-reads it on mtime change)."""
+    tmp = path.with_name(path.name + ".tmp")
+    con.sql(sql).write_parquet(str(tmp), compression="zstd")
+    os.replace(tmp, path)
+    rows = con.sql(f"SELECT COUNT(*) FROM read_parquet('{path}')").fetchone()[0]
+    print(f"wrote {path} ({rows:,} rows)")
+
+
+def write_rollups(con: duckdb.DuckDBPyConnection, snapshot: Path = OUT_PATH, out_dir: Path = ROLLUP_DIR) -> None:
+    """Aggregate the snapshot into the dashboard rollups (one Parquet file each)."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for name, time_key in ROLLUP_KEYS.items():
+        _write_rollup(con, _rollup_select(f"read_parquet('{snapshot}')", time_key), out_dir / f"{name}.parquet")
+
+
+def refresh_rollups(
+    con: duckdb.DuckDBPyConnection,
+    dataset_dir: Path,
+    months: set[tuple[int, int]],
+    out_dir: Path = ROLLUP_DIR,
+) -> None:
+    """Recompute the rollup rows of `months` from the partitioned dataset and merge them into the rollups.
+
+    Daily and monthly rows of the other months are kept as they are; the
+    per-station rollup is re-summed from the merged monthly one (every
+    measure is a count or a sum). Months without partitions any more are
+    dropped. Builds every month when a rollup file is missing.
+    """
+    paths = {name: out_dir / f"{name}.parquet" for name in ROLLUP_KEYS}
+    partitions = read_manifest(dataset_dir)["partitions"]
+    if not all(path.exists() for path in paths.values()):
+        months = {(p["values"]["year"], p["values"]["month"]) for p in partitions}
+        out_dir.mkdir(parents=True, exist_ok=True)
+        for name in ("daily", "monthly"):
+            paths[name].unlink(missing_ok=True)
+    if not months:
+        return
+    live = {(p["values"]["year"], p["values"]["month"]) for p in partitions}
+    source = f"({dataset_select(dataset_dir, months & live)})" if months & live else None
+    stale = ", ".join(f"TIMESTAMP '{year}-{month:02d}-01'" for year, month in sorted(months))
+
+    for name in ("daily", "monthly"):
+        time_col = ROLLUP_KEYS[name].rsplit(" AS ", 1)[1]
+        parts = []
+        if paths[name].exists():
+            parts.append(
+                f"SELECT * FROM read_parquet('{paths[name]}') WHERE date_trunc('month', {time_col}) NOT IN ({stale})"
+            )
+        if source is not None:
+            parts.append(f"SELECT * FROM ({_rollup_select(source, ROLLUP_KEYS[name])})")
+        _write_rollup(con, " UNION ALL BY NAME ".join(parts) + " ORDER BY 1, 2", paths[name])
+
+    sums = ", ".join(
+        f"CAST(SUM({name}) AS {'DOUBLE' if name.endswith('_sum') else 'BIGINT'}) AS {name}" for name in ROLLUP_MEASURES
+    )
+    _write_rollup(
+        con,
+        f"""
+        SELECT station_code, ANY_VALUE(latitude) AS latitude, ANY_VALUE(longitude) AS longitude, {sums}
+        FROM read_parquet('{paths["monthly"]}')
+        GROUP BY 1
+        ORDER BY 1
+        """,
+        paths["station"],
+    )
 
 
 def main() -> int:
+    parser = argparse.ArgumentParser(description="Export the dbt presentation layer to local Parquet")
+    only = parser.add_mutually_exclusive_group()
+    only.add_argument("--rollups-only", action="store_true", help="Rebuild the rollups from the existing snapshot")
+    only.add_argument(
+        "--partitions-only", action="store_true", help="Rebuild the partitioned dataset from the existing snapshot"
+    )
+    parser.add_argument("--by-station", action="store_true", help="Also partition the datasets by station_code")
+    parser.add_argument(
+        "--incremental", action="store_true", help="Rewrite only new or changed partitions of the datasets"
+    )
+    parser.add_argument(
+        "--snapshot",
+        action="store_true",
+        help="With --incremental, also rebuild the single-file snapshot from the partitions (e.g. nightly)",
+    )
+    args = parser.parse_args()
+    write = refresh_dataset if args.incremental else write_dataset
+
+    if args.rollups_only or args.partitions_only:
+        if not OUT_PATH.exists():
+            print(
+                f"error: {OUT_PATH} not found. Run without --rollups-only / --partitions-only first.", file=sys.stderr
+            )
+            return 2
+        con = duckdb.connect()
+        if args.rollups_only:
+            write_rollups(con)
+        else:
+            write(con, f"SELECT * FROM read_parquet('{OUT_PATH}')", DATASET_DIR, WIDE_SORT, args.by_station)
+        return 0
+
     if not SOURCE_DB.exists():
         print(
             f"error: {SOURCE_DB} not found. Build it with `cd dbt_pollution && dbt build --target local`.",
@@ -31,31 +529,20 @@ def main() -> int:
     OUT_PATH.parent.mkdir(exist_ok=True)
 
     con = duckdb.connect(str(SOURCE_DB), read_only=True)
-    # Cast the NUMERIC pollutant columns to DOUBLE so pandas reads floats, not
-    # Decimal objects (which would break `.describe()` and ML consumers).
-    con.sql(
-        """
-        SELECT
-            measurement_datetime,
-            station_code,
-            latitude,
-            longitude,
-            CAST(so2_value  AS DOUBLE) AS so2_value,
-            CAST(no2_value  AS DOUBLE) AS no2_value,
-            CAST(o3_value   AS DOUBLE) AS o3_value,
-            CAST(co_value   AS DOUBLE) AS co_value,
-            CAST(pm10_value AS DOUBLE) AS pm10_value,
-            CAST(pm2_5_value AS DOUBLE) AS pm2_5_value,
-            instrument_status
-        FROM main.dashboard_wide
-        ORDER BY measurement_datetime, station_code
-        """
-    ).write_parquet(str(OUT_PATH), compression="zstd")
-
-    rows = con.sql(f"SELECT COUNT(*) AS n FROM read_parquet('{OUT_PATH}')").fetchone()[0]
-    size_mb = OUT_PATH.stat().st_size / 1_000_000
+    if not args.incremental:
+        write_snapshot(con, WIDE_SELECT)
+        write_dataset(con, WIDE_SELECT, DATASET_DIR, WIDE_SORT, args.by_station)
+        write_dataset(con, CLEAN_SELECT, CLEAN_DATASET_DIR, CLEAN_SORT, args.by_station)
+        write_rollups(con)
+        return 0
 
-    print(f"wrote {OUT_PATH} ({rows:,} rows, {size_mb:.1f} MB)")
+    # Rollup rows are recomputed for the changed months only, from the local
+    # partitions; the snapshot is left alone unless asked for (or missing)
+    changed = refresh_dataset(con, WIDE_SELECT, DATASET_DIR, WIDE_SORT, args.by_station)
+    refresh_dataset(con, CLEAN_SELECT, CLEAN_DATASET_DIR, CLEAN_SORT, args.by_station)
+    refresh_rollups(con, DATASET_DIR, {key[:2] for key in changed})
+    if args.snapshot or not OUT_PATH.exists():
+        write_snapshot(con, dataset_select(DATASET_DIR))
     return 0
 
 
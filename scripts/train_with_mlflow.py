@@ -7,6 +7,7 @@ Usage:
     python scripts/train_with_mlflow.py --task forecast --all
     python scripts/train_with_mlflow.py --task anomaly --all
     python scripts/train_with_mlflow.py --task forecast --target 206/0
+    python scripts/train_with_mlflow.py --task forecast --all --workers 6 --threads-per-worker 2
 """
 
 import argparse
@@ -20,6 +21,7 @@ import joblib
 import mlflow
 import numpy as np
 import pandas as pd
+from mlflow.tracking import MlflowClient
 
 from src.anomaly.detector import (
     evaluate_anomaly_detection,
@@ -27,12 +29,8 @@ from src.anomaly.detector import (
     train_anomaly_pipeline,
 )
 from src.data.loader import load_full_series, load_series
-from src.forecasting.evaluate import evaluate_intervals, evaluate_predictions
-from src.forecasting.train_lgbm_ensemble import (
-    predict_with_pipeline,
-    train_forecast_pipeline,
-    walk_forward_cv,
-)
+from src.forecasting.backtest import run_backtest, summarize_backtest
+from src.forecasting.train_lgbm_ensemble import refit_forecast_pipeline, train_forecast_pipeline
 from src.utils.constants import ANOMALY_TARGETS, FORECAST_TARGETS
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -40,24 +38,38 @@ TRACKING_URI = f"sqlite:///{os.path.join(PROJECT_ROOT, 'mlflow.db')}"
 MODELS_DIR = os.path.join(PROJECT_ROOT, "outputs", "models")
 
 
-def train_forecast(target: dict):
-    """Train and log a single forecast target."""
-    sc, ic, name = target["station_code"], target["item_code"], target["item_name"]
-    pred_start, pred_end = target["start"], target["end"]
-
-    raw = load_series(sc, ic, normal_only=True, end_before=pred_start)
+def load_forecast_series(target: dict) -> pd.Series:
+    """Load a target's normal-status history up to its prediction start, gap-filled hourly."""
+    raw = load_series(target["station_code"], target["item_code"], normal_only=True, end_before=target["start"])
     ts = raw["clean_value"].copy()
     full_idx = pd.date_range(ts.index.min(), ts.index.max(), freq="h")
-    ts = ts.reindex(full_idx).ffill().bfill()
-    overall_std = ts.std()
+    return ts.reindex(full_idx).ffill().bfill()
 
-    with mlflow.start_run(run_name=f"forecast_{sc}_{name}"):
-        mlflow.log_params(
-            {
+
+def train_forecast(targets: list[dict], workers: int | None = None, threads_per_worker: int | None = None):
+    """Backtest all targets in parallel, then train, log and export each final model.
+
+    Walk-forward folds for every target run concurrently in a process pool;
+    per-fold metrics are logged to each target's MLflow run as folds finish.
+    """
+    client = MlflowClient()
+    experiment_id = mlflow.get_experiment_by_name("forecasting").experiment_id
+
+    # Runs are created up front and ended one by one below; if anything fails
+    # on the way, the ones not yet ended are marked FAILED instead of staying RUNNING
+    series, run_ids, finished = {}, {}, set()
+    try:
+        for target in targets:
+            sc, ic, name = target["station_code"], target["item_code"], target["item_name"]
+            series[(sc, ic)] = load_forecast_series(target)
+
+            run_id = client.create_run(experiment_id, run_name=f"forecast_{sc}_{name}").info.run_id
+            run_ids[(sc, ic)] = run_id
+            params = {
                 "station_code": sc,
                 "item_code": ic,
                 "pollutant": name,
-                "prediction_period": f"{pred_start} to {pred_end}",
+                "prediction_period": f"{target['start']} to {target['end']}",
                 "model_type": "lgbm_ensemble",
                 "n_estimators": 800,
                 "num_leaves": 63,
@@ -65,68 +77,72 @@ def train_forecast(target: dict):
                 "target_transform": "log1p",
                 "intervals": "CQR",
             }
-        )
-
-        # Walk-forward CV
-        folds = walk_forward_cv(ts, n_folds=3, test_size=720, min_train_size=8760)
-        cv_nrmse, cv_r2, cv_cov = [], [], []
-
-        for i, fold in enumerate(folds):
-            ft = ts.iloc[: fold["train_end"]]
-            fv = ts.iloc[fold["test_start"] : fold["test_end"]]
-
-            pipe = train_forecast_pipeline(ft, fv, station_code=sc, item_code=ic)
-            preds = predict_with_pipeline(pipe, fv.index)
-
-            m = evaluate_predictions(fv, preds["ensemble"])
-            iv = evaluate_intervals(fv.values, preds["q05"].values, preds["q95"].values)
-            nrmse = m["rmse"] / overall_std
-
-            mlflow.log_metrics(
-                {
-                    f"fold{i}_nrmse": round(nrmse, 4),
-                    f"fold{i}_r2": round(m["r2"], 4),
-                    f"fold{i}_coverage": round(iv["empirical_coverage"], 4),
-                },
-                step=i,
+            for k, v in params.items():
+                client.log_param(run_id, k, v)
+
+        def log_fold(result: dict):
+            run_id = run_ids[(result["station_code"], result["item_code"])]
+            i = result["fold"]
+            for metric in ("nrmse", "r2", "coverage"):
+                client.log_metric(run_id, f"fold{i}_{metric}", round(result[metric], 4), step=i)
+            print(
+                f"  {result['station_code']}/{result['item_name']} fold {i}: "
+                f"nRMSE={result['nrmse']:.3f} ({result['seconds']:.0f}s)"
             )
 
-            cv_nrmse.append(nrmse)
-            cv_r2.append(m["r2"])
-            cv_cov.append(iv["empirical_coverage"])
-            del pipe, preds
-            gc.collect()
-
-        mlflow.log_metrics(
-            {
-                "cv_nrmse": round(np.mean(cv_nrmse), 4),
-                "cv_r2": round(np.mean(cv_r2), 4),
-                "cv_coverage": round(np.mean(cv_cov), 4),
-            }
+        # Walk-forward CV (all targets × folds in parallel)
+        results = run_backtest(
+            targets,
+            series,
+            n_folds=3,
+            test_size=720,
+            min_train_size=8760,
+            max_workers=workers,
+            threads_per_worker=threads_per_worker,
+            on_fold_done=log_fold,
         )
-
-        # Train final model and export
-        val_start = ts.index.max() - pd.DateOffset(months=1) + pd.Timedelta(hours=1)
-        train_final = ts.loc[: val_start - pd.Timedelta(hours=1)]
-        val_final = ts.loc[val_start:]
-
-        final_pipe = train_forecast_pipeline(train_final, val_final, station_code=sc, item_code=ic)
-        full_pipe = train_forecast_pipeline(ts, station_code=sc, item_code=ic)
-        full_pipe["weights"] = final_pipe["weights"]
-        full_pipe["cqr_correction"] = final_pipe["cqr_correction"]
-
-        # Save model artifact
-        os.makedirs(MODELS_DIR, exist_ok=True)
-        model_path = os.path.join(MODELS_DIR, f"forecast_{sc}_{ic}.pkl")
-        joblib.dump(full_pipe, model_path)
-        mlflow.log_artifact(model_path)
-
-        mlflow.log_params({f"weight_{k}": round(v, 3) for k, v in full_pipe["weights"].items()})
-        mlflow.set_tag("status", "production")
-
-        print(f"  {sc}/{name}: nRMSE={np.mean(cv_nrmse):.3f}, coverage={np.mean(cv_cov):.3f}")
-        del final_pipe, full_pipe
-        gc.collect()
+        summary = summarize_backtest(results)
+
+        for target in targets:
+            sc, ic, name = target["station_code"], target["item_code"], target["item_name"]
+            ts = series[(sc, ic)]
+            cv = summary.get((sc, ic), {})
+
+            with mlflow.start_run(run_id=run_ids[(sc, ic)]):
+                mlflow.log_metrics({k: round(v, 4) for k, v in cv.items() if k.startswith("cv_")})
+
+                # Train final model and export
+                val_start = ts.index.max() - pd.DateOffset(months=1) + pd.Timedelta(hours=1)
+                train_final = ts.loc[: val_start - pd.Timedelta(hours=1)]
+                val_final = ts.loc[val_start:]
+
+                # Refit on the full series, reusing the validation run's features and queries
+                final_pipe = train_forecast_pipeline(
+                    train_final, val_final, station_code=sc, item_code=ic, keep_feature_cache=True
+                )
+                full_pipe = refit_forecast_pipeline(final_pipe, val_final)
+
+                # Save model artifact
+                os.makedirs(MODELS_DIR, exist_ok=True)
+                model_path = os.path.join(MODELS_DIR, f"forecast_{sc}_{ic}.pkl")
+                joblib.dump(full_pipe, model_path)
+                mlflow.log_artifact(model_path)
+
+                mlflow.log_params({f"weight_{k}": round(v, 3) for k, v in full_pipe["weights"].items()})
+                mlflow.set_tag("status", "production")
+
+                print(
+                    f"  {sc}/{name}: nRMSE={cv.get('cv_nrmse', np.nan):.3f}, coverage={cv.get('cv_coverage', np.nan):.3f}"
+                )
+                del final_pipe, full_pipe
+                gc.collect()
+            finished.add((sc, ic))
+
+    except BaseException:
+        for key, run_id in run_ids.items():
+            if key not in finished:
+                client.set_terminated(run_id, "FAILED")
+        raise
 
 
 def train_anomaly(target: dict):
@@ -189,6 +205,10 @@ def main():
     parser.add_argument("--task", choices=["forecast", "anomaly"], required=True)
     parser.add_argument("--target", help="e.g. 206/0 for station 206, item_code 0")
     parser.add_argument("--all", action="store_true", help="Train all targets")
+    parser.add_argument("--workers", type=int, help="Forecast CV worker processes (default: one per core)")
+    parser.add_argument(
+        "--threads-per-worker", type=int, help="LightGBM threads per CV worker (default: cores / workers)"
+    )
     args = parser.parse_args()
 
     mlflow.set_tracking_uri(TRACKING_URI)
@@ -196,23 +216,24 @@ def main():
     if args.task == "forecast":
         mlflow.set_experiment("forecasting")
         targets = FORECAST_TARGETS
-        train_fn = train_forecast
     else:
         mlflow.set_experiment("anomaly-detection")
         targets = ANOMALY_TARGETS
-        train_fn = train_anomaly
 
     if args.all:
         print(f"Training all {len(targets)} {args.task} targets...")
-        for t in targets:
-            train_fn(t)
     elif args.target:
         sc, ic = args.target.split("/")
-        t = next(t for t in targets if t["station_code"] == int(sc) and t["item_code"] == int(ic))
-        train_fn(t)
+        targets = [next(t for t in targets if t["station_code"] == int(sc) and t["item_code"] == int(ic))]
     else:
         parser.error("Specify --all or --target")
 
+    if args.task == "forecast":
+        train_forecast(targets, workers=args.workers, threads_per_worker=args.threads_per_worker)
+    else:
+        for t in targets:
+            train_anomaly(t)
+
 
 if __name__ == "__main__":
     main()
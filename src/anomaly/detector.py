@@ -136,6 +136,7 @@ def filter_min_run_length(preds: np.ndarray, min_length: int = 3) -> np.ndarray:
 def train_anomaly_pipeline(
     train_df: pd.DataFrame,
     val_df: pd.DataFrame | None = None,
+    n_jobs: int = -1,
 ) -> dict:
     """Train the supervised anomaly detection pipeline.
 
@@ -143,6 +144,7 @@ def train_anomaly_pipeline(
         train_df: DataFrame with clean_value and instrument_status columns,
                   datetime index.
         val_df: Optional validation DataFrame for threshold tuning.
+        n_jobs: Thread budget for the Isolation Forest and LightGBM (-1 = all cores).
 
     Returns pipeline dict with model, threshold, feature info.
     """
@@ -154,7 +156,7 @@ def train_anomaly_pipeline(
     feat_cols = _get_feature_cols(train_feats)
 
     # Add Isolation Forest anomaly score as bonus feature (XGBOD pattern)
-    iso = IsolationForest(n_estimators=200, contamination="auto", random_state=42, n_jobs=-1)
+    iso = IsolationForest(n_estimators=200, contamination="auto", random_state=42, n_jobs=n_jobs)
     iso_input_cols = list(feat_cols)  # save before adding iso_score
     clean_train = train_feats[iso_input_cols].fillna(0).values
     iso.fit(clean_train)
@@ -178,7 +180,7 @@ def train_anomaly_pipeline(
         reg_alpha=0.1,
         reg_lambda=1.0,
         random_state=42,
-        n_jobs=-1,
+        n_jobs=n_jobs,
         verbose=-1,
     )
 
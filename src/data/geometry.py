@@ -0,0 +1,130 @@
+"""Station geometry: great-circle distances, neighbour index and IDW weights.
+
+Spatial features (k nearest stations) and weather interpolation (3 weather
+points) both weight by inverse distance. Distances here are haversine
+kilometres rather than Euclidean degrees, which overweighted east-west
+neighbours by ~1/cos(latitude). The station network is small (25 stations),
+so a dense distance matrix and per-station neighbour ranking are built once
+from the station registry; IDW weights are memoized per (station, k, power), and as a
+sparse network-wide weight matrix per (k, power).
+"""
+
+import logging
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Co-located points are clamped to this distance (km) instead of infinite weight
+MIN_DISTANCE_KM = 1e-3
+
+
+def haversine_km(
+    lat1: float | np.ndarray,
+    lon1: float | np.ndarray,
+    lat2: float | np.ndarray,
+    lon2: float | np.ndarray,
+) -> np.ndarray:
+    """Great-circle distance in km between (broadcastable) coordinate arrays in degrees."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=float)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def idw_weights(distances: np.ndarray, power: float = 2.0) -> np.ndarray:
+    """Normalized inverse-distance weights ``d**-power / sum(d**-power)``."""
+    w = 1.0 / np.maximum(np.asarray(distances, dtype=float), MIN_DISTANCE_KM) ** power
+    return w / w.sum()
+
+
+@dataclass(frozen=True, eq=False)
+class StationIndex:
+    """Dense distance matrix and nearest-neighbour ranking for a station network."""
+
+    codes: np.ndarray
+    latitude: np.ndarray
+    longitude: np.ndarray
+    distances: np.ndarray  # (n, n) km
+    ranked: np.ndarray  # (n, n - 1) positions of the other stations, nearest first
+    _position: dict[int, int] = field(default_factory=dict, repr=False)
+    _idw_cache: dict[tuple[int, int, float], tuple[list[int], np.ndarray]] = field(default_factory=dict, repr=False)
+    _matrix_cache: dict[tuple[int, float], sparse.csr_matrix] = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def from_frame(cls, stations: pd.DataFrame) -> "StationIndex":
+        """Build from a frame with `station_code`, `latitude`, `longitude` (one row per station)."""
+        stations = stations.drop_duplicates("station_code").sort_values("station_code")
+        codes = stations["station_code"].to_numpy(dtype=np.int64)
+        lat = stations["latitude"].to_numpy(dtype=float)
+        lon = stations["longitude"].to_numpy(dtype=float)
+
+        distances = haversine_km(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+        # Stable sort keeps code order for equidistant stations; column 0 is the station itself
+        ranked = np.argsort(np.where(np.eye(len(codes), dtype=bool), -1.0, distances), axis=1, kind="stable")[:, 1:]
+        return cls(codes, lat, lon, distances, ranked, {int(c): i for i, c in enumerate(codes)})
+
+    def position(self, station_code: int) -> int:
+        try:
+            return self._position[int(station_code)]
+        except KeyError:
+            raise KeyError(f"Unknown station_code {station_code}") from None
+
+    def coordinates(self, station_code: int) -> tuple[float, float]:
+        """(latitude, longitude) of a station."""
+        i = self.position(station_code)
+        return float(self.latitude[i]), float(self.longitude[i])
+
+    def neighbors(self, station_code: int, k: int = 5) -> tuple[list[int], np.ndarray]:
+        """The k nearest other stations and their distances in km."""
+        i = self.position(station_code)
+        nearest = self.ranked[i, :k]
+        return self.codes[nearest].tolist(), self.distances[i, nearest]
+
+    def idw_weights(self, station_code: int, k: int = 5, power: float = 2.0) -> tuple[list[int], np.ndarray]:
+        """The k nearest stations and their normalized IDW weights (memoized)."""
+        key = (int(station_code), k, power)
+        if key not in self._idw_cache:
+            codes, dists = self.neighbors(station_code, k)
+            weights = idw_weights(dists, power)
+            weights.flags.writeable = False
+            self._idw_cache[key] = (codes, weights)
+        codes, weights = self._idw_cache[key]
+        return list(codes), weights
+
+    def weight_matrix(self, k: int = 5, power: float = 2.0) -> sparse.csr_matrix:
+        """Sparse (n, n) k-NN IDW matrix over `codes`: row i holds station i's neighbour weights (memoized)."""
+        key = (k, power)
+        if key not in self._matrix_cache:
+            n = len(self.codes)
+            cols = self.ranked[:, :k]
+            weights = np.vstack([self.idw_weights(code, k, power)[1] for code in self.codes])
+            rows = np.repeat(np.arange(n), cols.shape[1])
+            self._matrix_cache[key] = sparse.csr_matrix((weights.ravel(), (rows, cols.ravel())), shape=(n, n))
+        return self._matrix_cache[key]
+
+
+def load_station_index() -> StationIndex:
+    """Index over the process-wide station registry (`src.data.stations`)."""
+    from src.data.stations import station_registry
+
+    return station_registry().index
+
+
+@lru_cache(maxsize=256)
+def point_idw_weights(
+    lat: float,
+    lon: float,
+    points: tuple[tuple[float, float], ...],
+    power: float = 2.0,
+) -> np.ndarray:
+    """Normalized IDW weights from (lat, lon) to fixed `points` ((lat, lon) pairs), memoized."""
+    pts = np.asarray(points, dtype=float)
+    weights = idw_weights(haversine_km(lat, lon, pts[:, 0], pts[:, 1]), power)
+    weights.flags.writeable = False
+    return weights
@@ -0,0 +1,280 @@
+"""Incremental per-station/pollutant statistics for prediction-time features.
+
+Prediction-time spatial and cross-pollutant features only need, per
+(station, item), the hour-of-day mean and std over the whole history and
+values from the last couple of weeks (anchor lags of at most 336h). Rather
+than re-scanning years of measurements on every request, `HistoryStore`
+keeps per-hour (count, mean, M2) aggregates, which merge exactly when new
+rows arrive, and a short tail buffer of recent values. It is seeded from one
+GROUP BY query plus one bounded tail query and then refreshed with only the
+rows past its watermark.
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Longest look-back served from the tail buffer (largest prediction-time anchor lag)
+TAIL_HOURS = 336
+
+# How long `history_store()` serves a store before pulling rows past its watermark
+REFRESH_SECONDS = 900
+
+_Key = tuple[int, int]
+
+
+def _hourly_moments(rows: pd.DataFrame) -> dict[_Key, np.ndarray]:
+    """(3, 24) count / mean / M2 per (station_code, item_code) from raw rows."""
+    hour = pd.to_datetime(rows["measurement_datetime"]).dt.hour
+    grouped = rows["clean_value"].astype(float).groupby([rows["station_code"], rows["item_code"], hour])
+    stats = pd.DataFrame({"n": grouped.count(), "mean": grouped.mean(), "var": grouped.var()})
+    return _moments_from_frame(stats.reset_index(names=["station_code", "item_code", "hour"]))
+
+
+def _moments_from_frame(stats: pd.DataFrame) -> dict[_Key, np.ndarray]:
+    """Moments dict from a frame of station_code, item_code, hour, n, mean, var (sample)."""
+    moments = {}
+    for (sc, ic), grp in stats.groupby(["station_code", "item_code"]):
+        m = np.zeros((3, 24))
+        hours = grp["hour"].to_numpy(dtype=int)
+        n = grp["n"].to_numpy(dtype=float)
+        m[0, hours] = n
+        m[1, hours] = grp["mean"].to_numpy(dtype=float)
+        m[2, hours] = np.nan_to_num(grp["var"].to_numpy(dtype=float)) * np.maximum(n - 1, 0)
+        moments[(int(sc), int(ic))] = m
+    return moments
+
+
+def _merge_moments(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Combine two (3, 24) count / mean / M2 arrays (Chan et al. parallel update)."""
+    n = a[0] + b[0]
+    safe_n = np.where(n > 0, n, 1.0)
+    delta = b[1] - a[1]
+    mean = a[1] + delta * b[0] / safe_n
+    m2 = a[2] + b[2] + delta * delta * a[0] * b[0] / safe_n
+    return np.stack([n, np.where(n > 0, mean, 0.0), m2])
+
+
+@dataclass
+class HistoryStore:
+    """Hour-of-day aggregates and a recent-value tail per (station_code, item_code)."""
+
+    moments: dict[_Key, np.ndarray]
+    tail: dict[_Key, pd.Series]
+    watermark: pd.Timestamp | None
+    tail_hours: int = TAIL_HOURS
+    refreshed_at: float = field(default_factory=time.monotonic)
+    # Held by updates and by reads, so a request never sees a half-applied merge
+    _lock: threading.RLock = field(default_factory=threading.RLock, repr=False)
+
+    @classmethod
+    def from_rows(cls, rows: pd.DataFrame, tail_hours: int = TAIL_HOURS) -> "HistoryStore":
+        """Build from raw rows (`measurement_datetime`, `station_code`, `item_code`, `clean_value`)."""
+        store = cls({}, {}, None, tail_hours)
+        store.update(rows)
+        return store
+
+    def update(self, rows: pd.DataFrame) -> int:
+        """Fold rows newer than the watermark into the aggregates and tail; returns rows applied.
+
+        Rows at or before the watermark are ignored, so late corrections to
+        already-aggregated hours need a rebuild (`load_history_store`).
+        """
+        rows = rows.assign(measurement_datetime=pd.to_datetime(rows["measurement_datetime"]))
+        if self.watermark is not None:
+            rows = rows[rows["measurement_datetime"] > self.watermark]
+        rows = rows[rows["clean_value"].notna()]
+        if rows.empty:
+            self.refreshed_at = time.monotonic()
+            return 0
+
+        with self._lock:
+            for key, m in _hourly_moments(rows).items():
+                self.moments[key] = _merge_moments(self.moments[key], m) if key in self.moments else m
+
+            self.watermark = rows["measurement_datetime"].max()
+            self._append_tail(rows)
+            self.refreshed_at = time.monotonic()
+        return len(rows)
+
+    def _append_tail(self, rows: pd.DataFrame) -> None:
+        cutoff = self.watermark - pd.Timedelta(hours=self.tail_hours)
+        for (sc, ic), grp in rows.groupby(["station_code", "item_code"]):
+            new = grp.groupby("measurement_datetime")["clean_value"].mean().astype(float)
+            key = (int(sc), int(ic))
+            old = self.tail.get(key)
+            series = new if old is None else pd.concat([old, new])
+            self.tail[key] = series[series.index > cutoff]
+        for key, series in self.tail.items():
+            if len(series) and series.index[0] <= cutoff:
+                self.tail[key] = series[series.index > cutoff]
+
+    def has_data(self, station_code: int, item_code: int) -> bool:
+        with self._lock:
+            return (int(station_code), int(item_code)) in self.moments
+
+    def hourly_mean(self, station_code: int, item_code: int) -> np.ndarray:
+        """Mean per hour of day (24,), NaN for hours never observed."""
+        # Merges replace the arrays rather than writing into them
+        with self._lock:
+            m = self.moments.get((int(station_code), int(item_code)))
+        if m is None:
+            return np.full(24, np.nan)
+        return np.where(m[0] > 0, m[1], np.nan)
+
+    def hourly_std(self, station_code: int, item_code: int) -> np.ndarray:
+        """Sample std per hour of day (24,), NaN with fewer than two observations."""
+        with self._lock:
+            m = self.moments.get((int(station_code), int(item_code)))
+        if m is None:
+            return np.full(24, np.nan)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(m[0] > 1, np.sqrt(m[2] / (m[0] - 1)), np.nan)
+
+    def covers(self, start: pd.Timestamp) -> bool:
+        """Whether every timestamp from `start` on is answerable from the tail buffer."""
+        with self._lock:
+            return self.watermark is not None and start > self.watermark - pd.Timedelta(hours=self.tail_hours)
+
+    def values_at(self, station_code: int, item_codes: list[int], index: pd.DatetimeIndex) -> pd.DataFrame:
+        """Observed values at `index` (index × item_code), NaN where unobserved.
+
+        Served from the tail buffer when it covers `index`; otherwise one
+        query bounded to `index`'s range is issued.
+        """
+        with self._lock:
+            covered = not len(index) or self.covers(index.min())
+            tails = {ic: self.tail.get((int(station_code), int(ic))) for ic in item_codes} if covered else {}
+        if not covered:
+            window = load_window(station_code, item_codes, index.min(), index.max())
+            if window.empty:
+                return pd.DataFrame(np.nan, index=index, columns=item_codes)
+            pivot = window.pivot_table(index="measurement_datetime", columns="item_code", values="clean_value")
+            return pivot.reindex(index=index, columns=item_codes)
+
+        empty = pd.Series(dtype=float)
+        return pd.DataFrame(
+            {ic: (tails[ic] if tails[ic] is not None else empty).reindex(index).to_numpy() for ic in item_codes},
+            index=index,
+        )
+
+
+# ---------------------------------------------------------------------------
+# Loading
+# ---------------------------------------------------------------------------
+
+
+# Normal, non-null measurements; the status is bound as @status
+_NORMAL_ROWS = "instrument_status = @status AND clean_value IS NOT NULL"
+
+
+def _run(query: str, **params) -> pd.DataFrame:
+    from src.data.loader import run_query
+    from src.utils.constants import STATUS_NORMAL
+
+    return run_query(query, {"status": STATUS_NORMAL, **params})
+
+
+def load_window(
+    station_code: int,
+    item_codes: list[int],
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+) -> pd.DataFrame:
+    """Normal rows for one station and some items within [start, end]."""
+    from src.utils.constants import BQ_TABLE_CLEAN
+
+    rows = _run(
+        f"""
+        SELECT measurement_datetime, item_code, clean_value
+        FROM {BQ_TABLE_CLEAN}
+        WHERE station_code = @station_code
+          AND item_code IN UNNEST(@item_codes)
+          AND measurement_datetime BETWEEN @start AND @end
+          AND {_NORMAL_ROWS}
+        """,
+        station_code=int(station_code),
+        item_codes=[int(ic) for ic in item_codes],
+        start=pd.Timestamp(start),
+        end=pd.Timestamp(end),
+    )
+    rows["measurement_datetime"] = pd.to_datetime(rows["measurement_datetime"])
+    return rows
+
+
+def load_history_store(tail_hours: int = TAIL_HOURS) -> HistoryStore:
+    """Seed a store with one aggregate query and one bounded tail query."""
+    from src.utils.constants import BQ_TABLE_CLEAN
+
+    stats = _run(f"""
+        SELECT station_code, item_code,
+               EXTRACT(HOUR FROM measurement_datetime) AS hour,
+               COUNT(*) AS n,
+               AVG(clean_value) AS mean,
+               VAR_SAMP(clean_value) AS var,
+               MAX(measurement_datetime) AS last_ts
+        FROM {BQ_TABLE_CLEAN}
+        WHERE {_NORMAL_ROWS}
+        GROUP BY 1, 2, 3
+    """)
+    watermark = pd.to_datetime(stats["last_ts"]).max() if len(stats) else None
+    store = HistoryStore(_moments_from_frame(stats), {}, watermark, tail_hours)
+    if watermark is None:
+        return store
+
+    tail = _run(
+        f"""
+        SELECT measurement_datetime, station_code, item_code, clean_value
+        FROM {BQ_TABLE_CLEAN}
+        WHERE measurement_datetime > @start
+          AND measurement_datetime <= @end
+          AND {_NORMAL_ROWS}
+        """,
+        start=watermark - pd.Timedelta(hours=tail_hours),
+        end=watermark,
+    )
+    tail["measurement_datetime"] = pd.to_datetime(tail["measurement_datetime"])
+    store._append_tail(tail)
+    logger.info("History store seeded: %d series, watermark %s", len(store.moments), watermark)
+    return store
+
+
+def refresh_history_store(store: HistoryStore) -> int:
+    """Pull rows past the store's watermark and fold them in; returns rows applied."""
+    from src.utils.constants import BQ_TABLE_CLEAN
+
+    rows = _run(
+        f"""
+        SELECT measurement_datetime, station_code, item_code, clean_value
+        FROM {BQ_TABLE_CLEAN}
+        WHERE measurement_datetime > @watermark
+          AND {_NORMAL_ROWS}
+        """,
+        watermark=store.watermark,
+    )
+    return store.update(rows)
+
+
+_store: HistoryStore | None = None
+_store_lock = threading.Lock()
+
+
+def history_store(max_age: float = REFRESH_SECONDS) -> HistoryStore:
+    """Process-wide store, seeded on first use and refreshed once older than `max_age` seconds."""
+    global _store
+    with _store_lock:
+        if _store is None or _store.watermark is None:
+            _store = load_history_store()
+        elif time.monotonic() - _store.refreshed_at > max_age:
+            try:
+                refresh_history_store(_store)
+            except Exception as e:
+                logger.warning("History store refresh failed, serving watermark %s: %s", _store.watermark, e)
+                _store.refreshed_at = time.monotonic()
+        return _store
@@ -1,27 +1,72 @@
-"""Data loading utilities for the air quality prediction project."""
+"""Data loading utilities for the air quality prediction project.
+
+Queries are written once per shape with named parameters (``@station_code``,
+``IN UNNEST(@item_codes)``) and run through `run_query`, never by
+interpolating values into the SQL. The query text is therefore identical
+across stations, items and dates, so BigQuery's result cache (keyed on text
+and parameters) serves repeated training runs, and API inputs cannot inject
+SQL. With ``QUERY_BACKEND=duckdb`` the same queries run against the local dbt
+target (`dbt_pollution/dev.duckdb`) as prepared statements, each on a
+short-lived read-only connection so dbt can rewrite the file between
+queries, with results memoized (up to `DUCKDB_CACHE_BYTES` in total) until
+the database file changes.
+"""
+
+import datetime
+import os
+import re
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
 
 import pandas as pd
+import pyarrow as pa
 from google.cloud import bigquery
 
-from src.utils.constants import BQ_PROJECT, BQ_TABLE_CLEAN, STATUS_NORMAL
+from src.utils.constants import (
+    BQ_PROJECT,
+    BQ_TABLE_CLEAN,
+    DUCKDB_PATH,
+    DUCKDB_TABLE_CLEAN,
+    QUERY_BACKEND,
+    STATUS_NORMAL,
+)
+
+QueryValue = int | float | str | bool | datetime.datetime | pd.Timestamp | Sequence[int] | Sequence[str]
 
 _client: bigquery.Client | None = None
 
 
-def bq_to_dataframe(query: str, client: bigquery.Client | None = None) -> pd.DataFrame:
-    """Execute a BigQuery query and return a DataFrame with proper numeric types."""
+def bq_to_dataframe(
+    query: str,
+    client: bigquery.Client | None = None,
+    params: dict[str, QueryValue] | None = None,
+) -> pd.DataFrame:
+    """Execute a BigQuery query and return a DataFrame with NumPy float/int/datetime columns.
+
+    Results are read as Arrow, through the BigQuery Storage API's parallel
+    streams when `google-cloud-bigquery-storage` is installed (REST pages
+    otherwise). NUMERIC/BIGNUMERIC columns are cast to float64 in the Arrow
+    schema, so no per-cell `Decimal` conversion is needed.
+    """
     c = client or get_bq_client()
-    df = c.query(query).to_dataframe()
-    # BigQuery NUMERIC returns Decimal objects; convert to float for ML pipelines
-    for col in df.columns:
-        if df[col].dtype == object:
-            try:
-                converted = pd.to_numeric(df[col], errors="coerce")
-                if converted.notna().any():
-                    df[col] = converted
-            except (ValueError, TypeError):
-                pass
-    return df
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[_bq_parameter(name, value) for name, value in (params or {}).items()],
+        use_query_cache=True,
+    )
+    table = c.query(query, job_config=job_config).result().to_arrow(create_bqstorage_client=True)
+    return arrow_to_dataframe(table)
+
+
+def arrow_to_dataframe(table: pa.Table) -> pd.DataFrame:
+    """Arrow table to pandas, with decimal columns cast to float64 first."""
+    schema = pa.schema(
+        [pa.field(f.name, pa.float64()) if pa.types.is_decimal(f.type) else f for f in table.schema],
+        metadata=table.schema.metadata,
+    )
+    if not schema.equals(table.schema):
+        table = table.cast(schema)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
 
 
 def get_bq_client() -> bigquery.Client:
@@ -31,6 +76,115 @@ def get_bq_client() -> bigquery.Client:
     return _client
 
 
+# ---------------------------------------------------------------------------
+# Parameterized queries
+# ---------------------------------------------------------------------------
+
+
+def _scalar_type(value) -> str:
+    # bool before int: bool is an int subclass
+    if isinstance(value, bool):
+        return "BOOL"
+    if isinstance(value, int):
+        return "INT64"
+    if isinstance(value, float):
+        return "FLOAT64"
+    if isinstance(value, datetime.datetime):
+        return "DATETIME"
+    if isinstance(value, str):
+        return "STRING"
+    raise TypeError(f"Unsupported query parameter type: {type(value).__name__}")
+
+
+def _normalize(value: QueryValue):
+    """Plain Python value for a parameter (Timestamps to datetimes, NumPy scalars/arrays to Python)."""
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, str | datetime.datetime):
+        return value
+    if hasattr(value, "tolist"):
+        value = value.tolist()
+    if isinstance(value, Sequence) and not isinstance(value, str):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def _bq_parameter(name: str, value: QueryValue):
+    value = _normalize(value)
+    if isinstance(value, list):
+        if not value:
+            raise ValueError(f"Array parameter @{name} is empty")
+        return bigquery.ArrayQueryParameter(name, _scalar_type(value[0]), value)
+    return bigquery.ScalarQueryParameter(name, _scalar_type(value), value)
+
+
+_UNNEST_PARAM = re.compile(r"IN\s+UNNEST\(@(\w+)\)", re.IGNORECASE)
+_NAMED_PARAM = re.compile(r"@(\w+)")
+
+
+def _duckdb_sql(query: str) -> str:
+    """Translate the BigQuery dialect used here (table path, ``@name``, ``IN UNNEST``) to DuckDB."""
+    query = query.replace(BQ_TABLE_CLEAN, DUCKDB_TABLE_CLEAN)
+    query = _UNNEST_PARAM.sub(r"IN (SELECT UNNEST($\1))", query)
+    return _NAMED_PARAM.sub(r"$\1", query)
+
+
+_duckdb_lock = threading.Lock()
+
+# Total size of the memoized DuckDB results; least recently used results are
+# evicted past it, and a single larger result is never kept
+DUCKDB_CACHE_BYTES = 256 * 2**20
+
+_duckdb_cache: OrderedDict[tuple, tuple[pd.DataFrame, int]] = OrderedDict()
+_duckdb_cache_bytes = 0
+
+
+def _duckdb_result(query: str, params: tuple, path: str, mtime: float) -> pd.DataFrame:
+    """Memoized result of `query`; a miss opens a read-only connection for that query only.
+
+    DuckDB holds a file lock for as long as a connection is open, so a
+    long-lived handle would stop `dbt build --target local` from rewriting
+    the file while the API or an export is running.
+    """
+    import duckdb
+
+    global _duckdb_cache_bytes
+    key = (query, params, path, mtime)
+    with _duckdb_lock:
+        if key in _duckdb_cache:
+            _duckdb_cache.move_to_end(key)
+            return _duckdb_cache[key][0]
+        with duckdb.connect(path, read_only=True) as con:
+            result = con.execute(query, {k: list(v) if isinstance(v, tuple) else v for k, v in params}).df()
+        size = int(result.memory_usage(index=True, deep=True).sum())
+        if size <= DUCKDB_CACHE_BYTES:
+            _duckdb_cache[key] = (result, size)
+            _duckdb_cache_bytes += size
+            while _duckdb_cache_bytes > DUCKDB_CACHE_BYTES:
+                _, (_, evicted) = _duckdb_cache.popitem(last=False)
+                _duckdb_cache_bytes -= evicted
+        return result
+
+
+def duckdb_to_dataframe(query: str, params: dict[str, QueryValue] | None = None) -> pd.DataFrame:
+    """Run a parameterized query against the local DuckDB target.
+
+    Results are memoized per (query, parameters) until the database file is
+    rebuilt, within a `DUCKDB_CACHE_BYTES` budget; callers get a private copy.
+    """
+    normalized = {k: _normalize(v) for k, v in (params or {}).items()}
+    key = tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in normalized.items()))
+    result = _duckdb_result(_duckdb_sql(query), key, DUCKDB_PATH, os.path.getmtime(DUCKDB_PATH))
+    return result.copy()
+
+
+def run_query(query: str, params: dict[str, QueryValue] | None = None) -> pd.DataFrame:
+    """Run a parameterized query on the configured backend (`QUERY_BACKEND`)."""
+    if QUERY_BACKEND == "duckdb":
+        return duckdb_to_dataframe(query, params)
+    return bq_to_dataframe(query, params=params)
+
+
 def load_series(
     station_code: int,
     item_code: int,
@@ -43,14 +197,17 @@ def load_series(
     clean_value, raw_value, instrument_status, and temporal features.
     """
     where = [
-        f"station_code = {station_code}",
-        f"item_code = {item_code}",
+        "station_code = @station_code",
+        "item_code = @item_code",
     ]
+    params = {"station_code": int(station_code), "item_code": int(item_code)}
 
     if normal_only:
-        where.append(f"instrument_status = {STATUS_NORMAL}")
+        where.append("instrument_status = @status")
+        params["status"] = STATUS_NORMAL
     if end_before:
-        where.append(f"measurement_datetime < '{end_before}'")
+        where.append("measurement_datetime < @end_before")
+        params["end_before"] = pd.Timestamp(end_before)
 
     query = f"""
         SELECT *
@@ -58,7 +215,7 @@ def load_series(
         WHERE {" AND ".join(where)}
         ORDER BY measurement_datetime
     """
-    df = bq_to_dataframe(query)
+    df = run_query(query, params)
 
     df["measurement_datetime"] = pd.to_datetime(df["measurement_datetime"])
     df = df.set_index("measurement_datetime")
@@ -0,0 +1,232 @@
+"""Station metadata registry: coordinates, measured pollutants and coverage.
+
+Station metadata changes only when the network does, yet prediction and
+feature code used to query it per call. `StationRegistry` holds one record
+per station and is loaded once per process, from the first available of:
+
+1. a registry persisted next to the models (`stations.json`, written by
+   `scripts/export_models.py` and installed by the API's model loader);
+2. the local Parquet snapshot (`data/dashboard_wide.parquet`);
+3. one aggregate query on the configured backend (`run_query`).
+
+The registry also owns the `StationIndex` used for spatial neighbours and
+weather interpolation, so every path shares one set of coordinates.
+"""
+
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from src.data.geometry import StationIndex
+from src.utils.constants import ITEM_CODES, PARQUET_SNAPSHOT_PATH
+
+logger = logging.getLogger(__name__)
+
+# File name of a registry persisted alongside exported models
+STATION_REGISTRY_FILE = "stations.json"
+
+
+@dataclass(frozen=True)
+class StationMeta:
+    """One monitoring station."""
+
+    station_code: int
+    latitude: float
+    longitude: float
+    item_codes: tuple[int, ...] = ()
+    first_seen: pd.Timestamp | None = None
+    last_seen: pd.Timestamp | None = None
+
+
+@dataclass(eq=False)
+class StationRegistry:
+    """Station metadata keyed by station_code, with a lazily built `StationIndex`."""
+
+    stations: dict[int, StationMeta]
+    source: str = ""
+    _index: StationIndex | None = field(default=None, repr=False)
+
+    @classmethod
+    def from_coverage(cls, rows: pd.DataFrame, source: str = "") -> "StationRegistry":
+        """Build from one row per (station, item) with `station_code`, `item_code`,
+        `latitude`, `longitude`, `first_seen`, `last_seen`."""
+        rows = rows.assign(
+            first_seen=pd.to_datetime(rows["first_seen"]),
+            last_seen=pd.to_datetime(rows["last_seen"]),
+        )
+        stations = {}
+        for sc, grp in rows.groupby("station_code"):
+            stations[int(sc)] = StationMeta(
+                station_code=int(sc),
+                latitude=float(grp["latitude"].iloc[0]),
+                longitude=float(grp["longitude"].iloc[0]),
+                item_codes=tuple(sorted(int(ic) for ic in grp["item_code"].unique())),
+                first_seen=grp["first_seen"].min(),
+                last_seen=grp["last_seen"].max(),
+            )
+        return cls(stations, source)
+
+    @classmethod
+    def from_wide(cls, frame: pd.DataFrame, source: str = "") -> "StationRegistry":
+        """Build from the wide dashboard layout (one `<item>_value` column per pollutant)."""
+        rows = []
+        for name, ic in ITEM_CODES.items():
+            col = f"{name.replace('.', '_')}_value"
+            if col not in frame.columns:
+                continue
+            observed = frame[frame[col].notna()]
+            grouped = observed.groupby("station_code")
+            rows.append(
+                pd.DataFrame(
+                    {
+                        "item_code": ic,
+                        "latitude": grouped["latitude"].first(),
+                        "longitude": grouped["longitude"].first(),
+                        "first_seen": grouped["measurement_datetime"].min(),
+                        "last_seen": grouped["measurement_datetime"].max(),
+                    }
+                ).reset_index()
+            )
+        return cls.from_coverage(pd.concat(rows, ignore_index=True), source)
+
+    def __len__(self) -> int:
+        return len(self.stations)
+
+    def __contains__(self, station_code: int) -> bool:
+        return int(station_code) in self.stations
+
+    def __getitem__(self, station_code: int) -> StationMeta:
+        try:
+            return self.stations[int(station_code)]
+        except KeyError:
+            raise KeyError(f"Unknown station_code {station_code}") from None
+
+    @property
+    def codes(self) -> list[int]:
+        return sorted(self.stations)
+
+    def coordinates(self, station_code: int) -> tuple[float, float]:
+        """(latitude, longitude) of a station."""
+        meta = self[station_code]
+        return meta.latitude, meta.longitude
+
+    def measures(self, station_code: int, item_code: int) -> bool:
+        """Whether the station has ever reported the pollutant."""
+        return int(station_code) in self.stations and int(item_code) in self.stations[int(station_code)].item_codes
+
+    @property
+    def index(self) -> StationIndex:
+        """Distance matrix and neighbour ranking over the registered stations (built once)."""
+        if self._index is None:
+            self._index = StationIndex.from_frame(self.to_frame())
+        return self._index
+
+    def to_frame(self) -> pd.DataFrame:
+        """One row per station."""
+        return pd.DataFrame(
+            [
+                {
+                    "station_code": m.station_code,
+                    "latitude": m.latitude,
+                    "longitude": m.longitude,
+                    "item_codes": list(m.item_codes),
+                    "first_seen": m.first_seen,
+                    "last_seen": m.last_seen,
+                }
+                for m in (self.stations[c] for c in self.codes)
+            ]
+        )
+
+    def save(self, path: str) -> None:
+        """Write the registry as JSON (e.g. next to exported models)."""
+        records = [
+            {
+                "station_code": m.station_code,
+                "latitude": m.latitude,
+                "longitude": m.longitude,
+                "item_codes": list(m.item_codes),
+                "first_seen": None if m.first_seen is None else m.first_seen.isoformat(),
+                "last_seen": None if m.last_seen is None else m.last_seen.isoformat(),
+            }
+            for m in (self.stations[c] for c in self.codes)
+        ]
+        with open(path, "w") as f:
+            json.dump({"stations": records}, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "StationRegistry":
+        """Read a registry written by `save`."""
+        with open(path) as f:
+            records = json.load(f)["stations"]
+        stations = {}
+        for r in records:
+            stations[int(r["station_code"])] = StationMeta(
+                station_code=int(r["station_code"]),
+                latitude=float(r["latitude"]),
+                longitude=float(r["longitude"]),
+                item_codes=tuple(int(ic) for ic in r["item_codes"]),
+                first_seen=None if r["first_seen"] is None else pd.Timestamp(r["first_seen"]),
+                last_seen=None if r["last_seen"] is None else pd.Timestamp(r["last_seen"]),
+            )
+        return cls(stations, path)
+
+
+# ---------------------------------------------------------------------------
+# Loading
+# ---------------------------------------------------------------------------
+
+
+def query_station_registry() -> StationRegistry:
+    """Registry from one GROUP BY over the clean measurements (configured backend)."""
+    from src.data.loader import run_query
+    from src.utils.constants import BQ_TABLE_CLEAN
+
+    rows = run_query(f"""
+        SELECT station_code, item_code,
+               MIN(latitude) AS latitude,
+               MIN(longitude) AS longitude,
+               MIN(measurement_datetime) AS first_seen,
+               MAX(measurement_datetime) AS last_seen
+        FROM {BQ_TABLE_CLEAN}
+        WHERE clean_value IS NOT NULL
+        GROUP BY station_code, item_code
+    """)
+    return StationRegistry.from_coverage(rows, "query")
+
+
+def snapshot_station_registry(path: str = PARQUET_SNAPSHOT_PATH) -> StationRegistry:
+    """Registry from the local wide Parquet snapshot."""
+    columns = ["measurement_datetime", "station_code", "latitude", "longitude"]
+    columns += [f"{name.replace('.', '_')}_value" for name in ITEM_CODES]
+    return StationRegistry.from_wide(pd.read_parquet(path, columns=columns), path)
+
+
+_registry: StationRegistry | None = None
+_registry_lock = threading.Lock()
+
+
+def station_registry() -> StationRegistry:
+    """Process-wide registry, loaded on first use (see module docstring for the sources)."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            if os.path.exists(PARQUET_SNAPSHOT_PATH):
+                try:
+                    _registry = snapshot_station_registry()
+                except Exception as e:
+                    logger.warning("Station snapshot %s unreadable, querying instead: %s", PARQUET_SNAPSHOT_PATH, e)
+            if _registry is None:
+                _registry = query_station_registry()
+            logger.info("Loaded metadata for %d stations from %s", len(_registry), _registry.source)
+        return _registry
+
+
+def install_station_registry(registry: StationRegistry) -> None:
+    """Use `registry` for the rest of the process (e.g. one persisted with the models)."""
+    global _registry
+    with _registry_lock:
+        _registry = registry
@@ -12,6 +12,7 @@ import numpy as np
 import pandas as pd
 import requests
 
+from src.data.geometry import point_idw_weights
 from src.utils.constants import PROJECT_ROOT
 
 logger = logging.getLogger(__name__)
@@ -24,6 +25,7 @@ WEATHER_POINTS = [
     {"name": "nw", "lat": 37.65, "lon": 126.90},
     {"name": "se", "lat": 37.47, "lon": 127.10},
 ]
+WEATHER_POINT_COORDS = tuple((p["lat"], p["lon"]) for p in WEATHER_POINTS)
 
 HOURLY_PARAMS = [
     "temperature_2m",
@@ -118,14 +120,8 @@ def get_weather_for_station(
     """
     weather = load_weather_cache()
 
-    # Compute IDW weights for this station
-    dists = []
-    for point in WEATHER_POINTS:
-        d = np.sqrt((station_lat - point["lat"]) ** 2 + (station_lon - point["lon"]) ** 2)
-        dists.append(max(d, 1e-6))
-    dists = np.array(dists)
-    weights = 1.0 / dists**2
-    weights /= weights.sum()
+    # Haversine IDW weights for this station (memoized per location)
+    weights = point_idw_weights(station_lat, station_lon, WEATHER_POINT_COORDS)
 
     # Pivot weather data: one column per point per variable
     result = pd.DataFrame(index=index)
@@ -157,13 +153,7 @@ def get_weather_stats_for_prediction(
     weather = load_weather_cache()
 
     # Compute IDW weights
-    dists = []
-    for point in WEATHER_POINTS:
-        d = np.sqrt((station_lat - point["lat"]) ** 2 + (station_lon - point["lon"]) ** 2)
-        dists.append(max(d, 1e-6))
-    dists = np.array(dists)
-    weights = 1.0 / dists**2
-    weights /= weights.sum()
+    weights = point_idw_weights(station_lat, station_lon, WEATHER_POINT_COORDS)
 
     # Compute IDW-weighted weather at this station for all historical timestamps
     center = weather[weather["point_name"] == "center"].copy()
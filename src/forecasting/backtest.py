@@ -0,0 +1,202 @@
+"""Parallel walk-forward backtesting across forecast targets.
+
+Every (target, fold) pair runs in its own worker process from a bounded pool,
+so fold memory is returned to the OS when the worker exits instead of relying
+on `gc.collect()`. Target series are placed in shared memory once and each
+worker attaches by name, rather than pickling the full history per fold.
+"""
+
+import logging
+import multiprocessing as mp
+import os
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd
+
+from src.forecasting.evaluate import evaluate_intervals, evaluate_predictions
+from src.forecasting.train_lgbm_ensemble import (
+    predict_with_pipeline,
+    train_forecast_pipeline,
+    walk_forward_cv,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------------
+# Shared-memory series
+# ---------------------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class SharedSeries:
+    """Handle to an hourly series stored in a shared-memory block.
+
+    The block holds the float64 values followed by the int64 (ns) timestamps.
+    """
+
+    shm_name: str
+    length: int
+
+    @classmethod
+    def create(cls, series: pd.Series) -> tuple["SharedSeries", SharedMemory]:
+        """Copy `series` into a new shared-memory block owned by the caller."""
+        n = len(series)
+        shm = SharedMemory(create=True, size=max(16 * n, 1))
+        buf = np.ndarray((2, n), dtype=np.float64, buffer=shm.buf)
+        buf[0] = series.to_numpy(dtype=np.float64)
+        buf[1] = pd.DatetimeIndex(series.index).as_unit("ns").asi8.view(np.float64)
+        del buf
+        return cls(shm.name, n), shm
+
+    def load(self) -> pd.Series:
+        """Attach to the block and return a private copy of the series."""
+        shm = SharedMemory(name=self.shm_name)
+        try:
+            buf = np.ndarray((2, self.length), dtype=np.float64, buffer=shm.buf)
+            values = buf[0].copy()
+            index = pd.DatetimeIndex(buf[1].view(np.int64).copy())
+            del buf
+        finally:
+            shm.close()
+        return pd.Series(values, index=index, name="clean_value")
+
+
+# ---------------------------------------------------------------------------
+# Worker
+# ---------------------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class _FoldJob:
+    target: dict
+    shared: SharedSeries
+    fold_id: int
+    fold: dict
+    threads: int
+    station_features: bool
+
+
+def _run_fold(job: _FoldJob) -> dict:
+    """Train and evaluate one walk-forward fold (runs in a worker process)."""
+    from threadpoolctl import threadpool_limits
+
+    start = time.perf_counter()
+    ts = job.shared.load()
+    ft = ts.iloc[: job.fold["train_end"]]
+    fv = ts.iloc[job.fold["test_start"] : job.fold["test_end"]]
+
+    sc, ic = job.target["station_code"], job.target["item_code"]
+    station_kwargs = {"station_code": sc, "item_code": ic} if job.station_features else {}
+
+    with threadpool_limits(limits=job.threads):
+        pipe = train_forecast_pipeline(ft, fv, n_jobs=job.threads, **station_kwargs)
+        preds = predict_with_pipeline(pipe, fv.index)
+
+    m = evaluate_predictions(fv, preds["ensemble"])
+    iv = evaluate_intervals(fv.values, preds["q05"].values, preds["q95"].values)
+
+    return {
+        "station_code": sc,
+        "item_code": ic,
+        "item_name": job.target.get("item_name"),
+        "fold": job.fold_id,
+        "nrmse": float(m["rmse"] / ts.std()),
+        "r2": m["r2"],
+        "coverage": iv["empirical_coverage"],
+        "seconds": time.perf_counter() - start,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+
+def run_backtest(
+    targets: list[dict],
+    series: dict[tuple[int, int], pd.Series],
+    n_folds: int = 3,
+    test_size: int = 720,
+    min_train_size: int = 8760,
+    max_workers: int | None = None,
+    threads_per_worker: int | None = None,
+    station_features: bool = True,
+    on_fold_done: Callable[[dict], None] | None = None,
+) -> list[dict]:
+    """Run walk-forward CV for every target's folds in a process pool.
+
+    `series` maps (station_code, item_code) to the gap-filled hourly series for
+    each target. Workers default to one per core (capped by the number of
+    folds); `threads_per_worker` defaults to an even split of the cores so
+    LightGBM does not oversubscribe. `on_fold_done` is called in the parent
+    with each fold's metrics as soon as that fold finishes.
+
+    Returns the per-fold metric dicts in completion order.
+    """
+    n_cores = os.cpu_count() or 1
+    shared: dict[tuple[int, int], SharedSeries] = {}
+    blocks: list[SharedMemory] = []
+    specs: list[tuple[dict, SharedSeries, int, dict]] = []
+
+    try:
+        for target in targets:
+            key = (target["station_code"], target["item_code"])
+            ts = series[key]
+            folds = walk_forward_cv(ts, n_folds=n_folds, test_size=test_size, min_train_size=min_train_size)
+            if not folds:
+                logger.warning("No walk-forward folds for %s/%s (series too short)", *key)
+                continue
+            if key not in shared:
+                shared[key], shm = SharedSeries.create(ts)
+                blocks.append(shm)
+            specs.extend((target, shared[key], i, fold) for i, fold in enumerate(folds))
+
+        if not specs:
+            return []
+
+        workers = max(1, min(max_workers or n_cores, len(specs)))
+        threads = threads_per_worker or max(1, n_cores // workers)
+        jobs = [_FoldJob(*spec, threads=threads, station_features=station_features) for spec in specs]
+        logger.info("Backtesting %d folds on %d workers × %d threads", len(jobs), workers, threads)
+
+        results = []
+        # spawn: forked children would inherit the parent's OpenMP state;
+        # max_tasks_per_child=1 gives every fold a fresh process.
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=mp.get_context("spawn"),
+            max_tasks_per_child=1,
+        ) as pool:
+            futures = {pool.submit(_run_fold, job): job for job in jobs}
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if on_fold_done is not None:
+                    on_fold_done(result)
+        return results
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+
+def summarize_backtest(results: list[dict]) -> dict[tuple[int, int], dict]:
+    """Average per-fold metrics into one CV summary per (station, item)."""
+    summary = {}
+    df = pd.DataFrame(results)
+    if df.empty:
+        return summary
+    for (sc, ic), grp in df.groupby(["station_code", "item_code"]):
+        summary[(int(sc), int(ic))] = {
+            "cv_nrmse": float(grp["nrmse"].mean()),
+            "cv_r2": float(grp["r2"].mean()),
+            "cv_coverage": float(grp["coverage"].mean()),
+            "n_folds": len(grp),
+        }
+    return summary
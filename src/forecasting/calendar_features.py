@@ -0,0 +1,133 @@
+"""Shared, cached calendar and Fourier feature blocks.
+
+Calendar and Fourier features depend only on the timestamp: the Fourier
+terms on the hour offset from the epoch modulo each (integer-hour) period.
+They are therefore gathered from per-period sin/cos tables instead of
+evaluating `np.sin` / `np.cos` over the whole index, and blocks for regular
+hourly indexes are memoized per (epoch, first hour, length). Every consumer
+(the feature builders, the Ridge model, the LSTM dataset and the global
+model) goes through `calendar_block` / `fourier_block`, so one prediction
+computes a block once and hands out read-only views of it.
+"""
+
+from functools import cache, lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Seasonal period (hours) and number of harmonics per Fourier block
+FOURIER_PERIODS = {"daily": 24, "weekly": 168, "yearly": 8766}
+FOURIER_TERMS = {"daily": 4, "weekly": 3, "yearly": 5}
+
+FOURIER_COLUMNS = tuple(
+    f"four_{name}_{fn}_{k}"
+    for name in FOURIER_PERIODS
+    for k in range(1, FOURIER_TERMS[name] + 1)
+    for fn in ("sin", "cos")
+)
+TEMPORAL_COLUMNS = ("hour", "day_of_week", "month", "day_of_year", "is_weekend")
+CYCLICAL_COLUMNS = ("hour_sin", "hour_cos", "dow_sin", "dow_cos", "month_sin", "month_cos")
+CALENDAR_COLUMNS = (*TEMPORAL_COLUMNS, *CYCLICAL_COLUMNS, *FOURIER_COLUMNS)
+
+FOURIER_SLICE = slice(len(TEMPORAL_COLUMNS) + len(CYCLICAL_COLUMNS), len(CALENDAR_COLUMNS))
+
+_HOUR_NS = 3_600_000_000_000
+
+
+@cache
+def _harmonic_table(period: int, n_terms: int) -> np.ndarray:
+    """sin/cos of harmonics 1..n_terms at every hour offset of one period, (period, 2 * n_terms)."""
+    r = np.arange(period)[:, None]
+    k = np.arange(1, n_terms + 1)[None, :]
+    phase = 2 * np.pi * k * r / period
+    table = np.empty((period, 2 * n_terms))
+    table[:, 0::2] = np.sin(phase)
+    table[:, 1::2] = np.cos(phase)
+    return table
+
+
+@cache
+def _cycle_table(period: int) -> np.ndarray:
+    """(sin, cos) of each position in a short cycle (hour of day, day of week, month)."""
+    phase = 2 * np.pi * np.arange(period) / period
+    return np.stack([np.sin(phase), np.cos(phase)], axis=1)
+
+
+def _fourier_values(hours: np.ndarray, out: np.ndarray) -> None:
+    """Write the Fourier columns for `hours` since epoch into `out` (n, len(FOURIER_COLUMNS))."""
+    whole = np.round(hours)
+    integral = np.allclose(hours, whole, rtol=0, atol=1e-9)
+    j = 0
+    for name, period in FOURIER_PERIODS.items():
+        n_terms = FOURIER_TERMS[name]
+        width = 2 * n_terms
+        if integral:
+            out[:, j : j + width] = _harmonic_table(period, n_terms)[whole.astype(np.int64) % period]
+        else:
+            for k in range(1, n_terms + 1):
+                phase = 2 * np.pi * k * hours / period
+                out[:, j + 2 * (k - 1)] = np.sin(phase)
+                out[:, j + 2 * (k - 1) + 1] = np.cos(phase)
+        j += width
+
+
+def _compute_block(index: pd.DatetimeIndex, epoch: pd.Timestamp) -> np.ndarray:
+    hour, dow, month = index.hour.to_numpy(), index.dayofweek.to_numpy(), index.month.to_numpy()
+    block = np.empty((len(index), len(CALENDAR_COLUMNS)))
+    block[:, 0] = hour
+    block[:, 1] = dow
+    block[:, 2] = month
+    block[:, 3] = index.dayofyear.to_numpy()
+    block[:, 4] = dow >= 5
+    block[:, 5:7] = _cycle_table(24)[hour]
+    block[:, 7:9] = _cycle_table(7)[dow]
+    block[:, 9:11] = _cycle_table(12)[month % 12]
+    _fourier_values((index - epoch).total_seconds().to_numpy() / 3600.0, block[:, FOURIER_SLICE])
+    return block
+
+
+@lru_cache(maxsize=8)
+def _cached_block(epoch_ns: int, start_ns: int, n: int) -> np.ndarray:
+    index = pd.date_range(pd.Timestamp(start_ns), periods=n, freq="h")
+    block = _compute_block(index, pd.Timestamp(epoch_ns))
+    block.flags.writeable = False
+    return block
+
+
+def _cache_key(index: pd.DatetimeIndex, epoch: pd.Timestamp) -> tuple[int, int, int] | None:
+    """(epoch, start, length) in nanoseconds for tz-naive regular hourly indexes; None otherwise.
+
+    Indexes from Arrow or DuckDB come in ``us``; both stamps are converted to
+    ``ns``, the unit `_cached_block` rebuilds them from.
+    """
+    if len(index) == 0 or index.tz is not None or pd.Timestamp(epoch).tz is not None:
+        return None
+    stamps = index.as_unit("ns").asi8
+    if len(stamps) > 1 and not (np.diff(stamps) == _HOUR_NS).all():
+        return None
+    return pd.Timestamp(epoch).as_unit("ns").value, int(stamps[0]), len(stamps)
+
+
+def calendar_block(index: pd.DatetimeIndex, epoch: pd.Timestamp) -> np.ndarray:
+    """Read-only float64 (n, len(CALENDAR_COLUMNS)) calendar + Fourier block for `index`.
+
+    Regular hourly indexes are served from a small LRU cache; irregular
+    ones (e.g. several stations stacked) are computed on each call.
+    """
+    key = _cache_key(index, epoch)
+    if key is None:
+        block = _compute_block(index, epoch)
+        block.flags.writeable = False
+        return block
+    return _cached_block(*key)
+
+
+def fourier_block(index: pd.DatetimeIndex, epoch: pd.Timestamp) -> np.ndarray:
+    """Read-only view of the Fourier columns (`FOURIER_COLUMNS`) of `calendar_block`."""
+    return calendar_block(index, epoch)[:, FOURIER_SLICE]
+
+
+def calendar_frame(index: pd.DatetimeIndex, epoch: pd.Timestamp) -> pd.DataFrame:
+    """`calendar_block` as a private DataFrame copy, with integer temporal columns."""
+    df = pd.DataFrame(calendar_block(index, epoch), index=index, columns=list(CALENDAR_COLUMNS), copy=True)
+    return df.astype({c: int for c in TEMPORAL_COLUMNS})
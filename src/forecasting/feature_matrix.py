@@ -0,0 +1,308 @@
+"""Columnar float32 feature matrices for the forecast ensemble.
+
+`build_train_features` / `build_prediction_features` grow a DataFrame column
+by column and concatenate blocks, and the pipeline then reindexes, casts and
+fills it, copying the whole matrix several times. Here the feature schema is
+declared up front (ordered blocks of column names), one float32 matrix is
+preallocated for it and every block is written into its columns in place.
+The values match the DataFrame builders (up to float32 rounding) and the
+column order is carried as metadata, so the same schema drives training,
+validation and prediction.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from src.forecasting.calendar_features import CALENDAR_COLUMNS, calendar_block
+from src.forecasting.features import (
+    HISTORY_LOOKBACK,
+    compute_last_window_stats,
+    compute_target_encodings,
+)
+
+ANCHOR_LAGS = (168, 336, 504, 720)
+ROLLING_WINDOWS = (24, 168)
+
+ENCODING_COLUMNS = ("enc_hour", "enc_dow", "enc_month", "enc_hour_dow", "enc_month_hour")
+HISTORY_COLUMNS = (
+    *(f"anchor_lag_{lag}h" for lag in ANCHOR_LAGS),
+    *(f"rolling_{stat}_{w}h" for w in ROLLING_WINDOWS for stat in ("mean", "std")),
+)
+
+
+# ---------------------------------------------------------------------------
+# Schema and matrix
+# ---------------------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class FeatureSchema:
+    """Ordered blocks of feature columns; the column order of every matrix built from it."""
+
+    blocks: tuple[tuple[str, tuple[str, ...]], ...]
+
+    @property
+    def columns(self) -> list[str]:
+        return [c for _, cols in self.blocks for c in cols]
+
+    def __len__(self) -> int:
+        return sum(len(cols) for _, cols in self.blocks)
+
+    def block_slice(self, name: str) -> slice:
+        """Column range of block `name`."""
+        start = 0
+        for block, cols in self.blocks:
+            if block == name:
+                return slice(start, start + len(cols))
+            start += len(cols)
+        raise KeyError(name)
+
+    def with_block(self, name: str, columns: list[str]) -> "FeatureSchema":
+        """Schema with block `name` appended (unchanged if `columns` is empty)."""
+        if not columns:
+            return self
+        return FeatureSchema((*self.blocks, (name, tuple(columns))))
+
+    @classmethod
+    def from_columns(cls, columns: list[str]) -> "FeatureSchema":
+        """Recover a schema from a flat column list (pipelines saved without one)."""
+        base = BASE_SCHEMA.columns
+        if list(columns[: len(base)]) != base:
+            raise ValueError("Columns do not start with the base feature blocks")
+        return BASE_SCHEMA.with_block("extra", list(columns[len(base) :]))
+
+
+BASE_SCHEMA = FeatureSchema(
+    (
+        ("calendar", CALENDAR_COLUMNS),
+        ("encoding", ENCODING_COLUMNS),
+        ("history", HISTORY_COLUMNS),
+    )
+)
+
+
+@dataclass
+class FeatureMatrix:
+    """A C-ordered float32 (n_rows, n_features) matrix with its index and schema."""
+
+    values: np.ndarray
+    index: pd.DatetimeIndex
+    schema: FeatureSchema
+
+    @classmethod
+    def allocate(cls, index: pd.DatetimeIndex, schema: FeatureSchema) -> "FeatureMatrix":
+        return cls(np.full((len(index), len(schema)), np.nan, dtype=np.float32), index, schema)
+
+    @property
+    def columns(self) -> list[str]:
+        return self.schema.columns
+
+    def block(self, name: str) -> np.ndarray:
+        """Writable view of block `name`."""
+        return self.values[:, self.schema.block_slice(name)]
+
+    def write_frames(self, frames: dict[str, pd.DataFrame], missing: float = np.nan, rows: slice = slice(None)) -> None:
+        """Write the columns of `frames` (aligned to `self.index[rows]`) into their schema positions.
+
+        Columns outside the base blocks that no frame provides are set to `missing`.
+        """
+        position = {c: j for j, c in enumerate(self.columns)}
+        index = self.index[rows]
+        written = set(BASE_SCHEMA.columns)
+        for df in frames.values():
+            if not df.index.equals(index):
+                df = df.reindex(index)
+            for col in df.columns:
+                if col in position:
+                    self.values[rows, position[col]] = df[col].to_numpy(dtype=np.float32, na_value=np.nan)
+                    written.add(col)
+        for col, j in position.items():
+            if col not in written:
+                self.values[rows, j] = missing
+
+    def fill_missing(self, fill_values: np.ndarray) -> None:
+        """Replace NaN in place with a per-column value (NaN fill values leave NaN)."""
+        mask = np.isnan(self.values)
+        if mask.any():
+            np.copyto(self.values, np.broadcast_to(fill_values.astype(np.float32), self.values.shape), where=mask)
+
+    def to_frame(self) -> pd.DataFrame:
+        """DataFrame view over the same buffer (no copy)."""
+        return pd.DataFrame(self.values, index=self.index, columns=self.columns, copy=False)
+
+
+def valid_rows(values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """Rows of `values` where `mask` is True, as a view when they form a suffix.
+
+    Training matrices are usually only invalid over the leading look-back
+    rows, so this avoids copying the whole matrix.
+    """
+    start = int(np.argmax(mask)) if mask.any() else len(mask)
+    if mask[start:].all():
+        return values[start:]
+    return values[mask]
+
+
+# ---------------------------------------------------------------------------
+# Block writers
+# ---------------------------------------------------------------------------
+
+
+def write_calendar(out: np.ndarray, idx: pd.DatetimeIndex, epoch: pd.Timestamp) -> None:
+    """Temporal, cyclical and Fourier columns (`CALENDAR_COLUMNS`) into `out`."""
+    out[:] = calendar_block(idx, epoch)
+
+
+def _dense_table(table: dict, shape: tuple[int, ...], default: float) -> np.ndarray:
+    """Dense lookup array for an encoding dict keyed by int or int tuple."""
+    dense = np.full(shape, default)
+    for key, value in table.items():
+        dense[key] = value
+    return np.where(np.isnan(dense), default, dense)
+
+
+def write_encodings(out: np.ndarray, idx: pd.DatetimeIndex, enc_stats: dict) -> None:
+    """Target-encoding columns (`ENCODING_COLUMNS`) via dense lookup tables."""
+    gm = enc_stats["global_mean"]
+    hour, dow, month = idx.hour.to_numpy(), idx.dayofweek.to_numpy(), idx.month.to_numpy()
+    out[:, 0] = _dense_table(enc_stats["enc_hour"], (24,), gm)[hour]
+    out[:, 1] = _dense_table(enc_stats["enc_dow"], (7,), gm)[dow]
+    out[:, 2] = _dense_table(enc_stats["enc_month"], (13,), gm)[month]
+    out[:, 3] = _dense_table(enc_stats["enc_hour_dow"], (24, 7), gm)[hour, dow]
+    out[:, 4] = _dense_table(enc_stats["enc_month_hour"], (13, 24), gm)[month, hour]
+
+
+def write_train_history(out: np.ndarray, series: pd.Series) -> None:
+    """Anchor lags and leakage-safe rolling stats (`HISTORY_COLUMNS`) over `series` itself."""
+    values = series.to_numpy(dtype=np.float64)
+    for j, lag in enumerate(ANCHOR_LAGS):
+        out[:lag, j] = np.nan
+        out[lag:, j] = values[:-lag]
+
+    j = len(ANCHOR_LAGS)
+    shifted = series.shift(1)
+    for w in ROLLING_WINDOWS:
+        rolling = shifted.rolling(w, min_periods=1)
+        out[:, j] = rolling.mean().to_numpy()
+        out[:, j + 1] = rolling.std().to_numpy()
+        j += 2
+
+
+def write_prediction_history(out: np.ndarray, idx: pd.DatetimeIndex, context: dict) -> None:
+    """Anchor lags from the training series and constant last-window stats."""
+    train_series = context["train_series"]
+    for j, lag in enumerate(ANCHOR_LAGS):
+        out[:, j] = train_series.reindex(idx - pd.Timedelta(hours=lag)).to_numpy()
+
+    lw = context["last_window_stats"]
+    j = len(ANCHOR_LAGS)
+    for w in ROLLING_WINDOWS:
+        out[:, j] = lw[f"last_{w}h_mean"]
+        out[:, j + 1] = lw[f"last_{w}h_std"]
+        j += 2
+
+
+# ---------------------------------------------------------------------------
+# Builders
+# ---------------------------------------------------------------------------
+
+
+def _schema_for(frames: dict[str, pd.DataFrame]) -> FeatureSchema:
+    schema = BASE_SCHEMA
+    for name, df in frames.items():
+        schema = schema.with_block(name, list(df.columns))
+    return schema
+
+
+def build_train_matrix(
+    train_series: pd.Series,
+    extra: dict[str, pd.DataFrame] | None = None,
+) -> tuple[FeatureMatrix, dict]:
+    """Float32 counterpart of `build_train_features`.
+
+    `extra` maps block names to additional feature frames on the training
+    index (spatial, cross-pollutant, weather); each becomes a schema block
+    after the base blocks. Returns (matrix, context) with the same context
+    as `build_train_features`.
+    """
+    extra = extra or {}
+    idx = train_series.index
+    epoch = idx.min()
+    enc_stats = compute_target_encodings(train_series)
+
+    matrix = FeatureMatrix.allocate(idx, _schema_for(extra))
+    write_calendar(matrix.block("calendar"), idx, epoch)
+    write_encodings(matrix.block("encoding"), idx, enc_stats)
+    write_train_history(matrix.block("history"), train_series)
+    matrix.write_frames(extra)
+
+    context = {
+        "epoch": epoch,
+        "enc_stats": enc_stats,
+        "train_series": train_series,
+        "last_window_stats": compute_last_window_stats(train_series),
+    }
+    return matrix, context
+
+
+def extend_train_matrix(
+    matrix: FeatureMatrix,
+    context: dict,
+    new_series: pd.Series,
+    extra: dict[str, pd.DataFrame] | None = None,
+) -> tuple[FeatureMatrix, dict]:
+    """Append training rows for `new_series`, which continues the context's series.
+
+    The result matches `build_train_matrix` on the concatenated series (up
+    to floating-point rounding in the rolling stats). Existing rows are
+    copied once into the larger matrix; only the new rows' calendar,
+    history and `extra` columns are computed, and the encoding block is
+    refreshed for all rows. Extra columns not provided for the new rows are
+    left NaN.
+    """
+    series = pd.concat([context["train_series"], new_series])
+    n_old, n_new = len(matrix.index), len(new_series)
+    new_rows = slice(n_old, n_old + n_new)
+
+    out = FeatureMatrix(np.empty((n_old + n_new, len(matrix.schema)), dtype=np.float32), series.index, matrix.schema)
+    out.values[:n_old] = matrix.values
+
+    enc_stats = compute_target_encodings(series)
+    write_calendar(out.block("calendar")[new_rows], new_series.index, context["epoch"])
+    write_encodings(out.block("encoding"), series.index, enc_stats)
+
+    tail = series.iloc[-(n_new + HISTORY_LOOKBACK) :]
+    history = np.empty((len(tail), len(HISTORY_COLUMNS)), dtype=np.float32)
+    write_train_history(history, tail)
+    out.block("history")[new_rows] = history[-n_new:]
+    out.write_frames(extra or {}, rows=new_rows)
+
+    new_context = {
+        **context,
+        "enc_stats": enc_stats,
+        "train_series": series,
+        "last_window_stats": compute_last_window_stats(series),
+    }
+    return out, new_context
+
+
+def build_prediction_matrix(
+    prediction_index: pd.DatetimeIndex,
+    context: dict,
+    schema: FeatureSchema,
+    extra: dict[str, pd.DataFrame] | None = None,
+) -> FeatureMatrix:
+    """Float32 counterpart of `build_prediction_features`, laid out by `schema`.
+
+    Extra columns in the schema that no `extra` frame provides are set to 0,
+    as the DataFrame path did for features that failed to load.
+    """
+    idx = prediction_index
+    matrix = FeatureMatrix.allocate(idx, schema)
+    write_calendar(matrix.block("calendar"), idx, context["epoch"])
+    write_encodings(matrix.block("encoding"), idx, context["enc_stats"])
+    write_prediction_history(matrix.block("history"), idx, context)
+    matrix.write_frames(extra or {}, missing=0.0)
+    return matrix
@@ -7,6 +7,11 @@ target datetime.
 
 import numpy as np
 import pandas as pd
+from scipy import sparse
+
+from src.data.geometry import StationIndex, load_station_index
+from src.data.history_stats import HistoryStore, history_store
+from src.forecasting.calendar_features import FOURIER_COLUMNS, calendar_frame, fourier_block
 
 # ---------------------------------------------------------------------------
 # Fourier features
@@ -20,19 +25,10 @@ def add_fourier_features(
     """Multi-scale Fourier features for hourly data.
 
     Uses hours-since-epoch so features are consistent between train and future.
+    Values come from the shared `calendar_features` cache; the returned frame
+    is a private (writable) copy.
     """
-    t = (index - epoch).total_seconds() / 3600.0  # hours since epoch
-
-    periods = {"daily": 24, "weekly": 168, "yearly": 8766}
-    n_terms = {"daily": 4, "weekly": 3, "yearly": 5}
-
-    cols = {}
-    for name, period in periods.items():
-        for k in range(1, n_terms[name] + 1):
-            cols[f"four_{name}_sin_{k}"] = np.sin(2 * np.pi * k * t / period)
-            cols[f"four_{name}_cos_{k}"] = np.cos(2 * np.pi * k * t / period)
-
-    return pd.DataFrame(cols, index=index)
+    return pd.DataFrame(fourier_block(index, epoch), index=index, columns=list(FOURIER_COLUMNS), copy=True)
 
 
 # ---------------------------------------------------------------------------
@@ -151,6 +147,30 @@ def compute_last_window_stats(
 
 FEATURE_COLS = None  # set dynamically
 
+# Longest look-back used by the history block (anchor lags / rolling windows)
+HISTORY_LOOKBACK = 720
+
+
+def _calendar_features(idx: pd.DatetimeIndex, epoch: pd.Timestamp) -> pd.DataFrame:
+    """Temporal, cyclical and Fourier features (depend only on the timestamp)."""
+    return calendar_frame(idx, epoch)
+
+
+def _history_features(train_series: pd.Series) -> pd.DataFrame:
+    """Anchor lags and leakage-safe rolling stats over the series itself."""
+    df = pd.DataFrame(index=train_series.index)
+
+    # 5. Anchor lags (for training: use shifted values from the series itself)
+    for lag in (168, 336, 504, 720):
+        df[f"anchor_lag_{lag}h"] = train_series.shift(lag).values
+
+    # 6. Rolling stats from recent history (shifted to prevent leakage)
+    for w in (24, 168):
+        df[f"rolling_mean_{w}h"] = train_series.shift(1).rolling(w, min_periods=1).mean().values
+        df[f"rolling_std_{w}h"] = train_series.shift(1).rolling(w, min_periods=1).std().values
+
+    return df
+
 
 def build_train_features(
     train_series: pd.Series,
@@ -164,39 +184,16 @@ def build_train_features(
     idx = train_series.index
     epoch = idx.min()
 
-    # 1. Temporal
-    df = pd.DataFrame(index=idx)
-    df["hour"] = idx.hour
-    df["day_of_week"] = idx.dayofweek
-    df["month"] = idx.month
-    df["day_of_year"] = idx.dayofyear
-    df["is_weekend"] = (idx.dayofweek >= 5).astype(int)
-
-    # 2. Cyclical (basic)
-    df["hour_sin"] = np.sin(2 * np.pi * idx.hour / 24)
-    df["hour_cos"] = np.cos(2 * np.pi * idx.hour / 24)
-    df["dow_sin"] = np.sin(2 * np.pi * idx.dayofweek / 7)
-    df["dow_cos"] = np.cos(2 * np.pi * idx.dayofweek / 7)
-    df["month_sin"] = np.sin(2 * np.pi * idx.month / 12)
-    df["month_cos"] = np.cos(2 * np.pi * idx.month / 12)
-
-    # 3. Fourier (multi-scale)
-    fourier = add_fourier_features(idx, epoch)
-    df = pd.concat([df, fourier], axis=1)
+    # 1-3. Temporal, cyclical, Fourier
+    df = _calendar_features(idx, epoch)
 
     # 4. Target encoding
     enc_stats = compute_target_encodings(train_series)
     enc_df = apply_target_encodings(idx, enc_stats)
     df = pd.concat([df, enc_df], axis=1)
 
-    # 5. Anchor lags (for training: use shifted values from the series itself)
-    for lag in (168, 336, 504, 720):
-        df[f"anchor_lag_{lag}h"] = train_series.shift(lag).values
-
-    # 6. Rolling stats from recent history (shifted to prevent leakage)
-    for w in (24, 168):
-        df[f"rolling_mean_{w}h"] = train_series.shift(1).rolling(w, min_periods=1).mean().values
-        df[f"rolling_std_{w}h"] = train_series.shift(1).rolling(w, min_periods=1).std().values
+    # 5-6. Anchor lags and rolling stats
+    df = pd.concat([df, _history_features(train_series)], axis=1)
 
     # Store context for prediction
     context = {
@@ -221,25 +218,8 @@ def build_prediction_features(
     enc_stats = context["enc_stats"]
     lw = context["last_window_stats"]
 
-    # 1. Temporal
-    df = pd.DataFrame(index=idx)
-    df["hour"] = idx.hour
-    df["day_of_week"] = idx.dayofweek
-    df["month"] = idx.month
-    df["day_of_year"] = idx.dayofyear
-    df["is_weekend"] = (idx.dayofweek >= 5).astype(int)
-
-    # 2. Cyclical
-    df["hour_sin"] = np.sin(2 * np.pi * idx.hour / 24)
-    df["hour_cos"] = np.cos(2 * np.pi * idx.hour / 24)
-    df["dow_sin"] = np.sin(2 * np.pi * idx.dayofweek / 7)
-    df["dow_cos"] = np.cos(2 * np.pi * idx.dayofweek / 7)
-    df["month_sin"] = np.sin(2 * np.pi * idx.month / 12)
-    df["month_cos"] = np.cos(2 * np.pi * idx.month / 12)
-
-    # 3. Fourier
-    fourier = add_fourier_features(idx, epoch)
-    df = pd.concat([df, fourier], axis=1)
+    # 1-3. Temporal, cyclical, Fourier
+    df = _calendar_features(idx, epoch)
 
     # 4. Target encoding
     enc_df = apply_target_encodings(idx, enc_stats)
@@ -271,43 +251,83 @@ def get_feature_columns(df: pd.DataFrame) -> list[str]:
 # ---------------------------------------------------------------------------
 
 
-def _bq_query(query: str) -> pd.DataFrame:
-    """Execute a BigQuery query and return a DataFrame with proper numeric types."""
-    from src.data.loader import bq_to_dataframe
+def _bq_query(query: str, params: dict | None = None) -> pd.DataFrame:
+    """Execute a parameterized query and return a DataFrame with proper numeric types."""
+    from src.data.loader import run_query
 
-    return bq_to_dataframe(query)
+    return run_query(query, params)
 
 
-def compute_cross_pollutant_features(
+def load_cross_pollutant_pivot(
     station_code: int,
     target_item_code: int,
-    train_index: pd.DatetimeIndex,
-) -> tuple[pd.DataFrame, dict]:
-    """Compute features from other pollutants at the same station.
-
-    For each non-target pollutant, adds anchor lags (168h, 336h) and
-    historical hourly means as features.
-    """
+) -> pd.DataFrame:
+    """Load the other pollutants at a station as a (datetime × item_code) pivot."""
     from src.utils.constants import BQ_TABLE_CLEAN, ITEM_NAMES
 
     other_items = [ic for ic in ITEM_NAMES if ic != target_item_code]
 
     # Load other pollutants for this station
-    placeholders = ",".join(str(c) for c in other_items)
-    data = _bq_query(f"""
+    data = _bq_query(
+        f"""
         SELECT measurement_datetime, item_code, clean_value
         FROM {BQ_TABLE_CLEAN}
-        WHERE station_code = {station_code}
-          AND item_code IN ({placeholders})
+        WHERE station_code = @station_code
+          AND item_code IN UNNEST(@item_codes)
           AND instrument_status = 0
           AND clean_value IS NOT NULL
         ORDER BY measurement_datetime
-    """)
+        """,
+        {"station_code": int(station_code), "item_codes": other_items},
+    )
 
     data["measurement_datetime"] = pd.to_datetime(data["measurement_datetime"])
 
     # Pivot to wide format
-    pivot = data.pivot_table(index="measurement_datetime", columns="item_code", values="clean_value")
+    return data.pivot_table(index="measurement_datetime", columns="item_code", values="clean_value")
+
+
+def compute_cross_pollutant_features(
+    station_code: int,
+    target_item_code: int,
+    train_index: pd.DatetimeIndex,
+    pivot: pd.DataFrame | None = None,
+) -> tuple[pd.DataFrame, dict]:
+    """Compute features from other pollutants at the same station.
+
+    For each non-target pollutant, adds anchor lags (168h, 336h) and
+    historical hourly means as features. Pass `pivot` (from
+    `load_cross_pollutant_pivot`) to reuse already-loaded data.
+    """
+    from src.utils.constants import ITEM_NAMES
+
+    other_items = [ic for ic in ITEM_NAMES if ic != target_item_code]
+    if pivot is None:
+        pivot = load_cross_pollutant_pivot(station_code, target_item_code)
+
+    df, hourly_stats = cross_pollutant_features_from_pivot(pivot, other_items, train_index)
+
+    ctx = {
+        "other_items": other_items,
+        "hourly_stats": hourly_stats,
+        "station_code": station_code,
+    }
+
+    return df, ctx
+
+
+def cross_pollutant_features_from_pivot(
+    pivot: pd.DataFrame,
+    other_items: list[int],
+    train_index: pd.DatetimeIndex,
+) -> tuple[pd.DataFrame, dict]:
+    """Cross-pollutant training features from a loaded pivot.
+
+    Returns (feature_df, hourly_stats) where hourly_stats maps item_code to
+    its per-hour mean over `train_index`.
+    """
+    from src.utils.constants import ITEM_NAMES
+
     pivot = pivot.reindex(train_index).ffill().bfill()
 
     df = pd.DataFrame(index=train_index)
@@ -330,56 +350,43 @@ def compute_cross_pollutant_features(
         # Historical hourly mean for prediction
         hourly_stats[ic] = series.groupby(series.index.hour).mean().to_dict()
 
-    ctx = {
-        "other_items": other_items,
-        "hourly_stats": hourly_stats,
-        "station_code": station_code,
-    }
-
-    return df, ctx
+    return df, hourly_stats
 
 
 def compute_cross_pollutant_for_prediction(
     prediction_index: pd.DatetimeIndex,
     xpol_ctx: dict,
     train_index_end: pd.Timestamp,
+    store: HistoryStore | None = None,
 ) -> pd.DataFrame:
-    """Compute cross-pollutant features for future timestamps."""
-    from src.utils.constants import BQ_TABLE_CLEAN, ITEM_NAMES
+    """Compute cross-pollutant features for future timestamps.
+
+    Anchor lags come from the tail buffer of `store` (default: the shared
+    `history_store()`), or from one query bounded to the lag window when
+    the buffer does not reach back that far.
+    """
+    from src.utils.constants import ITEM_NAMES
 
+    store = store or history_store()
     station_code = xpol_ctx["station_code"]
-    other_items = xpol_ctx["other_items"]
+    other_items = [ic for ic in xpol_ctx["other_items"] if store.has_data(station_code, ic)]
     hourly_stats = xpol_ctx["hourly_stats"]
 
     df = pd.DataFrame(index=prediction_index)
-
-    # Load recent data for anchor lags
-    placeholders = ",".join(str(c) for c in other_items)
-    recent = _bq_query(f"""
-        SELECT measurement_datetime, item_code, clean_value
-        FROM {BQ_TABLE_CLEAN}
-        WHERE station_code = {station_code}
-          AND item_code IN ({placeholders})
-          AND instrument_status = 0
-          AND clean_value IS NOT NULL
-        ORDER BY measurement_datetime
-    """)
-
-    recent["measurement_datetime"] = pd.to_datetime(recent["measurement_datetime"])
-    pivot = recent.pivot_table(index="measurement_datetime", columns="item_code", values="clean_value")
+    if prediction_index.empty:
+        return df
+    lags = (168, 336)
+    lookback = {lag: prediction_index - pd.Timedelta(hours=lag) for lag in lags}
+    window = pd.date_range(lookback[max(lags)].min(), lookback[min(lags)].max(), freq="h")
+    recent = store.values_at(station_code, other_items, window) if other_items else None
 
     for ic in other_items:
         pname = ITEM_NAMES.get(ic, str(ic))
-        if ic not in pivot.columns:
-            continue
-
-        series = pivot[ic]
+        series = recent[ic]
 
         # Anchor lags from actual data
-        for lag in (168, 336):
-            lookback = prediction_index - pd.Timedelta(hours=lag)
-            vals = series.reindex(lookback)
-            df[f"xpol_{pname}_lag{lag}h"] = vals.values
+        for lag in lags:
+            df[f"xpol_{pname}_lag{lag}h"] = series.reindex(lookback[lag]).values
 
         # Use hourly mean as rolling mean proxy for future
         if ic in hourly_stats:
@@ -395,58 +402,81 @@ def compute_cross_pollutant_for_prediction(
 # ---------------------------------------------------------------------------
 
 
-def compute_spatial_features(
+def select_spatial_neighbors(
     station_code: int,
-    item_code: int,
-    train_index: pd.DatetimeIndex,
     k_neighbors: int = 5,
-) -> tuple[pd.DataFrame, dict]:
-    """Compute IDW-weighted spatial features from neighboring stations.
+) -> tuple[list[int], np.ndarray]:
+    """Find the k nearest stations (haversine) and their normalized IDW weights."""
+    return load_station_index().idw_weights(station_code, k_neighbors)
 
-    Returns (feature_df, spatial_context) for use on future timestamps.
-    """
-    from src.utils.constants import BQ_TABLE_CLEAN
 
-    # Get all stations with coordinates
-    stations = _bq_query(f"""
-        SELECT DISTINCT station_code, latitude, longitude
-        FROM {BQ_TABLE_CLEAN}
-        ORDER BY station_code
-    """)
-
-    # Get target station coords
-    target_row = stations[stations["station_code"] == station_code].iloc[0]
-    target_lat, target_lon = target_row["latitude"], target_row["longitude"]
-
-    # Compute distances, find k nearest
-    other = stations[stations["station_code"] != station_code].copy()
-    other["dist"] = np.sqrt((other["latitude"] - target_lat) ** 2 + (other["longitude"] - target_lon) ** 2)
-    neighbors = other.nsmallest(k_neighbors, "dist")
-    neighbor_codes = neighbors["station_code"].tolist()
-    dists = neighbors["dist"].values
-    idw_weights = 1.0 / np.maximum(dists, 1e-6) ** 2
-    idw_weights /= idw_weights.sum()
+def load_neighbor_pivot(
+    neighbor_codes: list[int],
+    item_code: int,
+) -> pd.DataFrame:
+    """Load one pollutant at the given stations as a (datetime × station_code) pivot."""
+    from src.utils.constants import BQ_TABLE_CLEAN
 
-    # Load neighbor series for the same pollutant
-    placeholders = ",".join(str(c) for c in neighbor_codes)
-    neighbor_data = _bq_query(f"""
+    neighbor_data = _bq_query(
+        f"""
         SELECT measurement_datetime, station_code, clean_value
         FROM {BQ_TABLE_CLEAN}
-        WHERE item_code = {item_code}
-          AND station_code IN ({placeholders})
+        WHERE item_code = @item_code
+          AND station_code IN UNNEST(@station_codes)
           AND instrument_status = 0
           AND clean_value IS NOT NULL
         ORDER BY measurement_datetime
-    """)
+        """,
+        {"item_code": int(item_code), "station_codes": [int(c) for c in neighbor_codes]},
+    )
 
     neighbor_data["measurement_datetime"] = pd.to_datetime(neighbor_data["measurement_datetime"])
 
     # Pivot: rows=timestamps, cols=stations
-    pivot = neighbor_data.pivot_table(
+    return neighbor_data.pivot_table(
         index="measurement_datetime",
         columns="station_code",
         values="clean_value",
     )
+
+
+def compute_spatial_features(
+    station_code: int,
+    item_code: int,
+    train_index: pd.DatetimeIndex,
+    k_neighbors: int = 5,
+    spatial_ctx: dict | None = None,
+    pivot: pd.DataFrame | None = None,
+) -> tuple[pd.DataFrame, dict]:
+    """Compute IDW-weighted spatial features from neighboring stations.
+
+    Pass `spatial_ctx` / `pivot` from an earlier call (or from
+    `load_neighbor_pivot`) to skip the neighbour and data queries.
+
+    Returns (feature_df, spatial_context) for use on future timestamps.
+    """
+    if spatial_ctx is None:
+        neighbor_codes, idw_weights = select_spatial_neighbors(station_code, k_neighbors)
+        spatial_ctx = {
+            "neighbor_codes": neighbor_codes,
+            "idw_weights": idw_weights,
+            "item_code": item_code,
+        }
+    # Load neighbor series for the same pollutant
+    if pivot is None:
+        pivot = load_neighbor_pivot(spatial_ctx["neighbor_codes"], item_code)
+
+    return spatial_features_from_pivot(pivot, spatial_ctx, train_index), spatial_ctx
+
+
+def spatial_features_from_pivot(
+    pivot: pd.DataFrame,
+    spatial_ctx: dict,
+    train_index: pd.DatetimeIndex,
+) -> pd.DataFrame:
+    """IDW mean and cross-neighbour std over `train_index` from a loaded pivot."""
+    neighbor_codes = spatial_ctx["neighbor_codes"]
+    idw_weights = spatial_ctx["idw_weights"]
     pivot = pivot.reindex(train_index).ffill().bfill()
 
     # Compute spatial features
@@ -464,58 +494,116 @@ def compute_spatial_features(
     if len(pivot.columns) > 1:
         df["spatial_std"] = pivot.std(axis=1).values
 
-    # Spatial context for prediction
-    spatial_ctx = {
-        "neighbor_codes": neighbor_codes,
-        "idw_weights": idw_weights,
+    return df
+
+
+def compute_network_spatial_features(
+    pivot: pd.DataFrame,
+    item_code: int,
+    k_neighbors: int = 5,
+    station_index: StationIndex | None = None,
+) -> dict:
+    """Spatial features for every station of the network at once.
+
+    The pivot is aligned to the station index on a regular hourly grid
+    (forward/back filled as in `spatial_features_from_pivot`) and multiplied
+    by the sparse k-NN weight matrix, so the IDW mean of all stations is one
+    matrix product; the cross-neighbour std comes from the same product with
+    the 0/1 neighbour pattern (sums and presence counts) and a centered sum
+    of squares over the neighbour edges.
+    Stations with no data for the item drop out of their neighbours' sums,
+    as missing pivot columns do per station.
+
+    Returns a network dict; take per-station features with
+    `station_spatial_features`.
+    """
+    if station_index is None:
+        station_index = load_station_index()
+
+    grid = pd.date_range(pivot.index.min(), pivot.index.max(), freq="h")
+    values = pivot.reindex(index=grid, columns=station_index.codes).ffill().bfill().to_numpy(dtype=float)
+    present = ~np.isnan(values)
+    values = np.where(present, values, 0.0)
+
+    weights = station_index.weight_matrix(k_neighbors)
+    pattern = weights.copy()
+    pattern.data[:] = 1.0
+    n = len(station_index.codes)
+
+    # One sparse product for the IDW means and neighbour sums; counts reuse the pattern
+    stacked = sparse.vstack([weights, pattern]).tocsr()
+    idw_mean, total = np.hsplit(stacked.dot(values.T).T, [n])
+    count = pattern.dot(present.T.astype(float)).T
+
+    # Centered sum of squares: one deviation column per (station, neighbour)
+    # edge, summed back per station (sum(x²) - sum(x)²/n cancels badly)
+    edges = pattern.tocoo()
+    to_station = sparse.csr_matrix((np.ones(edges.nnz), (edges.row, np.arange(edges.nnz))), shape=(n, edges.nnz))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+        dev = np.where(present[:, edges.col], values[:, edges.col] - mean[:, edges.row], 0.0)
+        var = to_station.dot((dev * dev).T).T / (count - 1)
+    std = np.sqrt(np.where(count > 1, var, np.nan))
+
+    columns = pd.Index(station_index.codes, name="station_code")
+    return {
         "item_code": item_code,
+        "k_neighbors": k_neighbors,
+        "station_index": station_index,
+        "n_present": count[0],
+        "spatial_idw_mean": pd.DataFrame(idw_mean, index=grid, columns=columns),
+        "spatial_std": pd.DataFrame(std, index=grid, columns=columns),
     }
 
+
+def station_spatial_features(
+    network: dict,
+    station_code: int,
+    train_index: pd.DatetimeIndex,
+) -> tuple[pd.DataFrame, dict]:
+    """Slice one station's spatial features from `compute_network_spatial_features`.
+
+    Returns (feature_df, spatial_context), like `compute_spatial_features`.
+    """
+    neighbor_codes, idw_weights = network["station_index"].idw_weights(station_code, network["k_neighbors"])
+    spatial_ctx = {"neighbor_codes": neighbor_codes, "idw_weights": idw_weights, "item_code": network["item_code"]}
+
+    df = pd.DataFrame(index=train_index)
+    df["spatial_idw_mean"] = network["spatial_idw_mean"][station_code].reindex(train_index).ffill().bfill().values
+    if network["n_present"][network["station_index"].position(station_code)] > 1:
+        df["spatial_std"] = network["spatial_std"][station_code].reindex(train_index).ffill().bfill().values
     return df, spatial_ctx
 
 
 def compute_spatial_features_for_prediction(
     prediction_index: pd.DatetimeIndex,
     spatial_ctx: dict,
+    store: HistoryStore | None = None,
 ) -> pd.DataFrame:
-    """Compute spatial features for future timestamps from latest neighbor data."""
-    from src.utils.constants import BQ_TABLE_CLEAN
+    """Compute spatial features for future timestamps from the neighbours' hour-of-day history.
 
+    Reads the incremental hourly aggregates of `store` (default: the shared
+    `history_store()`) instead of querying the neighbours' full history.
+    """
+    store = store or history_store()
     neighbor_codes = spatial_ctx["neighbor_codes"]
     idw_weights = spatial_ctx["idw_weights"]
     item_code = spatial_ctx["item_code"]
+    hours = prediction_index.hour.to_numpy()
 
-    placeholders = ",".join(str(c) for c in neighbor_codes)
-    neighbor_data = _bq_query(f"""
-        SELECT measurement_datetime, station_code, clean_value
-        FROM {BQ_TABLE_CLEAN}
-        WHERE item_code = {item_code}
-          AND station_code IN ({placeholders})
-          AND instrument_status = 0
-          AND clean_value IS NOT NULL
-        ORDER BY measurement_datetime
-    """)
-
-    neighbor_data["measurement_datetime"] = pd.to_datetime(neighbor_data["measurement_datetime"])
-    pivot = neighbor_data.pivot_table(index="measurement_datetime", columns="station_code", values="clean_value")
-
-    # For future timestamps, use last known values per neighbor (grouped by hour)
+    # For future timestamps, use each neighbour's historical mean at the same hour
     df = pd.DataFrame(index=prediction_index)
-
-    # Compute per-hour means from neighbor history for lookup
-    pivot_hourly = pivot.groupby(pivot.index.hour).mean()
+    observed = [nc for nc in neighbor_codes if store.has_data(nc, item_code)]
 
     weighted_vals = np.zeros(len(prediction_index))
     for nc, w in zip(neighbor_codes, idw_weights):
-        if nc in pivot_hourly.columns:
-            hourly_lookup = pivot_hourly[nc].to_dict()
-            vals = pd.Series(prediction_index.hour, index=prediction_index).map(hourly_lookup).fillna(0)
-            weighted_vals += vals.values * w
+        if nc in observed:
+            weighted_vals += np.nan_to_num(store.hourly_mean(nc, item_code)[hours]) * w
 
     df["spatial_idw_mean"] = weighted_vals
 
-    if len(pivot.columns) > 1:
-        hourly_std = pivot.groupby(pivot.index.hour).std().mean(axis=1)
-        df["spatial_std"] = pd.Series(prediction_index.hour, index=prediction_index).map(hourly_std.to_dict()).fillna(0)
+    if len(observed) > 1:
+        hourly_std = pd.DataFrame({nc: store.hourly_std(nc, item_code) for nc in observed}).mean(axis=1)
+        df["spatial_std"] = np.nan_to_num(hourly_std.to_numpy()[hours])
 
     return df
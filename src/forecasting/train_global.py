@@ -9,15 +9,14 @@ Experiment 8.
 
 import logging
 
+import lightgbm as lgb
 import numpy as np
 import pandas as pd
-from lightgbm import LGBMRegressor
 
-from src.data.loader import bq_to_dataframe
-from src.forecasting.features import (
-    add_fourier_features,
-)
-from src.utils.constants import BQ_TABLE_CLEAN
+from src.data.loader import run_query
+from src.data.stations import StationRegistry, station_registry
+from src.forecasting.calendar_features import calendar_frame
+from src.utils.constants import BQ_TABLE_CLEAN, STATUS_NORMAL
 
 logger = logging.getLogger(__name__)
 
@@ -25,17 +24,22 @@ logger = logging.getLogger(__name__)
 def load_all_series(end_before: str | None = None) -> pd.DataFrame:
     """Load all station×pollutant series from the database."""
     where = "instrument_status = 0 AND clean_value IS NOT NULL"
+    params = {}
     if end_before:
-        where += f" AND measurement_datetime < '{end_before}'"
+        where += " AND measurement_datetime < @end_before"
+        params["end_before"] = pd.Timestamp(end_before)
 
-    df = bq_to_dataframe(f"""
+    df = run_query(
+        f"""
         SELECT
             measurement_datetime, station_code, item_code, clean_value,
             latitude, longitude
         FROM {BQ_TABLE_CLEAN}
         WHERE {where}
         ORDER BY station_code, item_code, measurement_datetime
-    """)
+        """,
+        params,
+    )
 
     df["measurement_datetime"] = pd.to_datetime(df["measurement_datetime"])
     return df
@@ -54,25 +58,10 @@ def build_global_features(df: pd.DataFrame, epoch: pd.Timestamp) -> pd.DataFrame
     out["station_code"] = df["station_code"].values
     out["item_code"] = df["item_code"].values
 
-    # Temporal
-    out["hour"] = idx.hour
-    out["day_of_week"] = idx.dayofweek
-    out["month"] = idx.month
-    out["day_of_year"] = idx.dayofyear
-    out["is_weekend"] = (idx.dayofweek >= 5).astype(int)
-
-    # Cyclical
-    out["hour_sin"] = np.sin(2 * np.pi * idx.hour / 24)
-    out["hour_cos"] = np.cos(2 * np.pi * idx.hour / 24)
-    out["dow_sin"] = np.sin(2 * np.pi * idx.dayofweek / 7)
-    out["dow_cos"] = np.cos(2 * np.pi * idx.dayofweek / 7)
-    out["month_sin"] = np.sin(2 * np.pi * idx.month / 12)
-    out["month_cos"] = np.cos(2 * np.pi * idx.month / 12)
-
-    # Fourier
-    fourier = add_fourier_features(idx, epoch)
-    fourier.index = out.index
-    out = pd.concat([out, fourier], axis=1)
+    # Temporal, cyclical and Fourier (shared calendar provider)
+    calendar = calendar_frame(idx, epoch)
+    calendar.index = out.index
+    out = pd.concat([out, calendar], axis=1)
 
     # Spatial
     out["latitude"] = df["latitude"].values
@@ -110,6 +99,14 @@ def compute_global_stats(df: pd.DataFrame) -> dict:
     return stats
 
 
+def _dense_lookup(table: dict, shape: tuple[int, ...], default: float) -> np.ndarray:
+    """Dense array for a stats dict keyed by int or int tuple, `default` where missing."""
+    dense = np.full(shape, default, dtype=float)
+    for key, value in table.items():
+        dense[key] = value
+    return dense
+
+
 def add_group_stats(
     features: pd.DataFrame,
     df: pd.DataFrame,
@@ -117,25 +114,29 @@ def add_group_stats(
 ) -> pd.DataFrame:
     """Add per-station/pollutant historical statistics as features."""
     idx = pd.DatetimeIndex(df["measurement_datetime"])
-
-    enc_hour = []
-    enc_hour_dow = []
-    enc_month_hour = []
-    group_mean = []
-    group_std = []
-
-    for i in range(len(df)):
-        key = (int(df.iloc[i]["station_code"]), int(df.iloc[i]["item_code"]))
-        s = stats.get(key, {})
-        h = idx[i].hour
-        dow = idx[i].dayofweek
-        m = idx[i].month
-
-        enc_hour.append(s.get("hourly", {}).get(h, s.get("mean", 0)))
-        enc_hour_dow.append(s.get("hour_dow", {}).get((h, dow), s.get("mean", 0)))
-        enc_month_hour.append(s.get("month_hour", {}).get((m, h), s.get("mean", 0)))
-        group_mean.append(s.get("mean", 0))
-        group_std.append(s.get("std", 1))
+    hour, dow, month = idx.hour.to_numpy(), idx.dayofweek.to_numpy(), idx.month.to_numpy()
+    station = df["station_code"].to_numpy(dtype=np.int64)
+    item = df["item_code"].to_numpy(dtype=np.int64)
+
+    enc_hour = np.empty(len(df))
+    enc_hour_dow = np.empty(len(df))
+    enc_month_hour = np.empty(len(df))
+    group_mean = np.empty(len(df))
+    group_std = np.empty(len(df))
+
+    # One dense lookup per station/pollutant group instead of a dict walk per row
+    groups = pd.MultiIndex.from_arrays([station, item])
+    for sc, ic in groups.unique():
+        rows = (station == sc) & (item == ic)
+        s = stats.get((int(sc), int(ic)), {})
+        mean = s.get("mean", 0)
+        h, d, m = hour[rows], dow[rows], month[rows]
+
+        enc_hour[rows] = _dense_lookup(s.get("hourly", {}), (24,), mean)[h]
+        enc_hour_dow[rows] = _dense_lookup(s.get("hour_dow", {}), (24, 7), mean)[h, d]
+        enc_month_hour[rows] = _dense_lookup(s.get("month_hour", {}), (13, 24), mean)[m, h]
+        group_mean[rows] = mean
+        group_std[rows] = s.get("std", 1)
 
     features["enc_hour"] = enc_hour
     features["enc_hour_dow"] = enc_hour_dow
@@ -146,11 +147,68 @@ def add_group_stats(
     return features
 
 
+GLOBAL_NUM_ROUNDS = 1000
+GLOBAL_LGBM_PARAMS = dict(
+    num_leaves=127,
+    max_depth=10,
+    learning_rate=0.03,
+    subsample=0.7,
+    colsample_bytree=0.7,
+    min_child_samples=50,
+    reg_alpha=0.1,
+    reg_lambda=0.1,
+    random_state=42,
+    n_jobs=-1,
+    verbose=-1,
+)
+
+
+# Identifier features LightGBM splits on as categories rather than as numbers
+GLOBAL_CATEGORICAL = ["station_code", "item_code"]
+
+
+def eval_cutoff(
+    t_min: pd.Timestamp,
+    t_max: pd.Timestamp,
+    eval_fraction: float = 0.1,
+    eval_start: str | None = None,
+) -> pd.Timestamp:
+    """First timestamp of the held-out period: `eval_start`, else the last `eval_fraction` of the range."""
+    if eval_start is not None:
+        return pd.Timestamp(eval_start)
+    return pd.Timestamp(t_max) - (pd.Timestamp(t_max) - pd.Timestamp(t_min)) * eval_fraction
+
+
+def _fit_params(bundle: bool) -> dict:
+    """LightGBM core params for `lgb.train` (sklearn aliases are accepted)."""
+    return {**GLOBAL_LGBM_PARAMS, "objective": "regression", "enable_bundle": bundle}
+
+
 def train_global_model(
     end_before: str | None = None,
     max_rows: int | None = None,
+    parquet_source: str | None = None,
+    eval_fraction: float = 0.1,
+    eval_start: str | None = None,
+    bundle: bool = True,
 ) -> dict:
-    """Train the global LightGBM model."""
+    """Train the global LightGBM model.
+
+    Rows from `eval_start` on (default: the last `eval_fraction` of the time
+    range, across all stations) are held out for early stopping, so the
+    eval set is a later period rather than the last stations in sort order.
+    `station_code` / `item_code` are native LightGBM categoricals, and
+    `bundle` toggles exclusive feature bundling of sparse columns.
+
+    With `parquet_source` (a directory of partitioned Parquet files) training
+    streams partition by partition instead of loading every series at once;
+    see `train_global_model_chunked`.
+    """
+    if parquet_source is not None:
+        return train_global_model_chunked(
+            parquet_source, end_before, eval_fraction=eval_fraction, eval_start=eval_start, bundle=bundle
+        )
+
     logger.info("Loading all series...")
     df = load_all_series(end_before)
 
@@ -176,42 +234,274 @@ def train_global_model(
 
     feat_cols = [c for c in features.columns]
     X = features[feat_cols].astype(float)
-    X = X.fillna(X.median())
-
-    # Train/eval split (last 10%)
-    split = int(len(X) * 0.9)
-    X_train, X_eval = X.iloc[:split], X.iloc[split:]
-    y_train, y_eval = y[:split], y[split:]
-
-    logger.info("Training LightGBM (%d train, %d eval)...", len(X_train), len(X_eval))
-    import lightgbm as lgb
-
-    model = LGBMRegressor(
-        n_estimators=1000,
-        num_leaves=127,
-        max_depth=10,
-        learning_rate=0.03,
-        subsample=0.7,
-        colsample_bytree=0.7,
-        min_child_samples=50,
-        reg_alpha=0.1,
-        reg_lambda=0.1,
-        random_state=42,
-        n_jobs=-1,
-        verbose=-1,
-    )
 
-    model.fit(
-        X_train,
-        y_train,
-        eval_set=[(X_eval, y_eval)],
-        callbacks=[
-            lgb.early_stopping(50, verbose=False),
-            lgb.log_evaluation(0),
-        ],
+    # Time-ordered train/eval split at a timestamp cutoff (all stations)
+    cutoff = eval_cutoff(epoch, df["measurement_datetime"].max(), eval_fraction, eval_start)
+    in_eval = (df["measurement_datetime"] >= cutoff).to_numpy()
+    train_medians = X[~in_eval].median()
+    X = X.fillna(train_medians)
+    X_train, X_eval = X[~in_eval], X[in_eval]
+    y_train, y_eval = y[~in_eval], y[in_eval]
+
+    logger.info("Training LightGBM (%d train, %d eval from %s)...", len(X_train), len(X_eval), cutoff)
+    train_set = lgb.Dataset(X_train, label=y_train, categorical_feature=GLOBAL_CATEGORICAL, params=_fit_params(bundle))
+    valid_sets, callbacks = [], [lgb.log_evaluation(0)]
+    if len(X_eval):
+        valid_sets.append(lgb.Dataset(X_eval, label=y_eval, reference=train_set))
+        callbacks.append(lgb.early_stopping(50, verbose=False))
+    model = lgb.train(_fit_params(bundle), train_set, GLOBAL_NUM_ROUNDS, valid_sets=valid_sets, callbacks=callbacks)
+    del X
+
+    return {
+        "model": model,
+        "epoch": epoch,
+        "stats": stats,
+        "feat_cols": feat_cols,
+        "train_medians": train_medians,
+        "categorical_features": GLOBAL_CATEGORICAL,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Out-of-core training from partitioned Parquet
+# ---------------------------------------------------------------------------
+
+GLOBAL_SOURCE_COLUMNS = [
+    "measurement_datetime",
+    "station_code",
+    "item_code",
+    "clean_value",
+    "latitude",
+    "longitude",
+]
+
+# Rows per partition kept (at random) to estimate the fill medians
+MEDIAN_SAMPLE_ROWS = 200_000
+
+
+def _source_filter(end_before: str | None):
+    import pyarrow.dataset as ds
+
+    expr = (ds.field("instrument_status") == STATUS_NORMAL) & ds.field("clean_value").is_valid()
+    if end_before:
+        expr &= ds.field("measurement_datetime") < pd.Timestamp(end_before)
+    return expr
+
+
+class ParquetPartitions:
+    """The fragments (files) of a partitioned Parquet dataset, read one at a time.
+
+    Any layout `pyarrow.dataset` understands works; Hive-style directories
+    (``station_code=201/...``) supply their partition columns. Only normal,
+    non-null rows before `end_before` are read.
+    """
+
+    def __init__(self, source: str, end_before: str | None = None):
+        import pyarrow.dataset as ds
+
+        self.dataset = ds.dataset(source, format="parquet", partitioning="hive")
+        self.filter = _source_filter(end_before)
+        self.fragments = list(self.dataset.get_fragments(filter=self.filter))
+
+    def __len__(self) -> int:
+        return len(self.fragments)
+
+    def read(self, i: int) -> pd.DataFrame:
+        from src.data.loader import arrow_to_dataframe
+
+        table = self.fragments[i].to_table(
+            schema=self.dataset.schema, columns=GLOBAL_SOURCE_COLUMNS, filter=self.filter
+        )
+        df = arrow_to_dataframe(table)
+        df["measurement_datetime"] = pd.to_datetime(df["measurement_datetime"])
+        return df.sort_values(["station_code", "item_code", "measurement_datetime"], kind="stable", ignore_index=True)
+
+
+# Shapes of the (sum, count) tables behind each per-group mean in `compute_global_stats`
+_STAT_TABLES = {"hourly": (24,), "hour_dow": (24, 7), "month_hour": (13, 24)}
+
+
+def _observed_means(sums: np.ndarray, counts: np.ndarray) -> dict:
+    """{key: mean} over observed cells, keyed like the pandas groupby dicts (int or int tuple)."""
+    means = {}
+    for cell in zip(*np.nonzero(counts), strict=True):
+        key = int(cell[0]) if len(cell) == 1 else tuple(int(i) for i in cell)
+        means[key] = float(sums[cell] / counts[cell])
+    return means
+
+
+class _GroupStatsAccumulator:
+    """`compute_global_stats` built up partition by partition from sums and counts."""
+
+    def __init__(self):
+        self._sums: dict[tuple[int, int], dict[str, np.ndarray]] = {}
+        self._counts: dict[tuple[int, int], dict[str, np.ndarray]] = {}
+        self._moments: dict[tuple[int, int], np.ndarray] = {}
+
+    def update(self, df: pd.DataFrame) -> None:
+        idx = pd.DatetimeIndex(df["measurement_datetime"])
+        hour, dow, month = idx.hour.to_numpy(), idx.dayofweek.to_numpy(), idx.month.to_numpy()
+        values = df["clean_value"].to_numpy(dtype=float)
+        for (sc, ic), rows in df.groupby(["station_code", "item_code"]).indices.items():
+            key = (int(sc), int(ic))
+            if key not in self._moments:
+                self._sums[key] = {name: np.zeros(shape) for name, shape in _STAT_TABLES.items()}
+                self._counts[key] = {name: np.zeros(shape) for name, shape in _STAT_TABLES.items()}
+                self._moments[key] = np.zeros(3)
+
+            v, h = values[rows], hour[rows]
+            cells = {"hourly": (h,), "hour_dow": (h, dow[rows]), "month_hour": (month[rows], h)}
+            for name, cell in cells.items():
+                np.add.at(self._sums[key][name], cell, v)
+                np.add.at(self._counts[key][name], cell, 1)
+            self._moments[key] += (len(v), v.sum(), (v * v).sum())
+
+    def to_stats(self) -> dict:
+        stats = {}
+        for key, (n, total, sq) in self._moments.items():
+            std = np.sqrt(max((sq - total * total / n) / (n - 1), 0.0)) if n > 1 else np.nan
+            stats[key] = {
+                name: _observed_means(self._sums[key][name], self._counts[key][name]) for name in _STAT_TABLES
+            }
+            stats[key]["mean"] = float(total / n)
+            stats[key]["std"] = float(std)
+        return stats
+
+
+def global_feature_matrix(df: pd.DataFrame, epoch: pd.Timestamp, stats: dict, feat_cols: list[str]) -> np.ndarray:
+    """float64 (n, len(feat_cols)) global-model features for raw rows `df`."""
+    features = add_group_stats(build_global_features(df, epoch), df, stats)
+    return features[feat_cols].to_numpy(dtype=float)
+
+
+class _PartitionCache:
+    """Single-slot cache of one partition's feature matrix (the memory ceiling)."""
+
+    def __init__(self, partitions: ParquetPartitions, build):
+        self.partitions = partitions
+        self.build = build
+        self.key: int | None = None
+        self.matrix: np.ndarray | None = None
+
+    def get(self, i: int) -> np.ndarray:
+        if self.key != i:
+            self.matrix = None  # release the previous partition before building the next
+            self.matrix = self.build(self.partitions.read(i))
+            self.key = i
+        return self.matrix
+
+
+class PartitionSequence(lgb.Sequence):
+    """Selected rows of one partition's feature matrix, for `lgb.Dataset` construction.
+
+    LightGBM samples rows for binning and then pushes rows in batches,
+    visiting sequences in order, so with a shared single-slot cache each
+    partition's features are built at most twice per Dataset and only one
+    partition is materialized at a time.
+    """
+
+    batch_size = 65_536
+
+    def __init__(self, cache: _PartitionCache, partition: int, rows: np.ndarray):
+        self.cache = cache
+        self.partition = partition
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, idx):
+        return self.cache.get(self.partition)[self.rows[idx]]
+
+
+def train_global_model_chunked(
+    source: str,
+    end_before: str | None = None,
+    eval_fraction: float = 0.1,
+    eval_start: str | None = None,
+    bundle: bool = True,
+    median_sample_rows: int = MEDIAN_SAMPLE_ROWS,
+) -> dict:
+    """Train the global model from partitioned Parquet within a bounded memory footprint.
+
+    Pass 1 streams the partitions once for the group statistics, epoch,
+    labels, timestamps and a row sample (for the NaN fill medians). The
+    training and evaluation `lgb.Dataset`s are then built from
+    `PartitionSequence`s: LightGBM bins a row sample and pushes the rest in
+    batches, so the raw frame and the full feature frame never coexist, and
+    only the binned Dataset grows with the data. The last `eval_fraction` of
+    the time range (or everything from `eval_start`) is held out for early
+    stopping.
+
+    Returns the same pipeline dict as `train_global_model`.
+    """
+    partitions = ParquetPartitions(source, end_before)
+    if not len(partitions):
+        raise ValueError(f"No Parquet partitions with training rows under {source}")
+
+    logger.info("Pass 1: statistics over %d partitions...", len(partitions))
+    accumulator = _GroupStatsAccumulator()
+    labels, stamps, samples = [], [], []
+    rng = np.random.default_rng(42)
+    per_partition = max(1, median_sample_rows // len(partitions))
+    for i in range(len(partitions)):
+        df = partitions.read(i)
+        accumulator.update(df)
+        labels.append(np.log1p(df["clean_value"].to_numpy(dtype=float)))
+        stamps.append(df["measurement_datetime"].to_numpy(dtype="datetime64[ns]").view(np.int64))
+        samples.append(df.iloc[np.sort(rng.choice(len(df), min(per_partition, len(df)), replace=False))])
+        del df
+
+    stats = accumulator.to_stats()
+    t_min = min(t.min() for t in stamps if len(t))
+    t_max = max(t.max() for t in stamps if len(t))
+    epoch = pd.Timestamp(t_min)
+    cutoff = eval_cutoff(pd.Timestamp(t_min), pd.Timestamp(t_max), eval_fraction, eval_start).value
+
+    sample = pd.concat(samples, ignore_index=True)
+    if (sample["measurement_datetime"] < pd.Timestamp(cutoff)).any():
+        sample = sample[sample["measurement_datetime"] < pd.Timestamp(cutoff)]
+    sample_features = add_group_stats(build_global_features(sample, epoch), sample, stats)
+    feat_cols = list(sample_features.columns)
+    train_medians = sample_features.astype(float).median()
+    fill_values = train_medians.to_numpy()
+    del samples, sample, sample_features
+
+    def build(df: pd.DataFrame) -> np.ndarray:
+        X = global_feature_matrix(df, epoch, stats, feat_cols)
+        return np.where(np.isnan(X), fill_values, X)
+
+    cache = _PartitionCache(partitions, build)
+    train_seqs, eval_seqs, y_train, y_eval = [], [], [], []
+    for i, (t, y) in enumerate(zip(stamps, labels, strict=True)):
+        in_eval = t >= cutoff
+        for rows, seqs, ys in (
+            (np.flatnonzero(~in_eval), train_seqs, y_train),
+            (np.flatnonzero(in_eval), eval_seqs, y_eval),
+        ):
+            if len(rows):
+                seqs.append(PartitionSequence(cache, i, rows))
+                ys.append(y[rows])
+    del stamps, labels
+
+    params = _fit_params(bundle)
+    train_set = lgb.Dataset(
+        train_seqs,
+        label=np.concatenate(y_train),
+        feature_name=feat_cols,
+        categorical_feature=GLOBAL_CATEGORICAL,
+        params=params,
     )
+    valid_sets = []
+    if eval_seqs:
+        valid_sets.append(lgb.Dataset(eval_seqs, label=np.concatenate(y_eval), reference=train_set))
 
-    train_medians = X.median()
+    n_train, n_eval = sum(len(q) for q in train_seqs), sum(len(q) for q in eval_seqs)
+    logger.info("Training LightGBM out of core (%d train, %d eval)...", n_train, n_eval)
+    callbacks = [lgb.log_evaluation(0)]
+    if valid_sets:
+        callbacks.append(lgb.early_stopping(50, verbose=False))
+    model = lgb.train(params, train_set, GLOBAL_NUM_ROUNDS, valid_sets=valid_sets, callbacks=callbacks)
 
     return {
         "model": model,
@@ -219,6 +509,7 @@ def train_global_model(
         "stats": stats,
         "feat_cols": feat_cols,
         "train_medians": train_medians,
+        "categorical_features": GLOBAL_CATEGORICAL,
     }
 
 
@@ -229,39 +520,52 @@ def predict_global(
     prediction_index: pd.DatetimeIndex,
 ) -> pd.Series:
     """Generate predictions for a specific station/pollutant."""
-    model = pipeline["model"]
-    epoch = pipeline["epoch"]
-    stats = pipeline["stats"]
-    feat_cols = pipeline["feat_cols"]
+    batch = predict_global_batch(pipeline, prediction_index, [(station_code, item_code)])
+    return pd.Series(batch["predicted_value"].to_numpy(), index=prediction_index, name="global_lgbm")
 
-    row = bq_to_dataframe(f"""
-        SELECT DISTINCT latitude, longitude
-        FROM {BQ_TABLE_CLEAN}
-        WHERE station_code = {station_code}
-        LIMIT 1
-    """)
 
-    lat, lon = row.iloc[0]["latitude"], row.iloc[0]["longitude"]
+def predict_global_batch(
+    pipeline: dict,
+    prediction_index: pd.DatetimeIndex,
+    pairs: list[tuple[int, int]] | None = None,
+    registry: StationRegistry | None = None,
+) -> pd.DataFrame:
+    """Predict many station/pollutant pairs over `prediction_index` in one booster call.
+
+    `pairs` defaults to every (station_code, item_code) group the model was
+    trained on. One feature matrix is built for all pairs × timestamps, with
+    the group statistics looked up per group rather than per row.
 
-    # Build a dummy df for feature generation
+    Returns a long frame: measurement_datetime, station_code, item_code,
+    predicted_value (pair-major, timestamps in order within each pair).
+    Raises KeyError for a pair the model was not trained on, which would
+    otherwise get empty group statistics.
+    """
+    pairs = sorted(pipeline["stats"]) if pairs is None else [(int(sc), int(ic)) for sc, ic in pairs]
+    unknown = [pair for pair in pairs if pair not in pipeline["stats"]]
+    if unknown:
+        listed = ", ".join(f"{sc}/{ic}" for sc, ic in unknown)
+        raise KeyError(f"Global model not trained on station_code/item_code {listed}")
+    registry = registry or station_registry()
+    station = np.array([sc for sc, _ in pairs], dtype=np.int64)
+    item = np.array([ic for _, ic in pairs], dtype=np.int64)
+    coords = np.array([registry.coordinates(sc) for sc in station], dtype=float).reshape(-1, 2)
+
+    n = len(prediction_index)
     df = pd.DataFrame(
         {
-            "measurement_datetime": prediction_index,
-            "station_code": station_code,
-            "item_code": item_code,
+            "measurement_datetime": np.tile(prediction_index.to_numpy(), len(pairs)),
+            "station_code": np.repeat(station, n),
+            "item_code": np.repeat(item, n),
             "clean_value": 0.0,
-            "latitude": lat,
-            "longitude": lon,
+            "latitude": np.repeat(coords[:, 0], n),
+            "longitude": np.repeat(coords[:, 1], n),
         }
     )
 
-    features = build_global_features(df, epoch)
-    features = add_group_stats(features, df, stats)
-
-    X = features[feat_cols].astype(float)
-    X = X.fillna(pipeline["train_medians"])
-
-    preds_log = model.predict(X)
-    preds = np.maximum(np.expm1(preds_log), 0)
+    X = global_feature_matrix(df, pipeline["epoch"], pipeline["stats"], pipeline["feat_cols"])
+    fill_values = pipeline["train_medians"].reindex(pipeline["feat_cols"]).to_numpy(dtype=float)
+    X = np.where(np.isnan(X), fill_values, X)
 
-    return pd.Series(preds, index=prediction_index, name="global_lgbm")
+    preds = np.maximum(np.expm1(pipeline["model"].predict(X)), 0)
+    return df[["measurement_datetime", "station_code", "item_code"]].assign(predicted_value=preds)
@@ -6,27 +6,50 @@ and conformalized quantile regression for calibrated prediction intervals.
 """
 
 import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
+import lightgbm as lgb
 import numpy as np
 import pandas as pd
 from lightgbm import LGBMRegressor
-from scipy.optimize import minimize
 from sklearn.linear_model import Ridge
 
+from src.data.stations import station_registry
 from src.data.weather import (
     get_weather_features_for_prediction,
     get_weather_for_station,
 )
+from src.forecasting.calendar_features import FOURIER_SLICE, calendar_block
+from src.forecasting.feature_matrix import (
+    BASE_SCHEMA,
+    FeatureMatrix,
+    FeatureSchema,
+    build_prediction_matrix,
+    build_train_matrix,
+    extend_train_matrix,
+    valid_rows,
+)
 from src.forecasting.features import (
-    add_fourier_features,
-    build_prediction_features,
-    build_train_features,
     compute_cross_pollutant_features,
     compute_cross_pollutant_for_prediction,
     compute_spatial_features,
     compute_spatial_features_for_prediction,
-    get_feature_columns,
+    cross_pollutant_features_from_pivot,
+    load_cross_pollutant_pivot,
+    load_neighbor_pivot,
+    select_spatial_neighbors,
+    spatial_features_from_pivot,
+    station_spatial_features,
+)
+from src.forecasting.quantiles import (
+    calibrate_quantiles_cqr,
+    predict_quantiles,
+    quantile_column,
+    train_quantile_head,
 )
+from src.forecasting.tree_inference import predict_raw
 
 logger = logging.getLogger(__name__)
 
@@ -87,8 +110,6 @@ def train_lgbm(
     alpha: float | None = None,
 ) -> LGBMRegressor:
     """Train a single LightGBM model."""
-    import lightgbm as lgb
-
     params = _lgbm_params(objective, alpha)
     model = LGBMRegressor(**params)
 
@@ -104,23 +125,122 @@ def train_lgbm(
     return model
 
 
+# Objectives trained for every forecast target: point estimate + 90% band.
+LGBM_OBJECTIVES = {
+    "lgbm_model": ("regression", None),
+    "lgbm_q05": ("quantile", 0.05),
+    "lgbm_q95": ("quantile", 0.95),
+}
+
+# Booster construction touches shared Dataset state on the Python side, so
+# it is serialized; the boosting iterations themselves run outside the lock.
+_BOOSTER_INIT_LOCK = threading.Lock()
+
+
+def _fit_booster(
+    params: dict,
+    num_boost_round: int,
+    train_set: lgb.Dataset,
+    val_set: lgb.Dataset | None = None,
+    early_stopping_rounds: int = 50,
+) -> lgb.Booster:
+    """Boost on an already-constructed Dataset, early-stopping on `val_set`."""
+    with _BOOSTER_INIT_LOCK:
+        booster = lgb.Booster(params=params, train_set=train_set)
+        if val_set is not None:
+            booster.add_valid(val_set, "valid")
+
+    best_iter, best_score = 0, np.inf
+    for i in range(num_boost_round):
+        booster.update()
+        if val_set is None:
+            continue
+        score = booster.eval_valid()[0][2]
+        if score < best_score:
+            best_iter, best_score = i + 1, score
+        elif i + 1 - best_iter >= early_stopping_rounds:
+            break
+
+    # Detach from the training Datasets (same as lgb.train's default)
+    final = lgb.Booster(model_str=booster.model_to_string())
+    final.best_iteration = best_iter
+    return final
+
+
+def train_lgbm_models(
+    X_train: pd.DataFrame | np.ndarray,
+    y_train: pd.Series,
+    X_val: pd.DataFrame | np.ndarray | None = None,
+    y_val: pd.Series | None = None,
+    objectives: dict[str, tuple[str, float | None]] | None = None,
+    n_jobs: int = -1,
+    concurrent: bool = False,
+    feature_names: list[str] | None = None,
+) -> dict[str, lgb.Booster]:
+    """Train several LightGBM objectives from one shared binned Dataset.
+
+    Features are binned once (and the validation set is binned against the
+    same bin mappers), then every objective boosts on the shared Dataset.
+    With `concurrent=True` the objectives train in parallel threads, each
+    with an equal share of the `n_jobs` thread budget. NumPy inputs (e.g. a
+    float32 `FeatureMatrix`) are used without copying; pass `feature_names`
+    to name their columns.
+
+    Returns a dict mapping objective name to a trained `lgb.Booster`.
+    """
+    objectives = objectives or LGBM_OBJECTIVES
+    n_threads = n_jobs if n_jobs and n_jobs > 0 else (os.cpu_count() or 1)
+    n_workers = min(len(objectives), n_threads) if concurrent else 1
+    threads_per_model = max(1, n_threads // n_workers)
+
+    base_params = _lgbm_params()
+    num_boost_round = base_params.pop("n_estimators")
+    base_params["n_jobs"] = threads_per_model
+
+    train_set = lgb.Dataset(
+        X_train, label=y_train, feature_name=feature_names or "auto", params=base_params, free_raw_data=False
+    ).construct()
+    val_set = None
+    if X_val is not None and y_val is not None:
+        val_set = lgb.Dataset(X_val, label=y_val, reference=train_set, params=base_params).construct()
+
+    def fit(spec: tuple[str, float | None]) -> lgb.Booster:
+        objective, alpha = spec
+        params = {**base_params, "objective": objective}
+        if objective == "quantile" and alpha is not None:
+            params["alpha"] = alpha
+        return _fit_booster(params, num_boost_round, train_set, val_set)
+
+    if n_workers > 1:
+        with ThreadPoolExecutor(max_workers=n_workers) as pool:
+            boosters = list(pool.map(fit, objectives.values()))
+    else:
+        boosters = [fit(spec) for spec in objectives.values()]
+
+    return dict(zip(objectives, boosters))
+
+
 # ---------------------------------------------------------------------------
 # Ridge with Fourier features (complementary model)
 # ---------------------------------------------------------------------------
 
 
+# Ridge inputs: the Fourier terms, then hour / day_of_week / month
+_RIDGE_COLUMNS = [*range(FOURIER_SLICE.start, FOURIER_SLICE.stop), 0, 1, 2]
+
+
+def _ridge_design(index: pd.DatetimeIndex, epoch: pd.Timestamp) -> np.ndarray:
+    """Ridge design matrix, gathered from the shared calendar block."""
+    return calendar_block(index, epoch)[:, _RIDGE_COLUMNS]
+
+
 def train_ridge(
     train_series: pd.Series,
 ) -> tuple[Ridge, pd.Timestamp]:
     """Train a Ridge model using only Fourier + temporal features."""
     epoch = train_series.index.min()
-    fourier = add_fourier_features(train_series.index, epoch)
-    fourier["hour"] = train_series.index.hour
-    fourier["day_of_week"] = train_series.index.dayofweek
-    fourier["month"] = train_series.index.month
-
     model = Ridge(alpha=10.0)
-    model.fit(fourier.values, train_series.values)
+    model.fit(_ridge_design(train_series.index, epoch), train_series.values)
     return model, epoch
 
 
@@ -130,12 +250,7 @@ def predict_ridge(
     epoch: pd.Timestamp,
 ) -> pd.Series:
     """Predict with the Ridge Fourier model."""
-    fourier = add_fourier_features(prediction_index, epoch)
-    fourier["hour"] = prediction_index.hour
-    fourier["day_of_week"] = prediction_index.dayofweek
-    fourier["month"] = prediction_index.month
-
-    preds = model.predict(fourier.values)
+    preds = model.predict(_ridge_design(prediction_index, epoch))
     preds = np.maximum(preds, 0)
     return pd.Series(preds, index=prediction_index, name="ridge_fourier")
 
@@ -145,6 +260,60 @@ def predict_ridge(
 # ---------------------------------------------------------------------------
 
 
+def solve_simplex_weights(
+    gram: np.ndarray,
+    cross: np.ndarray,
+    max_iter: int = 500,
+    tol: float = 1e-12,
+) -> np.ndarray:
+    """Minimize ``w'Gw - 2c'w`` over the probability simplex (w >= 0, sum w = 1).
+
+    With ``G = P'P / n`` and ``c = P'y / n`` this is the MSE of the convex
+    combination ``P @ w``. Solved exactly by a primal active-set method on
+    the K×K Gram matrix, so cost is independent of the number of rows and
+    the sufficient statistics can be accumulated incrementally for rolling
+    re-optimization.
+    """
+    k = len(cross)
+    w = np.full(k, 1.0 / k)
+    free = np.ones(k, dtype=bool)
+    # Tiny ridge keeps the KKT system solvable for collinear members
+    gram = gram + np.eye(k) * 1e-12 * max(np.trace(gram), 1.0)
+
+    for _ in range(max_iter):
+        idx = np.flatnonzero(free)
+        m = len(idx)
+        kkt = np.zeros((m + 1, m + 1))
+        kkt[:m, :m] = gram[np.ix_(idx, idx)]
+        kkt[:m, m] = kkt[m, :m] = 1.0
+        sol = np.linalg.solve(kkt, np.append(cross[idx], 1.0))
+
+        step = np.zeros(k)
+        step[idx] = sol[:m] - w[idx]
+        if np.max(np.abs(step)) <= tol:
+            # Optimal on the working set: release the most negative multiplier
+            multipliers = gram @ w - cross + sol[m]
+            multipliers[free] = np.inf
+            j = int(np.argmin(multipliers))
+            if multipliers[j] >= -tol:
+                break
+            free[j] = True
+            continue
+
+        # Move toward the working-set optimum until a weight hits zero
+        shrinking = idx[step[idx] < 0]
+        ratios = -w[shrinking] / step[shrinking]
+        alpha = min(1.0, ratios.min()) if len(ratios) else 1.0
+        w = w + alpha * step
+        if alpha < 1.0:
+            blocking = shrinking[np.argmin(ratios)]
+            w[blocking] = 0.0
+            free[blocking] = False
+
+    w = np.maximum(w, 0.0)
+    return w / w.sum()
+
+
 def optimize_weights(
     y_true: np.ndarray,
     predictions: dict[str, np.ndarray],
@@ -153,17 +322,39 @@ def optimize_weights(
     names = list(predictions.keys())
     pred_matrix = np.column_stack([predictions[n] for n in names])
 
-    def objective(w):
-        combined = pred_matrix @ w
-        return np.mean((y_true - combined) ** 2)
+    n = len(y_true)
+    gram = pred_matrix.T @ pred_matrix / n
+    cross = pred_matrix.T @ y_true / n
+    return dict(zip(names, solve_simplex_weights(gram, cross).tolist()))
 
-    n = len(names)
-    constraints = {"type": "eq", "fun": lambda w: w.sum() - 1.0}
-    bounds = [(0.0, 1.0)] * n
-    x0 = np.ones(n) / n
 
-    result = minimize(objective, x0, method="SLSQP", bounds=bounds, constraints=constraints)
-    return dict(zip(names, result.x))
+def optimize_horizon_weights(
+    y_true: np.ndarray,
+    predictions: dict[str, np.ndarray],
+    horizon_steps: np.ndarray,
+    bucket_edges: tuple[int, ...] = (0, 168, 336, 504),
+) -> dict:
+    """Fit separate convex weights per forecast-horizon bucket.
+
+    Bucket ``i`` covers horizon steps ``[bucket_edges[i], bucket_edges[i + 1])``;
+    the last bucket is open-ended. Empty buckets fall back to the weights
+    fitted on all rows.
+
+    Returns ``{"edges": [...], "weights": [dict, ...]}`` as consumed by
+    `predict_with_pipeline`.
+    """
+    overall = optimize_weights(y_true, predictions)
+    bucket = np.searchsorted(bucket_edges, horizon_steps, side="right") - 1
+
+    weights = []
+    for b in range(len(bucket_edges)):
+        mask = bucket == b
+        if not mask.any():
+            weights.append(overall)
+            continue
+        weights.append(optimize_weights(y_true[mask], {k: v[mask] for k, v in predictions.items()}))
+
+    return {"edges": list(bucket_edges), "weights": weights}
 
 
 # ---------------------------------------------------------------------------
@@ -227,14 +418,26 @@ def walk_forward_cv(
 # ---------------------------------------------------------------------------
 
 
-def _add_spatial(df: pd.DataFrame, spatial_df: pd.DataFrame) -> pd.DataFrame:
-    """Merge spatial features into feature DataFrame."""
-    for col in spatial_df.columns:
-        if col in df.columns:
-            df[col] = spatial_df[col].values
-        else:
-            df[col] = spatial_df.reindex(df.index)[col].values
-    return df
+def _log_spatial(spatial_df: pd.DataFrame) -> pd.DataFrame:
+    """log1p the neighbour-mean spatial columns (the target is modelled in log space)."""
+    for c in spatial_df.columns:
+        if "mean" in c:
+            spatial_df[c] = np.log1p(spatial_df[c])
+    return spatial_df
+
+
+def _log_xpol(xpol_df: pd.DataFrame) -> pd.DataFrame:
+    """log1p the cross-pollutant lag / rolling-mean columns."""
+    for c in xpol_df.columns:
+        if "lag" in c or "rmean" in c:
+            xpol_df[c] = np.log1p(xpol_df[c].clip(lower=0))
+    return xpol_df
+
+
+def _training_rows(matrix: FeatureMatrix, train_log: pd.Series) -> tuple[np.ndarray, pd.Series]:
+    """Rows with complete features and a target (drops the look-back warm-up)."""
+    valid_mask = ~np.isnan(matrix.values).any(axis=1) & train_log.notna().to_numpy()
+    return valid_rows(matrix.values, valid_mask), train_log[valid_mask]
 
 
 def train_forecast_pipeline(
@@ -244,115 +447,158 @@ def train_forecast_pipeline(
     item_code: int | None = None,
     station_lat: float | None = None,
     station_lon: float | None = None,
+    concurrent_lgbm: bool = False,
+    n_jobs: int = -1,
+    keep_feature_cache: bool = False,
+    horizon_buckets: tuple[int, ...] | None = None,
+    quantiles: tuple[float, ...] | None = None,
+    spatial_network: dict | None = None,
+    weather: bool = False,
 ) -> dict:
     """Train the full forecast ensemble.
 
+    `concurrent_lgbm` trains the point and quantile LightGBM models in
+    parallel threads with a split thread budget (see `train_lgbm_models`).
+    `n_jobs` caps the LightGBM thread budget (-1 = all cores).
+    `keep_feature_cache` stores the training feature matrix and the loaded
+    neighbour / cross-pollutant data under `"feature_cache"` so the pipeline
+    can later be refit on extended data (see `refit_forecast_pipeline`).
+    `horizon_buckets` (e.g. ``(0, 168, 336, 504)``) additionally fits separate
+    ensemble weights per horizon bucket on the validation set.
+    `quantiles` (e.g. `quantiles.DEFAULT_QUANTILES`) replaces the two
+    dedicated q05/q95 boosters with a location-scale quantile head that
+    yields every requested level in one pass, each conformalized separately
+    on the validation set (see `src.forecasting.quantiles`).
+    `spatial_network` (from `compute_network_spatial_features` for
+    `item_code`) supplies precomputed network-wide spatial features, so
+    training every station of an item pivots the neighbour data only once.
+    Weather features are added at `station_lat`/`station_lon`, or with
+    `weather=True` at `station_code`'s coordinates from the station registry.
+
     Returns a pipeline dict with all models and artifacts needed for prediction.
     """
     # --- Log1p target transform ---
     train_log = np.log1p(train_series)
     val_log = np.log1p(val_series) if val_series is not None else None
 
-    # Build training features
-    train_feats, context = build_train_features(train_log)
-    feat_cols = get_feature_columns(train_feats)
+    # Raw neighbour / cross-pollutant data, kept for refits
+    sources = {}
+    # Station feature blocks, appended to the base schema in this order
+    extra = {}
 
     # Spatial features (if station info provided)
     spatial_ctx = None
     if station_code is not None and item_code is not None:
         try:
-            spatial_train, spatial_ctx = compute_spatial_features(station_code, item_code, train_series.index)
-            for c in spatial_train.columns:
-                if "mean" in c:
-                    spatial_train[c] = np.log1p(spatial_train[c])
-            train_feats = _add_spatial(train_feats, spatial_train)
-            feat_cols = get_feature_columns(train_feats)
+            if spatial_network is not None:
+                sources["spatial_network"] = spatial_network
+                sources["spatial_station_code"] = station_code
+                spatial_train, spatial_ctx = station_spatial_features(spatial_network, station_code, train_series.index)
+            else:
+                neighbor_codes, idw_weights = select_spatial_neighbors(station_code)
+                spatial_ctx = {"neighbor_codes": neighbor_codes, "idw_weights": idw_weights, "item_code": item_code}
+                sources["spatial_pivot"] = load_neighbor_pivot(neighbor_codes, item_code)
+                spatial_train, spatial_ctx = compute_spatial_features(
+                    station_code, item_code, train_series.index, spatial_ctx=spatial_ctx, pivot=sources["spatial_pivot"]
+                )
+            extra["spatial"] = _log_spatial(spatial_train)
         except Exception as e:
             logger.warning(
                 "Spatial training features unavailable for station=%s item=%s: %s", station_code, item_code, e
             )
             spatial_ctx = None
+            sources.pop("spatial_pivot", None)
+            sources.pop("spatial_network", None)
+            sources.pop("spatial_station_code", None)
 
     # Cross-pollutant features (NO2 only — CO↔NO2 correlation of 0.78)
     xpol_ctx = None
     if station_code is not None and item_code == 2:  # NO2 only
         try:
-            xpol_train, xpol_ctx = compute_cross_pollutant_features(station_code, item_code, train_series.index)
-            for c in xpol_train.columns:
-                if "lag" in c or "rmean" in c:
-                    xpol_train[c] = np.log1p(xpol_train[c].clip(lower=0))
-            train_feats = _add_spatial(train_feats, xpol_train)
-            feat_cols = get_feature_columns(train_feats)
+            sources["xpol_pivot"] = load_cross_pollutant_pivot(station_code, item_code)
+            xpol_train, xpol_ctx = compute_cross_pollutant_features(
+                station_code, item_code, train_series.index, pivot=sources["xpol_pivot"]
+            )
+            extra["xpol"] = _log_xpol(xpol_train)
         except Exception as e:
             logger.warning("Cross-pollutant training features unavailable for station=%s: %s", station_code, e)
             xpol_ctx = None
+            sources.pop("xpol_pivot", None)
 
     # Weather features
     weather_meta = None
+    if weather and station_lat is None and station_code is not None:
+        try:
+            station_lat, station_lon = station_registry().coordinates(station_code)
+        except Exception as e:
+            logger.warning("No registered coordinates for station=%s, skipping weather: %s", station_code, e)
     if station_lat is not None and station_lon is not None:
         try:
-            weather_train = get_weather_for_station(station_lat, station_lon, train_series.index)
-            train_feats = _add_spatial(train_feats, weather_train)
-            feat_cols = get_feature_columns(train_feats)
+            extra["weather"] = get_weather_for_station(station_lat, station_lon, train_series.index)
             weather_meta = {"lat": station_lat, "lon": station_lon}
         except Exception as e:
             logger.warning("Weather training features unavailable for (%s, %s): %s", station_lat, station_lon, e)
             weather_meta = None
 
-    # Drop rows with NaN (from lags/rolling at start of series)
-    valid_mask = train_feats[feat_cols].notna().all(axis=1) & train_log.notna()
-    X_train = train_feats.loc[valid_mask, feat_cols]
-    y_train = train_log.loc[valid_mask]
+    # Build the float32 training matrix; drop rows with NaN (lags/rolling at start of series)
+    train_matrix, context = build_train_matrix(train_log, extra)
+    schema = train_matrix.schema
+    feat_cols = schema.columns
+    X_train, y_train = _training_rows(train_matrix, train_log)
 
     # Validation set (if provided)
     X_val, y_val = None, None
     if val_log is not None:
         val_index = val_log.index
         horizon_steps = np.arange(len(val_index))
-        val_feats = build_prediction_features(val_index, context, horizon_steps)
+        val_extra = {}
 
         if spatial_ctx is not None:
             try:
                 spatial_val = compute_spatial_features_for_prediction(val_index, spatial_ctx)
-                for c in spatial_val.columns:
-                    if "mean" in c:
-                        spatial_val[c] = np.log1p(spatial_val[c])
-                val_feats = _add_spatial(val_feats, spatial_val)
+                val_extra["spatial"] = _log_spatial(spatial_val)
             except Exception as e:
                 logger.warning("Spatial validation features failed: %s", e)
 
         if xpol_ctx is not None:
             try:
                 xpol_val = compute_cross_pollutant_for_prediction(val_index, xpol_ctx, train_series.index[-1])
-                for c in xpol_val.columns:
-                    if "lag" in c or "rmean" in c:
-                        xpol_val[c] = np.log1p(xpol_val[c].clip(lower=0))
-                val_feats = _add_spatial(val_feats, xpol_val)
+                val_extra["xpol"] = _log_xpol(xpol_val)
             except Exception as e:
                 logger.warning("Cross-pollutant validation features failed: %s", e)
 
         if weather_meta is not None:
             try:
-                weather_val = get_weather_for_station(weather_meta["lat"], weather_meta["lon"], val_index)
-                val_feats = _add_spatial(val_feats, weather_val)
+                val_extra["weather"] = get_weather_for_station(weather_meta["lat"], weather_meta["lon"], val_index)
             except Exception as e:
                 logger.warning("Weather validation features failed: %s", e)
 
-        for c in feat_cols:
-            if c not in val_feats.columns:
-                val_feats[c] = 0
-        X_val = val_feats[feat_cols].astype(float)
-        X_val = X_val.fillna(X_val.median())
+        val_matrix = build_prediction_matrix(val_index, context, schema, val_extra)
+        val_matrix.fill_missing(val_matrix.to_frame().median().to_numpy())
+        X_val = val_matrix.values
         y_val = val_log
 
-    # Handle NaN in training features
-    train_medians = X_train.median()
-    X_train = X_train.fillna(train_medians)
-
-    # Train LightGBM models (in log space)
-    lgbm_model = train_lgbm(X_train, y_train, X_val, y_val, "regression")
-    lgbm_q05 = train_lgbm(X_train, y_train, X_val, y_val, "quantile", 0.05)
-    lgbm_q95 = train_lgbm(X_train, y_train, X_val, y_val, "quantile", 0.95)
+    # Training rows are complete; medians fill gaps at prediction time
+    train_medians = pd.Series(np.median(X_train, axis=0), index=feat_cols)
+
+    # Train LightGBM models (in log space) from one shared binned Dataset
+    objectives = {"lgbm_model": LGBM_OBJECTIVES["lgbm_model"]} if quantiles else None
+    lgbm_models = train_lgbm_models(
+        X_train,
+        y_train,
+        X_val,
+        y_val,
+        objectives=objectives,
+        n_jobs=n_jobs,
+        concurrent=concurrent_lgbm,
+        feature_names=feat_cols,
+    )
+    lgbm_model = lgbm_models["lgbm_model"]
+    lgbm_q05 = lgbm_models.get("lgbm_q05")
+    lgbm_q95 = lgbm_models.get("lgbm_q95")
+    quantile_head = None
+    if quantiles:
+        quantile_head = train_quantile_head(lgbm_model, X_train, y_train, quantiles, n_jobs=n_jobs)
 
     # Train Ridge Fourier model (in log space)
     ridge_model, ridge_epoch = train_ridge(train_log.dropna())
@@ -360,25 +606,16 @@ def train_forecast_pipeline(
     # --- Conformal calibration on validation ---
     cqr_correction = 0.0
     weights = {"lgbm": 0.6, "ridge": 0.2, "naive": 0.2}
+    horizon_weights = None
 
     if val_series is not None:
         # Predict validation in log space, then back-transform
         lgbm_val_log = lgbm_model.predict(X_val)
-        q05_val_log = lgbm_q05.predict(X_val)
-        q95_val_log = lgbm_q95.predict(X_val)
 
         # Back-transform to original scale for ensemble optimization
         lgbm_val = np.expm1(np.maximum(lgbm_val_log, 0))
-        ridge_val = predict_ridge(ridge_model, val_index, ridge_epoch).values
-        # Ridge was trained on log, predictions are in log space
-        # Actually ridge.predict returns log-space. Convert:
-        ridge_val_log = ridge_val  # already in log from predict_ridge
-        # Re-do ridge prediction properly in log space
-        fourier_val = add_fourier_features(val_index, ridge_epoch)
-        fourier_val["hour"] = val_index.hour
-        fourier_val["day_of_week"] = val_index.dayofweek
-        fourier_val["month"] = val_index.month
-        ridge_val_log = ridge_model.predict(fourier_val.values)
+        # Ridge was trained on log1p values, so its raw output is log-space
+        ridge_val_log = ridge_model.predict(_ridge_design(val_index, ridge_epoch))
         ridge_val = np.maximum(np.expm1(ridge_val_log), 0)
 
         naive_val = seasonal_naive_predict(train_series, val_index).values  # original scale
@@ -389,15 +626,23 @@ def train_forecast_pipeline(
             "naive": naive_val,
         }
         weights = optimize_weights(val_series.values, candidate_preds)
+        if horizon_buckets is not None:
+            horizon_weights = optimize_horizon_weights(
+                val_series.values, candidate_preds, horizon_steps, bucket_edges=horizon_buckets
+            )
 
         # CQR calibration on validation (original scale)
-        q05_val = np.maximum(np.expm1(q05_val_log), 0)
-        q95_val = np.maximum(np.expm1(q95_val_log), 0)
-        cqr_correction = calibrate_intervals_cqr(val_series.values, q05_val, q95_val, target_coverage=0.90)
+        if quantile_head is not None:
+            q_val = predict_quantiles(quantile_head, lgbm_val_log, X_val)
+            quantile_head["offsets"] = calibrate_quantiles_cqr(val_series.values, q_val, quantile_head["quantiles"])
+        else:
+            q05_val = np.maximum(np.expm1(lgbm_q05.predict(X_val)), 0)
+            q95_val = np.maximum(np.expm1(lgbm_q95.predict(X_val)), 0)
+            cqr_correction = calibrate_intervals_cqr(val_series.values, q05_val, q95_val, target_coverage=0.90)
 
     context["train_series_original"] = train_series  # keep original for naive
 
-    return {
+    pipeline = {
         "lgbm_model": lgbm_model,
         "lgbm_q05": lgbm_q05,
         "lgbm_q95": lgbm_q95,
@@ -405,9 +650,126 @@ def train_forecast_pipeline(
         "ridge_epoch": ridge_epoch,
         "context": context,
         "feat_cols": feat_cols,
+        "feature_schema": schema,
         "weights": weights,
+        "horizon_weights": horizon_weights,
         "train_medians": train_medians,
         "cqr_correction": cqr_correction,
+        "quantile_head": quantile_head,
+        "spatial_ctx": spatial_ctx,
+        "xpol_ctx": xpol_ctx,
+        "weather_meta": weather_meta,
+    }
+    if keep_feature_cache:
+        pipeline["feature_cache"] = {"train_matrix": train_matrix, "sources": sources}
+    return pipeline
+
+
+def refit_forecast_pipeline(
+    pipeline: dict,
+    new_series: pd.Series,
+    concurrent_lgbm: bool = False,
+    n_jobs: int = -1,
+) -> dict:
+    """Retrain a pipeline on its training series extended by `new_series`.
+
+    `pipeline` must come from `train_forecast_pipeline(..., keep_feature_cache=True)`
+    and `new_series` must continue its training series (typically the
+    validation month). Only the new rows' features are built: base features
+    via `extend_train_matrix`, spatial / cross-pollutant rows from the
+    cached query results and weather for the new timestamps, so nothing is
+    re-queried. A station block that fails to rebuild is filled from the
+    pipeline's training medians for the new rows, as training and prediction
+    tolerate the same failures. Models are then refit on the extended matrix
+    without early stopping, as `train_forecast_pipeline(full_series)` would.
+
+    Ensemble weights (incl. per-horizon weights) and the CQR corrections
+    (incl. per-quantile offsets) are carried over from `pipeline`, which is
+    the usual export flow (calibrate on validation, refit on all).
+    The returned pipeline has no feature cache.
+    """
+    cache = pipeline["feature_cache"]
+    context = pipeline["context"]
+    train_series = pd.concat([context["train_series_original"], new_series])
+    new_index = new_series.index
+
+    new_extra = {}
+    spatial_ctx = pipeline.get("spatial_ctx")
+    if spatial_ctx is not None:
+        try:
+            if "spatial_network" in cache["sources"]:
+                spatial_all, _ = station_spatial_features(
+                    cache["sources"]["spatial_network"], cache["sources"]["spatial_station_code"], train_series.index
+                )
+            else:
+                spatial_all = spatial_features_from_pivot(
+                    cache["sources"]["spatial_pivot"], spatial_ctx, train_series.index
+                )
+            new_extra["spatial"] = _log_spatial(spatial_all.loc[new_index])
+        except Exception as e:
+            logger.warning("Spatial refit features failed: %s", e)
+
+    xpol_ctx = pipeline.get("xpol_ctx")
+    if xpol_ctx is not None:
+        try:
+            xpol_all, hourly_stats = cross_pollutant_features_from_pivot(
+                cache["sources"]["xpol_pivot"], xpol_ctx["other_items"], train_series.index
+            )
+            xpol_ctx = {**xpol_ctx, "hourly_stats": hourly_stats}
+            new_extra["xpol"] = _log_xpol(xpol_all.loc[new_index])
+        except Exception as e:
+            logger.warning("Cross-pollutant refit features failed: %s", e)
+
+    weather_meta = pipeline.get("weather_meta")
+    if weather_meta is not None:
+        try:
+            new_extra["weather"] = get_weather_for_station(weather_meta["lat"], weather_meta["lon"], new_index)
+        except Exception as e:
+            logger.warning("Weather refit features failed: %s", e)
+
+    # Base features: new rows only, target encodings refreshed for all rows
+    n_old = len(cache["train_matrix"].index)
+    train_matrix, context = extend_train_matrix(cache["train_matrix"], context, np.log1p(new_series), new_extra)
+    # Station blocks that failed to load are filled from the previous training
+    # medians (as at prediction time) so the new rows are still trained on
+    old_medians = pipeline["train_medians"].reindex(train_matrix.columns).to_numpy(dtype=np.float32)
+    for name, _ in train_matrix.schema.blocks[len(BASE_SCHEMA.blocks) :]:
+        if name not in new_extra:
+            cols = train_matrix.schema.block_slice(name)
+            train_matrix.values[n_old:, cols] = old_medians[cols]
+    train_log = context["train_series"]
+    feat_cols = train_matrix.columns
+    X_train, y_train = _training_rows(train_matrix, train_log)
+    train_medians = pd.Series(np.median(X_train, axis=0), index=feat_cols)
+
+    quantile_head = pipeline.get("quantile_head")
+    objectives = {"lgbm_model": LGBM_OBJECTIVES["lgbm_model"]} if quantile_head is not None else None
+    lgbm_models = train_lgbm_models(
+        X_train, y_train, objectives=objectives, n_jobs=n_jobs, concurrent=concurrent_lgbm, feature_names=feat_cols
+    )
+    if quantile_head is not None:
+        offsets = quantile_head["offsets"]
+        quantile_head = train_quantile_head(
+            lgbm_models["lgbm_model"], X_train, y_train, quantile_head["quantiles"], n_jobs=n_jobs
+        )
+        quantile_head["offsets"] = offsets
+    ridge_model, ridge_epoch = train_ridge(train_log.dropna())
+    context["train_series_original"] = train_series
+
+    return {
+        "lgbm_model": lgbm_models["lgbm_model"],
+        "lgbm_q05": lgbm_models.get("lgbm_q05"),
+        "lgbm_q95": lgbm_models.get("lgbm_q95"),
+        "ridge_model": ridge_model,
+        "ridge_epoch": ridge_epoch,
+        "context": context,
+        "feat_cols": feat_cols,
+        "feature_schema": train_matrix.schema,
+        "weights": pipeline["weights"],
+        "horizon_weights": pipeline.get("horizon_weights"),
+        "train_medians": train_medians,
+        "cqr_correction": pipeline["cqr_correction"],
+        "quantile_head": quantile_head,
         "spatial_ctx": spatial_ctx,
         "xpol_ctx": xpol_ctx,
         "weather_meta": weather_meta,
@@ -418,22 +780,23 @@ def predict_with_pipeline(
     pipeline: dict,
     prediction_index: pd.DatetimeIndex,
 ) -> pd.DataFrame:
-    """Generate ensemble predictions with calibrated prediction intervals."""
+    """Generate ensemble predictions with calibrated prediction intervals.
+
+    Pipelines trained with `quantiles` return one calibrated column per level
+    (``q05``, ``q10``, ..., ``q95``); otherwise only ``q05`` / ``q95``.
+    """
     context = pipeline["context"]
     feat_cols = pipeline["feat_cols"]
     train_series_orig = context.get("train_series_original", context["train_series"])
 
     horizon_steps = np.arange(len(prediction_index))
-    pred_feats = build_prediction_features(prediction_index, context, horizon_steps)
+    extra = {}
 
     # Spatial features
     if pipeline.get("spatial_ctx") is not None:
         try:
             spatial_pred = compute_spatial_features_for_prediction(prediction_index, pipeline["spatial_ctx"])
-            for c in spatial_pred.columns:
-                if "mean" in c:
-                    spatial_pred[c] = np.log1p(spatial_pred[c])
-            pred_feats = _add_spatial(pred_feats, spatial_pred)
+            extra["spatial"] = _log_spatial(spatial_pred)
         except Exception as e:
             logger.warning("Spatial prediction features failed: %s", e)
 
@@ -443,61 +806,63 @@ def predict_with_pipeline(
             xpol_pred = compute_cross_pollutant_for_prediction(
                 prediction_index, pipeline["xpol_ctx"], train_series_orig.index[-1]
             )
-            for c in xpol_pred.columns:
-                if "lag" in c or "rmean" in c:
-                    xpol_pred[c] = np.log1p(xpol_pred[c].clip(lower=0))
-            pred_feats = _add_spatial(pred_feats, xpol_pred)
+            extra["xpol"] = _log_xpol(xpol_pred)
         except Exception as e:
             logger.warning("Cross-pollutant prediction features failed: %s", e)
 
     # Weather features (use historical averages for future timestamps)
     if pipeline.get("weather_meta") is not None:
         try:
-            weather_pred = get_weather_features_for_prediction(
+            extra["weather"] = get_weather_features_for_prediction(
                 prediction_index,
                 pipeline["weather_meta"]["lat"],
                 pipeline["weather_meta"]["lon"],
             )
-            pred_feats = _add_spatial(pred_feats, weather_pred)
         except Exception as e:
             logger.warning("Weather prediction features failed: %s", e)
 
-    for c in feat_cols:
-        if c not in pred_feats.columns:
-            pred_feats[c] = 0
-    X = pred_feats[feat_cols].astype(float)
-    X = X.fillna(pipeline["train_medians"])
+    schema = pipeline.get("feature_schema") or FeatureSchema.from_columns(feat_cols)
+    matrix = build_prediction_matrix(prediction_index, context, schema, extra)
+    matrix.fill_missing(pipeline["train_medians"].reindex(schema.columns).to_numpy())
+    X = matrix.values
 
-    # Predict in log space, back-transform
-    lgbm_log = pipeline["lgbm_model"].predict(X)
+    # Predict in log space, back-transform. Served pipelines carry compiled
+    # trees and evaluate every booster in one float32 pass.
+    raw = predict_raw(pipeline, X) if pipeline.get("compiled_trees") is not None else None
+    lgbm_log = raw["lgbm_model"] if raw is not None else pipeline["lgbm_model"].predict(X)
     lgbm_preds = np.maximum(np.expm1(lgbm_log), 0)
 
     # Ridge in log space
-    fourier_pred = add_fourier_features(prediction_index, pipeline["ridge_epoch"])
-    fourier_pred["hour"] = prediction_index.hour
-    fourier_pred["day_of_week"] = prediction_index.dayofweek
-    fourier_pred["month"] = prediction_index.month
-    ridge_log = pipeline["ridge_model"].predict(fourier_pred.values)
+    ridge_log = pipeline["ridge_model"].predict(_ridge_design(prediction_index, pipeline["ridge_epoch"]))
     ridge_preds = np.maximum(np.expm1(ridge_log), 0)
 
     naive_preds = seasonal_naive_predict(train_series_orig, prediction_index).values
 
-    # Quantile predictions (log space → original)
-    q05_log = pipeline["lgbm_q05"].predict(X)
-    q95_log = pipeline["lgbm_q95"].predict(X)
-    q05 = np.maximum(np.expm1(q05_log), 0)
-    q95 = np.maximum(np.expm1(q95_log), 0)
-
-    # Apply CQR conformal correction
-    cqr = pipeline.get("cqr_correction", 0.0)
-    q05_cal = np.maximum(q05 - cqr, 0)
-    q95_cal = q95 + cqr
-
-    # Enforce monotonicity
-    q95_cal = np.maximum(q95_cal, q05_cal)
-
-    # Ensemble
+    # Quantile predictions (log space → original), CQR-corrected
+    if pipeline.get("quantile_head") is not None:
+        head = pipeline["quantile_head"]
+        q_all = predict_quantiles(head, lgbm_log, X, scale_raw=raw["scale_model"] if raw is not None else None)
+        quantile_cols = {quantile_column(tau): q_all[:, j] for j, tau in enumerate(head["quantiles"])}
+    else:
+        q05_log = raw["lgbm_q05"] if raw is not None else pipeline["lgbm_q05"].predict(X)
+        q95_log = raw["lgbm_q95"] if raw is not None else pipeline["lgbm_q95"].predict(X)
+        q05 = np.maximum(np.expm1(q05_log), 0)
+        q95 = np.maximum(np.expm1(q95_log), 0)
+
+        cqr = pipeline.get("cqr_correction", 0.0)
+        q05_cal = np.maximum(q05 - cqr, 0)
+        q95_cal = q95 + cqr
+
+        # Enforce monotonicity
+        q95_cal = np.maximum(q95_cal, q05_cal)
+        quantile_cols = {"q05": q05_cal, "q95": q95_cal}
+
+    # Ensemble (per-horizon-bucket weights when the pipeline has them)
     w = pipeline["weights"]
+    if pipeline.get("horizon_weights") is not None:
+        hw = pipeline["horizon_weights"]
+        bucket = np.searchsorted(hw["edges"], horizon_steps, side="right") - 1
+        w = {name: np.array([bw.get(name, 0) for bw in hw["weights"]])[bucket] for name in ("lgbm", "ridge", "naive")}
     ensemble = w.get("lgbm", 0) * lgbm_preds + w.get("ridge", 0) * ridge_preds + w.get("naive", 0) * naive_preds
     ensemble = np.maximum(ensemble, 0)
 
@@ -507,8 +872,7 @@ def predict_with_pipeline(
             "lgbm": lgbm_preds,
             "ridge": ridge_preds,
             "naive": naive_preds,
-            "q05": q05_cal,
-            "q95": q95_cal,
+            **quantile_cols,
         },
         index=prediction_index,
     )
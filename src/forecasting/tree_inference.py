@@ -0,0 +1,233 @@
+"""Compiled inference for the served LightGBM boosters.
+
+Every tree of every booster is flattened into one set of contiguous NumPy
+node arrays (split feature, float32 threshold, child index, leaf value).
+Nodes are laid out breadth-first with siblings adjacent, so a split step is
+``node = child[node] + (x > threshold[node])``, and leaves are stored as
+nodes that step to themselves (threshold +inf). Prediction walks all trees
+of all models at once: each step is one gather over an (n_rows, n_trees)
+node matrix, and after `depth` steps the leaf values are summed per model.
+This skips the per-call DataFrame validation and thread start-up of
+`Booster.predict`, which dominate latency for short forecast horizons.
+
+Only numerical splits are supported (the forecast pipelines have no
+categorical features).
+"""
+
+from collections import deque
+from dataclasses import dataclass
+
+import lightgbm as lgb
+import numpy as np
+
+# Missing-value handling encoded in LightGBM's decision_type bits 2-3
+_MISSING_NONE, _MISSING_ZERO, _MISSING_NAN = 0, 1, 2
+_CATEGORICAL_MASK = 1
+_DEFAULT_LEFT_MASK = 2
+# LightGBM's kZeroThreshold: |x| below this counts as zero for missing_type=Zero
+_ZERO_THRESHOLD = 1e-35
+
+
+def _parse_trees(model_str: str) -> list[dict]:
+    """Split a LightGBM text model into per-tree dicts of raw field strings."""
+    trees = []
+    current = None
+    for line in model_str.splitlines():
+        if line.startswith("Tree="):
+            current = {}
+            trees.append(current)
+        elif line.startswith("end of trees"):
+            break
+        elif current is not None and "=" in line:
+            key, value = line.split("=", 1)
+            current[key] = value
+    return trees
+
+
+def _float32_floor(threshold: np.ndarray) -> np.ndarray:
+    """Largest float32 <= each float64 threshold, so ``x32 > t32`` iff ``x32 > t64``."""
+    t32 = threshold.astype(np.float32)
+    over = t32.astype(np.float64) > threshold
+    t32[over] = np.nextafter(t32[over], np.float32(-np.inf))
+    return t32
+
+
+def _flatten_tree(tree: dict) -> dict[str, np.ndarray | int]:
+    """Lay out one parsed tree breadth-first with sibling nodes adjacent.
+
+    Child indices in the result are tree-local; leaves point at themselves.
+    """
+    n_leaves = int(tree["num_leaves"])
+    leaf_value = np.array(tree["leaf_value"].split(), dtype=np.float64)
+    n_nodes = 2 * n_leaves - 1
+
+    feature = np.zeros(n_nodes, dtype=np.int32)
+    threshold = np.full(n_nodes, np.inf)
+    child = np.arange(n_nodes, dtype=np.int32)
+    default_left = np.zeros(n_nodes, dtype=bool)
+    missing_type = np.zeros(n_nodes, dtype=np.uint8)
+    value = np.zeros(n_nodes)
+
+    depth = 0
+    if n_leaves == 1:
+        value[0] = leaf_value[0]
+    else:
+        split_feature = np.array(tree["split_feature"].split(), dtype=np.int32)
+        split_threshold = np.array(tree["threshold"].split(), dtype=np.float64)
+        decision = np.array(tree["decision_type"].split(), dtype=np.int64)
+        if (decision & _CATEGORICAL_MASK).any():
+            raise ValueError("Compiled inference supports numerical splits only")
+        lgb_children = np.array([tree["left_child"].split(), tree["right_child"].split()], dtype=np.int64)
+
+        # LightGBM children: >= 0 internal node id, < 0 ~leaf id
+        queue = deque([(0, 0, 1)])  # (internal node id, slot, depth)
+        next_slot = 1
+        while queue:
+            node, slot, d = queue.popleft()
+            depth = max(depth, d)
+            feature[slot] = split_feature[node]
+            threshold[slot] = split_threshold[node]
+            default_left[slot] = decision[node] & _DEFAULT_LEFT_MASK
+            missing_type[slot] = (decision[node] >> 2) & 3
+            child[slot] = next_slot
+            for offset, c in enumerate(lgb_children[:, node]):
+                if c >= 0:
+                    queue.append((int(c), next_slot + offset, d + 1))
+                else:
+                    value[next_slot + offset] = leaf_value[~c]
+            next_slot += 2
+
+    return dict(
+        feature=feature,
+        threshold=threshold,
+        child=child,
+        default_left=default_left,
+        missing_type=missing_type,
+        value=value,
+        depth=depth,
+    )
+
+
+@dataclass(frozen=True)
+class CompiledForest:
+    """Flattened trees of one or more boosters, evaluated in one traversal."""
+
+    names: tuple[str, ...]
+    n_features: int
+    feature: np.ndarray  # int32, split feature per node (0 for leaves)
+    threshold: np.ndarray  # float32, split threshold per node (+inf for leaves)
+    child: np.ndarray  # int32, left child; the right child is child + 1 (self for leaves)
+    default_left: np.ndarray  # bool, direction taken by missing values
+    missing_type: np.ndarray  # uint8, 0=None, 1=Zero, 2=NaN
+    value: np.ndarray  # float64, leaf value (0 for internal nodes)
+    roots: np.ndarray  # int32, root node of every tree
+    model_offsets: np.ndarray  # int64, first tree of each model in `roots`
+    depth: int
+    has_missing: bool
+
+    @classmethod
+    def from_boosters(cls, models: dict[str, lgb.Booster]) -> "CompiledForest":
+        """Compile boosters (at their best iteration) into one forest."""
+        blocks: dict[str, list] = {k: [] for k in ("feature", "threshold", "child", "default_left", "missing_type")}
+        blocks["value"] = []
+        roots, model_offsets = [], []
+        n_nodes, depth = 0, 0
+        n_features = None
+
+        for name, booster in models.items():
+            if n_features is None:
+                n_features = booster.num_feature()
+            elif booster.num_feature() != n_features:
+                raise ValueError(f"Booster {name!r} has {booster.num_feature()} features, expected {n_features}")
+            model_offsets.append(len(roots))
+
+            for tree in _parse_trees(booster.model_to_string()):
+                flat = _flatten_tree(tree)
+                flat["child"] += n_nodes
+                for key in blocks:
+                    blocks[key].append(flat[key])
+                depth = max(depth, flat["depth"])
+                roots.append(n_nodes)
+                n_nodes += len(flat["feature"])
+
+        arrays = {key: np.concatenate(parts) for key, parts in blocks.items()}
+        return cls(
+            names=tuple(models),
+            n_features=n_features or 0,
+            feature=arrays["feature"],
+            threshold=_float32_floor(arrays["threshold"]),
+            child=arrays["child"],
+            default_left=arrays["default_left"],
+            missing_type=arrays["missing_type"],
+            value=arrays["value"],
+            roots=np.array(roots, dtype=np.int32),
+            model_offsets=np.array(model_offsets, dtype=np.int64),
+            depth=depth,
+            has_missing=bool((arrays["missing_type"] != _MISSING_NONE).any()),
+        )
+
+    def predict(self, X: np.ndarray) -> dict[str, np.ndarray]:
+        """Raw scores of every compiled model for the rows of `X` (n_rows, n_features)."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected shape (n, {self.n_features}), got {X.shape}")
+
+        if not self.has_missing and np.isnan(X).any():
+            # missing_type=None everywhere: LightGBM compares NaN as 0.0
+            X = np.where(np.isnan(X), np.float32(0), X)
+
+        rows = (np.arange(len(X), dtype=np.int32) * self.n_features)[:, None]
+        flat = X.ravel()
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        for _ in range(self.depth):
+            x = flat[rows + self.feature[node]]
+            go_right = x > self.threshold[node]
+            if self.has_missing:
+                go_right = self._missing_direction(x, node, go_right)
+            node = self.child[node] + go_right
+
+        sums = np.add.reduceat(self.value[node], self.model_offsets, axis=1)
+        return {name: sums[:, i] for i, name in enumerate(self.names)}
+
+    def _missing_direction(self, x: np.ndarray, node: np.ndarray, go_right: np.ndarray) -> np.ndarray:
+        """Apply LightGBM's missing-value routing to one traversal step."""
+        mtype = self.missing_type[node]
+        isnan = np.isnan(x)
+        # NaN on a missing_type=None split is compared as 0.0 (leaves have +inf)
+        go_right = np.where(isnan & (mtype == _MISSING_NONE), self.threshold[node] < 0, go_right)
+        is_missing = ((mtype == _MISSING_ZERO) & (isnan | (np.abs(x) <= _ZERO_THRESHOLD))) | (
+            (mtype == _MISSING_NAN) & isnan
+        )
+        return np.where(is_missing, ~self.default_left[node], go_right)
+
+
+# Above this many rows the native LightGBM traversal is faster than the
+# gather-per-level NumPy walk, so `predict_raw` hands off to `Booster.predict`.
+COMPILED_MAX_ROWS = 192
+
+
+def pipeline_boosters(pipeline: dict) -> dict[str, lgb.Booster]:
+    """The boosters a forecast pipeline evaluates per request, by name."""
+    boosters = {k: pipeline[k] for k in ("lgbm_model", "lgbm_q05", "lgbm_q95") if pipeline.get(k) is not None}
+    if pipeline.get("quantile_head") is not None:
+        boosters["scale_model"] = pipeline["quantile_head"]["scale_model"]
+    return boosters
+
+
+def compile_pipeline(pipeline: dict) -> CompiledForest:
+    """Compile every booster of a forecast pipeline into one forest."""
+    return CompiledForest.from_boosters(pipeline_boosters(pipeline))
+
+
+def predict_raw(pipeline: dict, X: np.ndarray) -> dict[str, np.ndarray]:
+    """Log-space scores of all pipeline boosters for a float32 feature matrix.
+
+    Uses the pipeline's `"compiled_trees"` for short horizons and
+    `Booster.predict` on the same float32 matrix otherwise, so both paths
+    route rows identically.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    compiled = pipeline.get("compiled_trees")
+    if compiled is not None and len(X) <= COMPILED_MAX_ROWS:
+        return compiled.predict(X)
+    return {name: booster.predict(X) for name, booster in pipeline_boosters(pipeline).items()}
@@ -9,6 +9,16 @@ BQ_PROJECT = os.environ.get("GCP_PROJECT_ID", "mpc-pollution-331382")
 BQ_DATASET = "logic"
 BQ_TABLE_CLEAN = f"`{BQ_PROJECT}.{BQ_DATASET}.measurements_clean`"
 
+# Query backend for src.data.loader: "bigquery", or "duckdb" for the local dbt target
+QUERY_BACKEND = os.environ.get("QUERY_BACKEND", "bigquery").lower()
+DUCKDB_PATH = os.environ.get("DUCKDB_PATH", os.path.join(PROJECT_ROOT, "dbt_pollution", "dev.duckdb"))
+DUCKDB_TABLE_CLEAN = f"{BQ_DATASET}.measurements_clean"
+
+# Local wide snapshot of presentation.dashboard_wide (scripts/export_to_parquet.py)
+PARQUET_SNAPSHOT_PATH = os.path.join(PROJECT_ROOT, "data", "dashboard_wide.parquet")
+# Hive-partitioned (year/month) long export of logic.measurements_clean, read by the global model
+PARQUET_CLEAN_DATASET_PATH = os.path.join(PROJECT_ROOT, "data", "measurements_clean")
+
 # Pollutant item codes
 ITEM_CODES = {
     "so2": 0,
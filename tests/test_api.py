@@ -32,6 +32,32 @@ def test_forecast_no_models_returns_404(client):
     assert resp.status_code == 404
 
 
+def test_global_forecast_no_model_returns_404(client):
+    resp = client.post(
+        "/predict/global",
+        json={"start_date": "2023-07-01", "end_date": "2023-07-01 23:00:00"},
+    )
+    assert resp.status_code == 404
+
+
+def test_global_forecast_untrained_pair_returns_404(client):
+    # Station 228 is known to the model, but only for PM2.5
+    app.state.global_model = {"stats": {(228, 8): {}}}
+    try:
+        resp = client.post(
+            "/predict/global",
+            json={
+                "start_date": "2023-07-01",
+                "end_date": "2023-07-01 23:00:00",
+                "pairs": [{"station_code": 228, "item_code": 0}],
+            },
+        )
+    finally:
+        del app.state.global_model
+    assert resp.status_code == 404
+    assert "228/0" in resp.json()["detail"]
+
+
 def test_anomaly_no_models_returns_404(client):
     resp = client.post(
         "/predict/anomaly",
@@ -0,0 +1,361 @@
+"""Tests for the dashboard's data helpers and its Parquet export."""
+
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "scripts"))
+sys.path.insert(0, str(ROOT / "dashboard"))
+
+POLLUTANTS = ["so2_value", "no2_value", "o3_value", "co_value", "pm10_value", "pm2_5_value"]
+
+
+def _snapshot_rows(seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    idx = pd.date_range("2023-01-30", "2023-03-02 23:00", freq="h")
+    frames = []
+    for sc in (101, 102, 103):
+        values = rng.gamma(2.0, 0.02, (len(idx), len(POLLUTANTS)))
+        values[rng.random(values.shape) < 0.1] = np.nan
+        status = rng.choice([0, 0, 0, 0, 1, 2, 4, 8, 9, np.nan], len(idx))
+        frame = pd.DataFrame(values, columns=POLLUTANTS)
+        frame.insert(0, "measurement_datetime", idx)
+        frame.insert(1, "station_code", np.int32(sc))
+        frame.insert(2, "latitude", 37.5 + (sc - 100) / 100)
+        frame.insert(3, "longitude", 127.0)
+        frame["instrument_status"] = status
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+class TestRollups:
+    @pytest.fixture
+    def dashboard(self, tmp_path, monkeypatch):
+        """`data` / `queries` reading a small snapshot and its rollups in `tmp_path`."""
+        st = pytest.importorskip("streamlit")
+        import duckdb
+        from export_to_parquet import write_rollups
+
+        import data
+        import queries
+
+        snapshot = tmp_path / "dashboard_wide.parquet"
+        _snapshot_rows().to_parquet(snapshot)
+        write_rollups(duckdb.connect(), snapshot, tmp_path / "rollups")
+
+        monkeypatch.setattr(data, "DATA_BACKEND", "parquet")
+        monkeypatch.setattr(data, "ROLLUP_DIR", tmp_path / "rollups")
+        monkeypatch.setattr(queries, "DATA_BACKEND", "parquet")
+        monkeypatch.setattr(queries, "PARQUET_PATH", snapshot)
+        monkeypatch.setattr(queries, "DATASET_MANIFEST", tmp_path / "no_dataset" / "_manifest.json")
+        st.cache_data.clear()
+        st.cache_resource.clear()
+        yield data, queries, snapshot
+        st.cache_data.clear()
+        st.cache_resource.clear()
+
+    def test_rollups_match_queries(self, dashboard):
+        data, queries, _ = dashboard
+        lo, hi, stations = queries.data_bounds()
+        filters = queries.Filters(lo, hi)
+        pollutant = "pm10_value"
+
+        # Per station: mean, non-null count and rows per status
+        totals = data.sum_rollup(data.load_rollup("station"), ["station_code"]).set_index("station_code")
+        by_query = queries.station_aggregates(filters, tuple(stations), pollutant).set_index("station_code")
+        np.testing.assert_allclose(data.rollup_mean(totals, pollutant), by_query["avg_value"], rtol=1e-5)
+        np.testing.assert_array_equal(totals[f"{pollutant}_count"], by_query["record_count"])
+
+        statuses = data.status_row_counts(totals).sum()
+        by_status = queries.status_counts(filters).set_index("status_label")["count"]
+        assert statuses[statuses > 0].sort_index().to_dict() == by_status.sort_index().to_dict()
+
+        # Per station and day, over a date range inside the snapshot
+        f = queries.Filters(pd.Timestamp("2023-02-03").date(), pd.Timestamp("2023-02-20").date())
+        daily = data.load_rollup("daily")
+        daily = daily[(daily["date"] >= "2023-02-03") & (daily["date"] <= "2023-02-20")]
+        daily = daily.set_index(["station_code", "date"]).sort_index()
+        by_query = queries.daily_means(f, tuple(stations), pollutant, False).set_index(["station_code", "date"])
+        assert len(daily) == len(by_query)
+        np.testing.assert_allclose(
+            data.rollup_mean(daily, pollutant), by_query.sort_index()[pollutant], rtol=1e-5, equal_nan=True
+        )
+
+        # Whole-dataset counts per month
+        monthly = data.sum_rollup(data.load_rollup("monthly"), ["month"])
+        by_month = queries.quality_by("month")
+        counts = ["n_rows", "status_rows", *(f"{c}_count" for c in POLLUTANTS)]
+        np.testing.assert_array_equal(monthly[counts].to_numpy(), by_month[counts].to_numpy())
+
+    def test_rewritten_rollup_is_reread(self, dashboard, tmp_path):
+        import duckdb
+        from export_to_parquet import write_rollups
+
+        data, _, snapshot = dashboard
+        before = data.load_rollup("station")["n_rows"].sum()
+
+        rows = _snapshot_rows()
+        rows[rows["measurement_datetime"] < "2023-02-01"].to_parquet(snapshot)
+        write_rollups(duckdb.connect(), snapshot, tmp_path / "rollups")
+        path = tmp_path / "rollups" / "station.parquet"
+        os.utime(path, ns=(path.stat().st_atime_ns, path.stat().st_mtime_ns + 1_000_000_000))
+
+        assert data.load_rollup("station")["n_rows"].sum() == 3 * 48 < before
+
+
+class TestDownsample:
+    @pytest.fixture
+    def trace(self):
+        rng = np.random.default_rng(0)
+        n = 30_000
+        df = pd.DataFrame(
+            {
+                "measurement_datetime": pd.date_range("2020-01-01", periods=n, freq="h"),
+                "value": np.sin(np.arange(n) / 200) + rng.normal(0, 0.05, n),
+            }
+        )
+        df.loc[12_345, "value"] = 50.0  # a single spike
+        df.loc[20_000:20_099, "value"] = np.nan  # a gap
+        df.loc[25_000:25_009, "value"] = np.nan  # another gap
+        return df
+
+    @pytest.mark.parametrize("method", ["lttb", "minmax"])
+    def test_budget_endpoints_and_spike(self, trace, method):
+        from downsample import downsample
+
+        keep = pd.Series(False, index=trace.index)
+        keep.iloc[[5, 7_777, 29_000]] = True
+        out = downsample(trace, "measurement_datetime", "value", 2_400, keep=keep, method=method)
+
+        # Within budget plus the kept rows and one row per gap
+        assert len(out) <= 2_400 + keep.sum() + 2
+        assert out.index.is_monotonic_increasing
+        assert out.index[0] == 0 and out.index[-1] == len(trace) - 1
+        assert out["value"].max() == 50.0
+        assert {5, 7_777, 29_000} <= set(out.index)
+        # The first missing row of each gap is kept, so the line still breaks there
+        assert {20_000, 25_000} <= set(out.index[out["value"].isna()])
+
+    def test_lttb_indices_count_and_order(self):
+        from downsample import lttb_indices
+
+        x = np.arange(10_000, dtype=float)
+        y = np.cos(x / 50)
+        idx = lttb_indices(x, y, 500)
+        assert len(idx) == 500
+        assert idx[0] == 0 and idx[-1] == 9_999
+        assert (np.diff(idx) > 0).all()
+        # Short inputs are returned whole
+        np.testing.assert_array_equal(lttb_indices(x[:100], y[:100], 500), np.arange(100))
+
+    def test_minmax_indices_keep_bucket_extremes(self):
+        from downsample import minmax_indices
+
+        rng = np.random.default_rng(1)
+        y = rng.normal(size=10_000)
+        idx = minmax_indices(y, 200)
+        assert len(idx) <= 200
+        assert idx[0] == 0 and idx[-1] == 9_999
+        assert y.argmax() in idx and y.argmin() in idx
+
+    def test_short_trace_unchanged(self, trace):
+        from downsample import downsample
+
+        short = trace.iloc[:1000]
+        assert downsample(short, "measurement_datetime", "value", 2_400) is short
+
+
+class TestIncrementalExport:
+    SELECT = "SELECT * FROM source_rows"
+
+    @staticmethod
+    def _files(out) -> dict[tuple, list[str]]:
+        from export_to_parquet import read_manifest
+
+        return {tuple(p["values"].values()): p["files"] for p in read_manifest(out)["partitions"]}
+
+    @pytest.mark.parametrize("by_station", [False, True])
+    def test_partitions_are_sorted_into_disjoint_row_groups(self, tmp_path, monkeypatch, by_station):
+        import duckdb
+        import export_to_parquet
+        import pyarrow.parquet as pq
+        from export_to_parquet import POLLUTANT_COLUMNS, WIDE_SORT, write_dataset
+
+        # Two years of five stations: enough rows for DuckDB's partitioned COPY to have
+        # written some months out of order. Row groups of 2,048 rows (DuckDB's smallest)
+        # give each month two.
+        monkeypatch.setattr(export_to_parquet, "ROW_GROUP_SIZE", 2048)
+        rng = np.random.default_rng(0)
+        idx = pd.date_range("2021-01-01", "2022-12-31 23:00", freq="h")
+        n = 5 * len(idx)
+        rows = pd.DataFrame(
+            {
+                "measurement_datetime": np.tile(idx, 5),
+                "station_code": np.repeat(np.arange(201, 206, dtype=np.int32), len(idx)),
+                "latitude": 37.5,
+                "longitude": 127.0,
+                **{col: rng.random(n) for col in POLLUTANT_COLUMNS},
+                "instrument_status": rng.integers(0, 3, n),
+            }
+        )
+        con = duckdb.connect()
+        con.register("source_rows", rows.sample(frac=1.0, random_state=0))
+        out = tmp_path / "dashboard_wide"
+        write_dataset(con, self.SELECT, out, WIDE_SORT, by_station)
+
+        files = sorted(out.rglob("*.parquet"))
+        assert len(files) == (120 if by_station else 24)
+        n_groups = []
+        for path in files:
+            meta = pq.ParquetFile(path).metadata
+            n_groups.append(meta.num_row_groups)
+            rows = pq.read_table(path).to_pandas()
+            keys = [c for c in WIDE_SORT if c in rows]
+            assert rows[keys].equals(rows[keys].sort_values(keys, ignore_index=True)), path
+            if by_station:
+                continue
+            # Station ranges of consecutive row groups meet at most at one boundary station
+            col = meta.schema.to_arrow_schema().get_field_index("station_code")
+            ranges = [
+                (meta.row_group(i).column(col).statistics.min, meta.row_group(i).column(col).statistics.max)
+                for i in range(meta.num_row_groups)
+            ]
+            assert all(hi <= lo for (_, hi), (lo, _) in zip(ranges, ranges[1:])), (path, ranges)
+        assert by_station or max(n_groups) > 1
+
+    def test_refresh_rewrites_only_changed_partitions(self, tmp_path):
+        import duckdb
+        from export_to_parquet import SNAPSHOT_COLUMNS, WIDE_SORT, dataset_select, refresh_dataset
+
+        con = duckdb.connect()
+        rows = _snapshot_rows()
+        con.register("source_rows", rows)
+        out = tmp_path / "dashboard_wide"
+
+        def assert_dataset_matches(expected):
+            written = con.sql(dataset_select(out)).df().sort_values(WIDE_SORT, ignore_index=True)
+            expected = expected[SNAPSHOT_COLUMNS].sort_values(WIDE_SORT, ignore_index=True)
+            pd.testing.assert_frame_equal(written, expected, check_dtype=False)
+            on_disk = {f.relative_to(out).as_posix() for f in out.rglob("*.parquet")}
+            assert on_disk == {f for files in self._files(out).values() for f in files}
+
+        # First run (no manifest) writes everything
+        assert refresh_dataset(con, self.SELECT, out, WIDE_SORT)
+        first = self._files(out)
+        assert list(first) == [(2023, 1), (2023, 2), (2023, 3)]
+
+        # Unchanged source: a no-op
+        assert not refresh_dataset(con, self.SELECT, out, WIDE_SORT)
+        assert self._files(out) == first
+
+        # One changed value rewrites only its month and deletes the superseded file
+        rows.loc[rows["measurement_datetime"] == "2023-02-10 05:00", "so2_value"] = 1.0
+        con.register("source_rows", rows)
+        assert refresh_dataset(con, self.SELECT, out, WIDE_SORT)
+        second = self._files(out)
+        assert second[(2023, 1)] == first[(2023, 1)] and second[(2023, 3)] == first[(2023, 3)]
+        assert second[(2023, 2)] != first[(2023, 2)]
+        assert not any((out / f).exists() for f in first[(2023, 2)])
+        assert_dataset_matches(rows)
+
+        # A month without rows is dropped with its directory
+        rows = rows[rows["measurement_datetime"] >= "2023-02-01"]
+        con.register("source_rows", rows)
+        assert refresh_dataset(con, self.SELECT, out, WIDE_SORT)
+        assert list(self._files(out)) == [(2023, 2), (2023, 3)]
+        assert not (out / "year=2023" / "month=1").exists()
+        assert_dataset_matches(rows)
+
+    def test_refreshed_rollups_match_a_full_rebuild(self, tmp_path):
+        import duckdb
+        from export_to_parquet import ROLLUP_KEYS, WIDE_SORT, refresh_dataset, refresh_rollups, write_rollups
+
+        con = duckdb.connect()
+        rows = _snapshot_rows()
+        out = tmp_path / "dashboard_wide"
+
+        def assert_rollups_match(rows):
+            snapshot = tmp_path / "snapshot.parquet"
+            rows.to_parquet(snapshot)
+            write_rollups(con, snapshot, tmp_path / "expected")
+            for name in ROLLUP_KEYS:
+                merged = pd.read_parquet(tmp_path / "rollups" / f"{name}.parquet")
+                expected = pd.read_parquet(tmp_path / "expected" / f"{name}.parquet")
+                pd.testing.assert_frame_equal(merged, expected, check_dtype=False, rtol=1e-9)
+
+        # Without rollup files every month is built
+        con.register("source_rows", rows)
+        changed = refresh_dataset(con, self.SELECT, out, WIDE_SORT)
+        refresh_rollups(con, out, {key[:2] for key in changed}, tmp_path / "rollups")
+        assert_rollups_match(rows)
+
+        # A changed February and a dropped January: only those months are recomputed
+        daily = tmp_path / "rollups" / "daily.parquet"
+        march = pd.read_parquet(daily).query("date >= '2023-03-01'").reset_index(drop=True)
+        rows.loc[rows["measurement_datetime"] == "2023-02-10 05:00", "so2_value"] = 1.0
+        rows = rows[rows["measurement_datetime"] >= "2023-02-01"].reset_index(drop=True)
+        con.register("source_rows", rows)
+        changed = refresh_dataset(con, self.SELECT, out, WIDE_SORT)
+        assert changed == [(2023, 1), (2023, 2)]
+        refresh_rollups(con, out, {key[:2] for key in changed}, tmp_path / "rollups")
+        assert_rollups_match(rows)
+        pd.testing.assert_frame_equal(
+            pd.read_parquet(daily).query("date >= '2023-03-01'").reset_index(drop=True), march
+        )
+
+    def test_dashboard_follows_a_refreshed_manifest(self, tmp_path, monkeypatch):
+        st = pytest.importorskip("streamlit")
+        import duckdb
+        from export_to_parquet import MANIFEST_FILE, WIDE_SORT, refresh_dataset, write_snapshot
+
+        import queries
+
+        con = duckdb.connect()
+        rows = _snapshot_rows()
+        con.register("source_rows", rows)
+        out = tmp_path / "dashboard_wide"
+        write_snapshot(con, self.SELECT, tmp_path / "dashboard_wide.parquet")
+        refresh_dataset(con, self.SELECT, out, WIDE_SORT)
+
+        monkeypatch.setattr(queries, "DATA_BACKEND", "parquet")
+        monkeypatch.setattr(queries, "PARQUET_PATH", tmp_path / "dashboard_wide.parquet")
+        monkeypatch.setattr(queries, "DATASET_MANIFEST", out / MANIFEST_FILE)
+        st.cache_data.clear()
+        st.cache_resource.clear()
+
+        february = queries.Filters(pd.Timestamp("2023-02-01").date(), pd.Timestamp("2023-02-28").date())
+
+        def so2_total():
+            from_where, params = queries._from_where(february)
+            return queries._query(f"SELECT SUM(so2_value) AS total {from_where}", params)["total"].iloc[0]
+
+        stale = queries.dataset_partitions()
+        before = so2_total()
+
+        # The refresh replaces February's file; the next query reads the new one
+        rows.loc[rows["measurement_datetime"] == "2023-02-10 05:00", "so2_value"] += 1.0
+        con.register("source_rows", rows)
+        assert refresh_dataset(con, self.SELECT, out, WIDE_SORT)
+        assert queries.dataset_partitions() != stale
+        assert so2_total() == pytest.approx(before + 3.0, rel=1e-6)
+
+        # Hours added after the snapshot are selectable from the manifest's time span
+        assert queries.data_bounds()[1] == pd.Timestamp("2023-03-02").date()
+        later = rows[rows["measurement_datetime"] >= "2023-03-02"].assign(
+            measurement_datetime=lambda d: d["measurement_datetime"] + pd.Timedelta(days=1)
+        )
+        con.register("source_rows", pd.concat([rows, later], ignore_index=True))
+        assert refresh_dataset(con, self.SELECT, out, WIDE_SORT) == [(2023, 3)]
+        assert queries.data_bounds()[1] == pd.Timestamp("2023-03-03").date()
+
+        # A partition list read before the refresh names deleted files: the snapshot answers instead
+        monkeypatch.setattr(queries, "dataset_partitions", lambda: stale)
+        assert queries._from_where(february)[0].startswith("FROM measurements ")
+        assert so2_total() == pytest.approx(before, rel=1e-6)
+        st.cache_data.clear()
+        st.cache_resource.clear()
@@ -48,6 +48,612 @@ class TestForecastFeatures:
         assert len(pred_feats) == 24
         assert pred_feats.shape[1] > 20
 
+    def test_calendar_block_cached_and_exact(self, synthetic_series):
+        from src.forecasting.calendar_features import FOURIER_COLUMNS, calendar_block, fourier_block
+
+        idx = synthetic_series.index[100:400]
+        epoch = synthetic_series.index[0]
+        block = calendar_block(idx, epoch)
+        assert calendar_block(idx, epoch) is block
+        assert not block.flags.writeable
+
+        t = (idx - epoch).total_seconds().to_numpy() / 3600.0
+        expected = np.column_stack([np.sin(2 * np.pi * t / 168), np.cos(2 * np.pi * t / 168)])
+        weekly = [FOURIER_COLUMNS.index("four_weekly_sin_1"), FOURIER_COLUMNS.index("four_weekly_cos_1")]
+        np.testing.assert_allclose(fourier_block(idx, epoch)[:, weekly], expected, atol=1e-12)
+
+        # Non-ns indexes (as read from Arrow / DuckDB) hit the same cache entries as ns ones
+        for unit in ("us", "s"):
+            one_row = pd.DatetimeIndex(["2023-05-05 13:00"]).as_unit(unit)
+            np.testing.assert_array_equal(
+                calendar_block(one_row, epoch.as_unit(unit)), calendar_block(one_row.as_unit("ns"), epoch)
+            )
+            assert calendar_block(idx.as_unit(unit), epoch) is block
+
+    def test_feature_matrix_matches_dataframe_builders(self, synthetic_series):
+        from src.forecasting.feature_matrix import build_prediction_matrix, build_train_matrix, extend_train_matrix
+        from src.forecasting.features import build_prediction_features, build_train_features
+
+        feats, context = build_train_features(synthetic_series)
+        matrix, matrix_context = build_train_matrix(synthetic_series)
+        assert matrix.values.dtype == np.float32
+        assert matrix.columns == list(feats.columns)
+        np.testing.assert_allclose(matrix.values, feats.values.astype(float), rtol=1e-6, atol=1e-6)
+
+        future_idx = pd.date_range(synthetic_series.index[-1] + pd.Timedelta(hours=1), periods=200, freq="h")
+        pred = build_prediction_matrix(future_idx, matrix_context, matrix.schema)
+        expected = build_prediction_features(future_idx, context)[feats.columns]
+        np.testing.assert_allclose(pred.values, expected.values.astype(float), rtol=1e-6, atol=1e-6)
+
+        head_matrix, head_context = build_train_matrix(synthetic_series.iloc[:-300])
+        extended, _ = extend_train_matrix(head_matrix, head_context, synthetic_series.iloc[-300:])
+        np.testing.assert_allclose(extended.values, matrix.values, rtol=1e-5, atol=1e-6)
+
+
+class TestStationGeometry:
+    def test_station_index_neighbors_and_idw(self):
+        from src.data.geometry import StationIndex, haversine_km
+
+        # One degree of latitude is ~111.2 km anywhere
+        assert abs(haversine_km(37.0, 127.0, 38.0, 127.0) - 111.2) < 0.1
+
+        stations = pd.DataFrame(
+            {
+                "station_code": [101, 102, 103, 104],
+                "latitude": [37.50, 37.50, 37.60, 37.50],
+                "longitude": [127.00, 127.10, 127.00, 127.30],
+            }
+        )
+        index = StationIndex.from_frame(stations)
+        # 0.1 deg of longitude (~8.8 km at 37.5N) is closer than 0.1 deg of latitude (~11.1 km)
+        codes, dists = index.neighbors(101, k=2)
+        assert codes == [102, 103]
+        assert dists[0] < dists[1]
+
+        codes, weights = index.idw_weights(101, k=3)
+        assert codes == [102, 103, 104]
+        assert abs(weights.sum() - 1.0) < 1e-12
+        assert index.idw_weights(101, k=3)[1] is weights
+
+    def test_network_spatial_features_match_per_station(self):
+        from src.data.geometry import StationIndex
+        from src.forecasting.features import (
+            compute_network_spatial_features,
+            spatial_features_from_pivot,
+            station_spatial_features,
+        )
+
+        rng = np.random.default_rng(0)
+        codes = [101, 102, 103, 104, 105]
+        stations = pd.DataFrame(
+            {"station_code": codes, "latitude": rng.uniform(37.4, 37.7, 5), "longitude": rng.uniform(126.8, 127.2, 5)}
+        )
+        index = StationIndex.from_frame(stations)
+        idx = pd.date_range("2023-01-01", periods=200, freq="h")
+        # Station 105 has no data for this item; 103 has a gap
+        pivot = pd.DataFrame(rng.gamma(2.0, 10.0, (200, 4)), index=idx, columns=codes[:4]).drop(idx[50:60])
+
+        network = compute_network_spatial_features(pivot, item_code=2, k_neighbors=3, station_index=index)
+        train_index = idx[20:180]
+        for code in codes:
+            features, ctx = station_spatial_features(network, code, train_index)
+            neighbors = [c for c in ctx["neighbor_codes"] if c in pivot.columns]
+            expected = spatial_features_from_pivot(pivot[neighbors], ctx, train_index)
+            pd.testing.assert_frame_equal(features, expected, rtol=1e-9)
+
+        # The neighbour std stays exact for values far from zero (no one-pass cancellation)
+        network = compute_network_spatial_features(pivot + 1e9, item_code=2, k_neighbors=3, station_index=index)
+        for code in codes[:4]:
+            features, ctx = station_spatial_features(network, code, train_index)
+            neighbors = [c for c in ctx["neighbor_codes"] if c in pivot.columns]
+            expected = spatial_features_from_pivot(pivot[neighbors], ctx, train_index)
+            np.testing.assert_allclose(features["spatial_std"], expected["spatial_std"], rtol=1e-5)
+
+    def test_station_registry_roundtrip(self, tmp_path):
+        from src.data.stations import StationRegistry
+
+        idx = pd.date_range("2023-01-01", periods=4, freq="h")
+        wide = pd.DataFrame(
+            {
+                "measurement_datetime": idx.repeat(2),
+                "station_code": [101, 102] * 4,
+                "latitude": [37.5, 37.6] * 4,
+                "longitude": [127.0, 127.1] * 4,
+                "so2_value": [0.003, np.nan] * 4,
+                "pm2_5_value": [np.nan, np.nan, 20.0, 21.0, 22.0, 23.0, np.nan, np.nan],
+            }
+        )
+        registry = StationRegistry.from_wide(wide)
+        assert registry[101].item_codes == (0, 8)
+        assert registry[102].item_codes == (8,)
+        assert (registry[102].first_seen, registry[102].last_seen) == (idx[1], idx[2])
+        assert registry.measures(101, 0) and not registry.measures(102, 0)
+
+        path = str(tmp_path / "stations.json")
+        registry.save(path)
+        loaded = StationRegistry.load(path)
+        assert loaded.stations == registry.stations
+        assert loaded.index.coordinates(102) == (37.6, 127.1)
+        assert loaded.index.neighbors(101, 1)[0] == [102]
+
+
+class TestQueryLayer:
+    def test_parameterized_queries_on_duckdb(self, tmp_path, monkeypatch):
+        import os
+        from collections import OrderedDict
+
+        import duckdb
+
+        from src.data import loader
+        from src.data.history_stats import load_history_store, load_window
+
+        db = tmp_path / "dev.duckdb"
+        con = duckdb.connect(str(db))
+        con.execute("CREATE SCHEMA logic")
+        con.execute("""
+            CREATE TABLE logic.measurements_clean AS
+            SELECT TIMESTAMP '2023-01-01' + to_hours(i % 100) AS measurement_datetime,
+                   200 + i // 100 AS station_code, 2 AS item_code,
+                   CAST(i AS DOUBLE) AS clean_value, (i % 7 = 0)::INT AS instrument_status,
+                   i % 100 % 24 AS hour
+            FROM range(300) t(i)
+        """)
+        con.close()
+        monkeypatch.setattr(loader, "QUERY_BACKEND", "duckdb")
+        monkeypatch.setattr(loader, "DUCKDB_PATH", str(db))
+        monkeypatch.setattr(loader, "_duckdb_cache", OrderedDict())
+        monkeypatch.setattr(loader, "_duckdb_cache_bytes", 0)
+
+        series = loader.load_series(201, 2, end_before="2023-01-02")
+        assert len(series) == 24 - len([h for h in range(24) if (100 + h) % 7 == 0])
+        assert (series["station_code"] == 201).all()
+        # Repeats are served from the result cache as private copies
+        again = loader.load_series(201, 2, end_before="2023-01-02")
+        assert again is not series
+        pd.testing.assert_frame_equal(again, series)
+        assert len(loader._duckdb_cache) == 1
+        # The memo is bounded by size: with room for about one result, the next evicts it
+        monkeypatch.setattr(loader, "DUCKDB_CACHE_BYTES", int(loader._duckdb_cache_bytes * 1.5))
+        loader.load_series(202, 2, end_before="2023-01-02")
+        assert len(loader._duckdb_cache) == 1
+        assert loader._duckdb_cache_bytes <= loader.DUCKDB_CACHE_BYTES
+        with pytest.raises(ValueError):
+            loader.load_series("201 OR 1=1", 2)
+
+        # No connection is held between queries: a writer can open the file, and its rows are read next
+        with duckdb.connect(str(db)) as writer:
+            writer.execute(
+                "INSERT INTO logic.measurements_clean VALUES (TIMESTAMP '2023-01-01 23:30', 201, 2, 1, 0, 23)"
+            )
+        os.utime(db, ns=(db.stat().st_atime_ns, db.stat().st_mtime_ns + 1_000_000_000))
+        assert len(loader.load_series(201, 2, end_before="2023-01-02")) == len(series) + 1
+
+        window = load_window(202, [2, 4], pd.Timestamp("2023-01-01 10:00"), pd.Timestamp("2023-01-01 12:00"))
+        assert sorted(window["clean_value"]) == [211.0, 212.0]
+
+        store = load_history_store()
+        assert store.watermark == pd.Timestamp("2023-01-05 03:00")
+        normal = [i for i in range(100, 200) if i % 7 != 0 and i % 100 % 24 == 5]
+        assert store.hourly_mean(201, 2)[5] == pytest.approx(np.mean(normal))
+
+    def test_arrow_reads_cast_numeric_to_float(self):
+        import decimal
+
+        import pyarrow as pa
+
+        from src.data.loader import arrow_to_dataframe
+
+        table = pa.table(
+            {
+                "clean_value": pa.array([decimal.Decimal("0.003"), None], pa.decimal128(38, 9)),
+                "station_code": pa.array([201, 202], pa.int64()),
+            }
+        )
+        df = arrow_to_dataframe(table)
+        assert df["clean_value"].dtype == np.float64 and df["station_code"].dtype == np.int64
+        assert df["clean_value"].iloc[0] == 0.003 and np.isnan(df["clean_value"].iloc[1])
+
+
+class TestHistoryStats:
+    def test_incremental_store_matches_full_history(self):
+        from src.data.history_stats import HistoryStore
+
+        rng = np.random.default_rng(0)
+        idx = pd.date_range("2023-01-01", periods=1000, freq="h")
+        rows = pd.concat(
+            [
+                pd.DataFrame({"measurement_datetime": idx, "station_code": sc, "item_code": 2, "clean_value": v})
+                for sc, v in ((101, rng.gamma(2.0, 10.0, 1000)), (102, rng.gamma(3.0, 5.0, 1000)))
+            ]
+        )
+        split = rows["measurement_datetime"] < idx[700]
+        store = HistoryStore.from_rows(rows[split], tail_hours=336)
+        assert store.update(rows[~split]) == (~split).sum()
+        assert store.update(rows) == 0
+
+        series = rows[rows["station_code"] == 101].set_index("measurement_datetime")["clean_value"]
+        by_hour = series.groupby(series.index.hour)
+        np.testing.assert_allclose(store.hourly_mean(101, 2), by_hour.mean().values, rtol=1e-12)
+        np.testing.assert_allclose(store.hourly_std(101, 2), by_hour.std().values, rtol=1e-9)
+
+        assert store.covers(idx[-336]) and not store.covers(idx[-337])
+        recent = store.values_at(101, [2], idx[-300:])
+        np.testing.assert_array_equal(recent[2].values, series.iloc[-300:].values)
+
+
+class TestLGBMTraining:
+    def test_shared_dataset_matches_single_model(self, synthetic_series):
+        from src.forecasting.features import build_train_features
+        from src.forecasting.train_lgbm_ensemble import train_lgbm, train_lgbm_models
+
+        feats, _ = build_train_features(np.log1p(synthetic_series))
+        feats = feats.fillna(feats.median())
+        y = np.log1p(synthetic_series)
+        X_train, y_train, X_val, y_val = feats.iloc[:-200], y.iloc[:-200], feats.iloc[-200:], y.iloc[-200:]
+
+        models = train_lgbm_models(X_train, y_train, X_val, y_val, concurrent=True)
+        assert set(models) == {"lgbm_model", "lgbm_q05", "lgbm_q95"}
+
+        single = train_lgbm(X_train, y_train, X_val, y_val, "quantile", 0.95)
+        np.testing.assert_allclose(models["lgbm_q95"].predict(X_val), single.predict(X_val))
+
+    def test_compiled_trees_match_booster(self, synthetic_series):
+        from src.forecasting.features import build_train_features
+        from src.forecasting.train_lgbm_ensemble import train_lgbm_models
+        from src.forecasting.tree_inference import CompiledForest
+
+        feats, _ = build_train_features(np.log1p(synthetic_series))
+        feats = feats.fillna(feats.median())
+        y = np.log1p(synthetic_series)
+        models = train_lgbm_models(feats.iloc[:-200], y.iloc[:-200], feats.iloc[-200:], y.iloc[-200:])
+
+        X = feats.iloc[-100:].to_numpy(np.float32)
+        X[::7, 3] = np.nan
+        compiled = CompiledForest.from_boosters(models).predict(X)
+        for name, booster in models.items():
+            np.testing.assert_allclose(compiled[name], booster.predict(X), rtol=0, atol=1e-12)
+
+    def test_multi_quantile_pipeline(self, synthetic_series):
+        from src.forecasting.quantiles import DEFAULT_QUANTILES
+        from src.forecasting.train_lgbm_ensemble import predict_with_pipeline, train_forecast_pipeline
+
+        train, val = synthetic_series.iloc[:-300], synthetic_series.iloc[-300:]
+        pipe = train_forecast_pipeline(train, val, quantiles=DEFAULT_QUANTILES)
+        assert pipe["lgbm_q05"] is None and pipe["lgbm_q95"] is None
+
+        preds = predict_with_pipeline(pipe, val.index)
+        q_cols = ["q05", "q10", "q25", "q50", "q75", "q90", "q95"]
+        assert set(q_cols) <= set(preds.columns)
+        assert (np.diff(preds[q_cols].values, axis=1) >= 0).all()
+        # Per-level calibration on the same window hits each level closely
+        for col, tau in zip(q_cols, DEFAULT_QUANTILES, strict=True):
+            assert abs((val.values <= preds[col].values).mean() - tau) < 0.05
+
+    def test_refit_tolerates_failed_station_block(self, synthetic_series, monkeypatch):
+        from src.forecasting import train_lgbm_ensemble as tle
+
+        def weather(lat, lon, index):
+            return pd.DataFrame({"temperature_2m": np.sin(np.arange(len(index)) / 24)}, index=index)
+
+        def unavailable(lat, lon, index):
+            raise OSError("weather cache unavailable")
+
+        monkeypatch.setattr(tle, "get_weather_for_station", weather)
+        train, val = synthetic_series.iloc[:-300], synthetic_series.iloc[-300:]
+        pipe = tle.train_forecast_pipeline(train, val, station_lat=37.5, station_lon=127.0, keep_feature_cache=True)
+        assert "temperature_2m" in pipe["feat_cols"]
+
+        monkeypatch.setattr(tle, "get_weather_for_station", unavailable)
+        refit = tle.refit_forecast_pipeline(pipe, val)
+        # The new rows are kept, with the weather block taken from the training medians
+        assert refit["lgbm_model"].num_trees() > 0
+        assert len(refit["context"]["train_series_original"]) == len(synthetic_series)
+        assert refit["train_medians"]["temperature_2m"] == pytest.approx(
+            np.median(np.r_[np.sin(np.arange(len(train)) / 24), [pipe["train_medians"]["temperature_2m"]] * 300]),
+            abs=1e-3,
+        )
+
+
+class TestGlobalModel:
+    @pytest.fixture
+    def global_rows(self):
+        rng = np.random.default_rng(0)
+        idx = pd.date_range("2021-01-01", periods=1500, freq="h")
+        return pd.concat(
+            [
+                pd.DataFrame(
+                    {
+                        "measurement_datetime": idx,
+                        "station_code": sc,
+                        "item_code": ic,
+                        "clean_value": rng.gamma(2.0, 0.01 * (ic + 1), len(idx)),
+                        "latitude": 37.5 + (sc - 200) / 100,
+                        "longitude": 127.0,
+                        "instrument_status": (rng.random(len(idx)) < 0.05).astype(int),
+                    }
+                )
+                for sc in (201, 202)
+                for ic in (2, 5)
+            ],
+            ignore_index=True,
+        )
+
+    def test_chunked_training_from_partitioned_parquet(self, global_rows, tmp_path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        from src.forecasting.train_global import compute_global_stats, global_feature_matrix, train_global_model
+
+        pq.write_to_dataset(pa.Table.from_pandas(global_rows), str(tmp_path), partition_cols=["station_code"])
+        end_before = "2021-02-25"
+        pipe = train_global_model(end_before=end_before, parquet_source=str(tmp_path))
+
+        normal = global_rows[
+            (global_rows["instrument_status"] == 0) & (global_rows["measurement_datetime"] < end_before)
+        ].sort_values(["station_code", "item_code", "measurement_datetime"])
+        expected = compute_global_stats(normal)
+        assert pipe["stats"].keys() == expected.keys()
+        for key, s in expected.items():
+            assert abs(pipe["stats"][key]["std"] - s["std"]) < 1e-12
+            assert pipe["stats"][key]["hour_dow"].keys() == s["hour_dow"].keys()
+
+        X = global_feature_matrix(normal.iloc[-200:], pipe["epoch"], pipe["stats"], pipe["feat_cols"])
+        assert np.isfinite(pipe["model"].predict(X)).all()
+
+        # Identifiers are split on as categories, not thresholds
+        infos = pipe["model"].dump_model()["feature_infos"]
+        assert pipe["categorical_features"] == ["station_code", "item_code"]
+        assert sorted(v for v in infos["item_code"]["values"] if v >= 0) == [2, 5]
+
+    def test_batch_prediction_matches_per_pair(self, global_rows, tmp_path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        from src.data.stations import StationRegistry
+        from src.forecasting.train_global import global_feature_matrix, predict_global_batch, train_global_model
+
+        pq.write_to_dataset(pa.Table.from_pandas(global_rows), str(tmp_path), partition_cols=["station_code"])
+        pipe = train_global_model(parquet_source=str(tmp_path))
+        coverage = global_rows.groupby(["station_code", "item_code"], as_index=False).agg(
+            latitude=("latitude", "first"),
+            longitude=("longitude", "first"),
+            first_seen=("measurement_datetime", "min"),
+            last_seen=("measurement_datetime", "max"),
+        )
+        registry = StationRegistry.from_coverage(coverage)
+
+        index = pd.date_range("2021-03-05", periods=48, freq="h")
+        batch = predict_global_batch(pipe, index, registry=registry)
+        assert len(batch) == 4 * len(index)
+        assert list(batch.columns) == ["measurement_datetime", "station_code", "item_code", "predicted_value"]
+
+        one = batch[(batch["station_code"] == 202) & (batch["item_code"] == 5)]
+        rows = pd.DataFrame(
+            {"measurement_datetime": index, "station_code": 202, "item_code": 5, "clean_value": 0.0}
+        ).assign(latitude=registry[202].latitude, longitude=registry[202].longitude)
+        X = global_feature_matrix(rows, pipe["epoch"], pipe["stats"], pipe["feat_cols"])
+        X = np.where(np.isnan(X), pipe["train_medians"].to_numpy(), X)
+        np.testing.assert_allclose(one["predicted_value"], np.maximum(np.expm1(pipe["model"].predict(X)), 0))
+
+    def test_eval_cutoff_is_a_time_split(self, global_rows, monkeypatch):
+        import lightgbm as lgb
+
+        from src.forecasting import train_global
+        from src.forecasting.train_global import eval_cutoff
+
+        t = global_rows["measurement_datetime"]
+        cutoff = eval_cutoff(t.min(), t.max(), eval_fraction=0.1)
+        in_eval = t >= cutoff
+        # Every station/pollutant contributes to the held-out period
+        assert global_rows.loc[in_eval, ["station_code", "item_code"]].drop_duplicates().shape[0] == 4
+        assert abs(in_eval.mean() - 0.1) < 0.01
+        assert eval_cutoff(t.min(), t.max(), eval_start="2021-02-01") == pd.Timestamp("2021-02-01")
+
+        # In-memory path: rows arrive sorted by station, so a positional split
+        # would hold out station 202 only
+        normal = global_rows[global_rows["instrument_status"] == 0].drop(columns="instrument_status")
+        normal = normal.sort_values(["station_code", "item_code", "measurement_datetime"], ignore_index=True)
+        monkeypatch.setattr(train_global, "load_all_series", lambda end_before=None: normal.copy())
+        seen = []
+        real_train = lgb.train
+
+        def spy_train(params, train_set, *args, valid_sets=None, **kwargs):
+            seen.extend(valid_sets or [])
+            return real_train(params, train_set, *args, valid_sets=valid_sets, **kwargs)
+
+        monkeypatch.setattr(lgb, "train", spy_train)
+        pipe = train_global.train_global_model()
+
+        n_cut = eval_cutoff(normal["measurement_datetime"].min(), normal["measurement_datetime"].max())
+        held_out = normal["measurement_datetime"] >= n_cut
+        assert len(seen) == 1 and seen[0].num_data() == held_out.sum()
+        np.testing.assert_allclose(seen[0].get_label(), np.log1p(normal.loc[held_out, "clean_value"]))
+
+        infos = pipe["model"].dump_model()["feature_infos"]
+        assert sorted(v for v in infos["station_code"]["values"] if v >= 0) == [201, 202]
+        assert sorted(v for v in infos["item_code"]["values"] if v >= 0) == [2, 5]
+
+
+class TestEnsembleWeights:
+    def test_optimize_weights_on_simplex(self):
+        from src.forecasting.train_lgbm_ensemble import optimize_weights
+
+        rng = np.random.default_rng(0)
+        y = rng.gamma(2.0, 1.0, 1000)
+        preds = {f"m{i}": y + rng.normal(0, 0.2 * (i + 1), 1000) for i in range(8)}
+        preds["bad"] = y + 10.0
+
+        w = optimize_weights(y, preds)
+        assert abs(sum(w.values()) - 1.0) < 1e-9
+        assert min(w.values()) >= 0
+        assert w["bad"] < 1e-2
+        assert w["m0"] == max(w.values())
+
+    def test_optimize_horizon_weights(self):
+        from src.forecasting.train_lgbm_ensemble import optimize_horizon_weights
+
+        y = np.arange(200, dtype=float)
+        steps = np.arange(200)
+        # "near" is exact for the first 100 steps, "far" for the rest
+        preds = {"near": np.where(steps < 100, y, 0.0), "far": np.where(steps >= 100, y, 0.0)}
+
+        hw = optimize_horizon_weights(y, preds, steps, bucket_edges=(0, 100))
+        assert hw["edges"] == [0, 100]
+        assert hw["weights"][0]["near"] > 0.99
+        assert hw["weights"][1]["far"] > 0.99
+
+
+class TestBacktest:
+    def test_shared_series_roundtrip(self, synthetic_series):
+        from src.forecasting.backtest import SharedSeries
+
+        shared, shm = SharedSeries.create(synthetic_series)
+        try:
+            loaded = shared.load()
+        finally:
+            shm.close()
+            shm.unlink()
+        pd.testing.assert_series_equal(loaded, synthetic_series, check_freq=False)
+
+    def test_shared_series_normalizes_unit(self, synthetic_series):
+        from src.forecasting.backtest import SharedSeries
+
+        seconds = synthetic_series.set_axis(synthetic_series.index.as_unit("s"))
+        shared, shm = SharedSeries.create(seconds)
+        try:
+            loaded = shared.load()
+        finally:
+            shm.close()
+            shm.unlink()
+        assert loaded.index.equals(synthetic_series.index)
+
+    def test_two_fold_backtest_in_pool(self, synthetic_series):
+        from src.forecasting.backtest import run_backtest, summarize_backtest
+
+        target = {"station_code": 101, "item_code": 0, "item_name": "so2"}
+        seen = []
+        results = run_backtest(
+            [target],
+            {(101, 0): synthetic_series},
+            n_folds=2,
+            test_size=168,
+            min_train_size=1000,
+            max_workers=2,
+            threads_per_worker=1,
+            station_features=False,
+            on_fold_done=seen.append,
+        )
+        assert sorted(r["fold"] for r in results) == [0, 1]
+        assert seen == results
+        assert all(np.isfinite(r["nrmse"]) and 0 <= r["coverage"] <= 1 for r in results)
+
+        summary = summarize_backtest(results)
+        assert list(summary) == [(101, 0)]
+        assert summary[(101, 0)]["n_folds"] == 2
+        assert summary[(101, 0)]["cv_nrmse"] == pytest.approx(np.mean([r["nrmse"] for r in results]))
+
+
+class TestExportCheckpoints:
+    @pytest.fixture
+    def exporter(self, synthetic_anomaly_df, monkeypatch):
+        """`export_models` with one forecast and one anomaly target, in-memory inputs and stub trainers."""
+        import os
+        from concurrent.futures import ThreadPoolExecutor
+
+        monkeypatch.syspath_prepend(os.path.join(os.path.dirname(os.path.dirname(__file__)), "scripts"))
+        import export_models
+
+        inputs = {"series": synthetic_anomaly_df.copy(), "history": {"n_rows": "2000"}}
+        trained, failing = [], set()
+
+        def stub_trainer(kind):
+            def train(target, data, n_jobs=-1):
+                if kind in failing:
+                    raise ValueError(f"{kind} failed")
+                trained.append(kind)
+                return {"kind": kind, "n_rows": len(data)}
+
+            return train
+
+        forecast = {"station_code": 101, "item_code": 0, "item_name": "so2", "start": "2022-03-01"}
+        anomaly = {"station_code": 102, "item_code": 2, "item_name": "no2", "start": "2022-03-01"}
+        monkeypatch.setattr(export_models, "FORECAST_TARGETS", [forecast])
+        monkeypatch.setattr(export_models, "ANOMALY_TARGETS", [anomaly])
+        monkeypatch.setattr(export_models, "load_series", lambda sc, ic, **kw: inputs["series"])
+        monkeypatch.setattr(export_models, "load_full_series", lambda sc, ic: inputs["series"])
+        monkeypatch.setattr(export_models, "history_summary", lambda end_before: dict(inputs["history"]))
+        monkeypatch.setattr(export_models, "TRAINERS", {k: stub_trainer(k) for k in ("forecast", "anomaly")})
+        # Spawned workers would re-import the real trainers; run the jobs in threads instead
+        monkeypatch.setattr(
+            export_models, "ProcessPoolExecutor", lambda max_workers, **kw: ThreadPoolExecutor(max_workers)
+        )
+        return export_models, inputs, trained, failing
+
+    def test_fingerprint_tracks_inputs(self, exporter, synthetic_anomaly_df):
+        export_models, *_ = exporter
+        target = {"station_code": 101, "item_code": 0}
+        data = synthetic_anomaly_df[["clean_value"]]
+        base = export_models.fingerprint("forecast", target, data, {"n_rows": "2000"})
+
+        assert export_models.fingerprint("forecast", target, data.copy(), {"n_rows": "2000"}) == base
+        changed = data.copy()
+        changed.iloc[100, 0] += 1e-6
+        assert export_models.fingerprint("forecast", target, changed, {"n_rows": "2000"}) != base
+        assert export_models.fingerprint("forecast", target, data, {"n_rows": "2001"}) != base
+        assert export_models.fingerprint("anomaly", target, data, {"n_rows": "2000"}) != base
+        assert export_models.fingerprint("forecast", {**target, "item_code": 2}, data, {"n_rows": "2000"}) != base
+
+    def test_rerun_skips_unchanged_and_resumes(self, exporter, tmp_path):
+        import joblib
+
+        export_models, inputs, trained, failing = exporter
+        models_dir = str(tmp_path)
+
+        # An interrupted run: the forecast is checkpointed, the anomaly target is not
+        failing.add("anomaly")
+        with pytest.raises(RuntimeError, match="1 export"):
+            export_models.export_targets(models_dir, max_workers=2)
+        assert trained == ["forecast"]
+        assert set(export_models.load_state(models_dir)) == {"forecast_101_0.pkl"}
+
+        # The re-run resumes with the missing target only
+        failing.clear()
+        trained.clear()
+        export_models.export_targets(models_dir, max_workers=2)
+        assert trained == ["anomaly"]
+        state = export_models.load_state(models_dir)
+        assert set(state) == {"forecast_101_0.pkl", "anomaly_102_2.pkl"}
+        assert joblib.load(tmp_path / "anomaly_102_2.pkl") == {"kind": "anomaly", "n_rows": 2000}
+
+        # Nothing changed: planned as unchanged, nothing trained
+        trained.clear()
+        pending, unchanged = export_models.plan_exports(models_dir)
+        assert pending == [] and len(unchanged) == 2
+        assert export_models.export_targets(models_dir) == []
+        assert trained == []
+
+        # Network history before the forecast's start changed: only the forecast is re-exported
+        inputs["history"]["n_rows"] = "2001"
+        export_models.export_targets(models_dir)
+        assert trained == ["forecast"]
+        assert (
+            export_models.load_state(models_dir)["forecast_101_0.pkl"]["fingerprint"]
+            != (state["forecast_101_0.pkl"]["fingerprint"])
+        )
+
+        # A deleted artifact is re-exported even though its fingerprint matches
+        trained.clear()
+        (tmp_path / "anomaly_102_2.pkl").unlink()
+        export_models.export_targets(models_dir)
+        assert trained == ["anomaly"]
+
+        # --force re-exports everything
+        trained.clear()
+        pending, unchanged = export_models.plan_exports(models_dir, force=True)
+        assert len(pending) == 2 and unchanged == []
+        export_models.export_targets(models_dir, max_workers=1, force=True)
+        assert sorted(trained) == ["anomaly", "forecast"]
+
 
 class TestAnomalyDetector:
     def test_build_anomaly_features(self, synthetic_anomaly_df):